@@ -3,12 +3,24 @@ import argparse
 import cProfile
 import pstats
 import logging
+from functools import partial
+from typing import Dict, List, Optional, Tuple
 
 import pandas as pd
 
 import data_analysis.data_processing as dp
+from app.tasks import run_tasks
 from data_analysis.analysis import perform_task_1, perform_task_2, perform_task_3
-from data_analysis.load_data import load_all_data
+from data_analysis.incremental import INCREMENTAL_DATASETS, compute_update
+from data_analysis.load_data import (
+    get_data_files, get_filters, load_all_data, load_previous_dataset,
+)
+from data_analysis.snapshot import TITLE_COLUMN, YEAR_COLUMN, SnapshotUpdate, load_snapshot
+
+# Tables of the snapshot: the joined rows of the movies and the bridge table of their directors
+MERGED_TABLE = 'merged'
+DIRECTORS_TABLE = 'directors'
+DIRECTOR_COLUMNS = list(dp.DIRECTOR_COLUMN_NAMES.values()) + [dp.DIRECTOR_NAME_COLUMN]
 
 
 def save_profile(profiler: cProfile.Profile, output_file='./profile/profile_results.txt'):
@@ -26,22 +38,91 @@ def save_profile(profiler: cProfile.Profile, output_file='./profile/profile_resu
         stats.print_stats()
 
 
-def run(args: argparse.Namespace) -> None:
+def load_and_merge(args: argparse.Namespace) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
-    Main function to run the film data analysis app.
+    Load the data files and merge them into the cleaned movie data
+    and the bridge table of the movies and their directors.
 
     :param args: argparse.Namespace: Arguments from the command line
-    :return: None
+
+    :return: Tuple[pd.DataFrame, pd.DataFrame]: Merged data and the bridge table
+        (empty if the processing failed)
     """
-    logging.basicConfig(level=logging.INFO, format='%(asctime)s: %(message)s')
-    logging.info("Starting the data analysis app with profiler...")
+    logging.info("Loading all data...")
+    dataframes = load_all_data(args)
+    merged_df = merge_dataframes(dataframes, args)
+    return merged_df, get_directors(dataframes, merged_df.index)
 
-    profiler = cProfile.Profile()
-    profiler.enable()
 
+def load_and_join(args: argparse.Namespace) -> Dict[str, pd.DataFrame]:
+    """
+    Load the data files and join them into the tables of the snapshot.
+
+    :param args: argparse.Namespace: Arguments from the command line
+
+    :return: Dict[str, pd.DataFrame]: Tables of the snapshot by their names
+    """
     logging.info("Loading all data...")
-    dataframes = load_all_data(args)
+    return join_tables(load_all_data(args), args)
+
 
+def join_tables(
+        dataframes: Dict[str, pd.DataFrame], args: argparse.Namespace,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Join the loaded data into the tables of the snapshot: the joined rows of the movies
+    (not yet ordered nor cleaned) and the bridge table of the joined movies and their directors
+    with the years of the movies.
+
+    :param dataframes: Dict[str, pd.DataFrame]: Dictionary with the dataframes
+    :param args: argparse.Namespace: Arguments from the command line
+
+    :return: Dict[str, pd.DataFrame]: Tables of the snapshot by their names
+    """
+    joined_df = merge_dataframes(dataframes, args, finish=False)
+    if joined_df.empty:
+        return {MERGED_TABLE: joined_df, DIRECTORS_TABLE: pd.DataFrame()}
+
+    movies = joined_df.loc[joined_df['titleType'] == 'movie', [TITLE_COLUMN, YEAR_COLUMN]]
+    years = movies.drop_duplicates(TITLE_COLUMN).set_index(TITLE_COLUMN)[YEAR_COLUMN]
+    directors_df = get_directors(dataframes, years.index)
+    directors_df = directors_df.rename(columns={'title_id': TITLE_COLUMN}).assign(**{
+        YEAR_COLUMN: years.reindex(directors_df['title_id']).to_numpy(),
+    })
+    return {MERGED_TABLE: joined_df, DIRECTORS_TABLE: directors_df}
+
+
+def finish_tables(tables: Dict[str, pd.DataFrame]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Order and clean the joined rows of the tables of the snapshot and keep the directors
+    of the merged movies.
+
+    :param tables: Dict[str, pd.DataFrame]: Tables of the snapshot by their names
+
+    :return: Tuple[pd.DataFrame, pd.DataFrame]: Merged data and the bridge table
+    """
+    merged_df = dp.finish_merge(tables.get(MERGED_TABLE, pd.DataFrame()))
+    directors_df = tables.get(DIRECTORS_TABLE, pd.DataFrame())
+    if directors_df.empty:
+        return merged_df, pd.DataFrame(columns=DIRECTOR_COLUMNS)
+
+    directors_df = directors_df[directors_df[TITLE_COLUMN].isin(merged_df.index)]
+    return merged_df, directors_df.rename(columns={TITLE_COLUMN: 'title_id'})[
+        DIRECTOR_COLUMNS].reset_index(drop=True)
+
+
+def merge_dataframes(
+        dataframes: Dict[str, pd.DataFrame], args: argparse.Namespace, finish: bool = True,
+) -> pd.DataFrame:
+    """
+    Merge the loaded data into the cleaned movie data.
+
+    :param dataframes: Dict[str, pd.DataFrame]: Dictionary with the dataframes
+    :param args: argparse.Namespace: Arguments from the command line
+    :param finish: bool: Whether to order and clean the joined rows
+
+    :return: pd.DataFrame: Merged data or joined rows (empty if the processing failed)
+    """
     empty_df = pd.DataFrame()
     basics = dataframes.get('basics', empty_df)
     ratings = dataframes.get('ratings', empty_df)
@@ -51,26 +132,132 @@ def run(args: argparse.Namespace) -> None:
     countries = dataframes.get('countries', empty_df)
     population = dataframes.get('population', empty_df)
     gdp = dataframes.get('gdp', empty_df)
+    indicators = dataframes.get('indicators')
 
     try:
         logging.info("Processing data...")
-        merged_data = dp.process_data_and_merge(
+        return dp.process_data_and_merge(
             basics, ratings, akas, crew, name,
-            countries, population, gdp, args.start, args.end,
+            countries, population, gdp, args.start, args.end, indicators, finish,
         )
     except Exception as exc_err:
         logging.error("An error occurred during data processing: %s", str(exc_err))
-        merged_data = pd.DataFrame()
+        return pd.DataFrame()
+
+
+def get_directors(dataframes: Dict[str, pd.DataFrame], title_ids: pd.Index) -> pd.DataFrame:
+    """
+    Get the bridge table of the movies and their directors for the task 3
+    from the loaded crew and name data. It is not part of the merged data.
 
+    :param dataframes: Dict[str, pd.DataFrame]: Dictionary with the dataframes
+    :param title_ids: pd.Index: Identifiers of the merged movies
+
+    :return: pd.DataFrame: Bridge table (empty if the processing failed)
+    """
+    empty_df = pd.DataFrame()
     try:
-        logging.info("Performing analysis...")
-        perform_task_1(merged_data)
-        perform_task_2(merged_data)
-        perform_task_3(merged_data)
-    except KeyError as key_err:
-        logging.error("Key error: %s", str(key_err))
+        logging.info("Processing the directors...")
+        return dp.process_directors(
+            dataframes.get('crew', empty_df), dataframes.get('name', empty_df), title_ids,
+        )
     except Exception as exc_err:
-        logging.error("An error occurred during data analysis: %s", str(exc_err))
+        logging.error("An error occurred while processing the directors: %s", str(exc_err))
+        return pd.DataFrame(columns=DIRECTOR_COLUMNS)
+
+
+def update_merged_data(
+        args: argparse.Namespace, changed: List[str], sources: Dict[str, Dict],
+) -> Optional[SnapshotUpdate]:
+    """
+    Compute the changes of the tables after the new basics or ratings data was published.
+    The previous versions of the data are taken from the cache of the parsed data files.
+    The streamed akas data depends on the basics data, so the positions of its rows
+    which order the joined rows would change: the snapshot is refreshed then.
+
+    :param args: argparse.Namespace: Arguments from the command line (without the years)
+    :param changed: List[str]: Names of the changed data
+    :param sources: Dict[str, Dict]: Fingerprints of the source files of the snapshot
+
+    :return: Optional[SnapshotUpdate]: Changes of the tables
+        (None if other data changed, the akas data is streamed
+        or the previous versions are not in the cache)
+    """
+    if (not set(changed) <= set(INCREMENTAL_DATASETS) or args.cache == 'bypass'
+            or args.stream_akas):
+        return None
+
+    files = get_data_files(args)
+    filters = get_filters(args.start, args.end)
+    previous = {}
+    for data_name in changed:
+        previous[data_name] = load_previous_dataset(
+            data_name, files[data_name], sources[files[data_name]]['content_hash'],
+            filters.get(data_name), args.cache_dir,
+        )
+        if previous[data_name] is None:
+            logging.info("The previous version of %s is not in the cache.", data_name)
+            return None
+
+    logging.info("Loading all data...")
+    dataframes = load_all_data(args)
+    if any(data_name not in dataframes for data_name in INCREMENTAL_DATASETS):
+        return None
+    return compute_update(
+        previous, dataframes,
+        lambda basics: join_tables(dict(dataframes, basics=basics), args),
+    )
+
+
+def load_merged_data(args: argparse.Namespace) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Load the merged data of the years from the command line and the bridge table
+    of its movies and their directors.
+    Unless the snapshot is bypassed, the data of all the years is joined once into the snapshot
+    and the next runs read only the partitions of their years and order and clean their rows.
+
+    :param args: argparse.Namespace: Arguments from the command line
+
+    :return: Tuple[pd.DataFrame, pd.DataFrame]: Merged data and the bridge table
+    """
+    if args.snapshot == 'bypass':
+        return load_and_merge(args)
+
+    all_years_args = argparse.Namespace(**dict(vars(args), start=None, end=None))
+    try:
+        return finish_tables(load_snapshot(
+            partial(load_and_join, all_years_args), get_data_files(args),
+            args.start, args.end, snapshot_dir=args.snapshot_dir, mode=args.snapshot,
+            updater=partial(update_merged_data, all_years_args),
+        ))
+    except Exception as exc_err:
+        logging.error("An error occurred while using the snapshot: %s", str(exc_err))
+        return load_and_merge(args)
+
+
+def run(args: argparse.Namespace) -> None:
+    """
+    Main function to run the film data analysis app.
+
+    :param args: argparse.Namespace: Arguments from the command line
+    :return: None
+    """
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s: %(message)s')
+    logging.info("Starting the data analysis app with profiler...")
+    # The tasks share the merged data: the selections of its columns do not copy the data
+    pd.set_option('mode.copy_on_write', True)
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    merged_data, directors_df = load_merged_data(args)
+
+    logging.info("Performing analysis...")
+    run_tasks([
+        ('task 1', partial(perform_task_1, ns=args.num_of_films), {}),
+        ('task 2', perform_task_2, {}),
+        ('task 3', partial(perform_task_3, ns=args.num_of_films), {'directors_df': directors_df}),
+    ], merged_data, args.tasks)
 
     profiler.disable()
 
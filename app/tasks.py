@@ -0,0 +1,181 @@
+"""Run the analysis tasks sequentially or concurrently in threads or processes."""
+import contextlib
+import io
+import logging
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import redirect_stdout
+from functools import partial
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import pandas as pd
+
+from data_analysis.shared_data import SharedFrame, call_with_shared_frames, share_frame
+
+TASK_EXECUTORS = ('sequential', 'threads', 'processes')
+# Name of the task, the function performing it on the merged data and the other data
+# of the task passed to the function as the keyword arguments of their names
+Task = Tuple[str, Callable[..., None], Dict[str, pd.DataFrame]]
+
+_THREAD_OUTPUT = threading.local()
+
+
+class ThreadOutput(io.TextIOBase):
+    """
+    Standard output writing the text printed by the tasks run in threads to their buffers,
+    so the outputs of the tasks are not interleaved.
+    The text printed by other threads goes to the original standard output.
+    """
+
+    def __init__(self, stdout: io.TextIOBase):
+        super().__init__()
+        self._stdout = stdout
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        """
+        Write the text to the buffer of the current task or to the original standard output.
+
+        :param text: str: Text to write
+
+        :return: int: Number of characters written
+        """
+        return getattr(_THREAD_OUTPUT, 'buffer', self._stdout).write(text)
+
+    def flush(self) -> None:
+        self._stdout.flush()
+
+
+def run_tasks(tasks: Sequence[Task], merged_df: pd.DataFrame, executor: str = 'sequential') -> None:
+    """
+    Run the analysis tasks on the merged data.
+    With the threads or processes executor, the tasks run concurrently and the text they print
+    is buffered and printed in the order of the tasks once all of them have finished.
+    The merged data and the other data of the tasks are handed to the worker processes
+    through shared memory instead of being pickled to them.
+
+    :param tasks: Sequence[Task]: Names of the tasks, the functions performing them
+        and their other data
+    :param merged_df: pd.DataFrame: Merged data (not modified by the tasks)
+    :param executor: str: 'sequential', 'threads' or 'processes'
+
+    :return: None
+    """
+    if executor not in TASK_EXECUTORS:
+        raise ValueError(f"Invalid task executor: {executor}.")
+    if executor == 'sequential':
+        for name, task, data in tasks:
+            run_task(name, task, merged_df, data)
+        return
+
+    outputs: List[str] = []
+    if executor == 'threads':
+        with redirect_stdout(ThreadOutput(sys.stdout)), \
+                ThreadPoolExecutor(max_workers=len(tasks)) as pool:
+            futures = [pool.submit(run_task_in_thread, name, task, merged_df, data)
+                       for name, task, data in tasks]
+            outputs = [future.result() for future in futures]
+    else:
+        copy_on_write = pd.get_option('mode.copy_on_write')
+        with contextlib.ExitStack() as stack:
+            shared = stack.enter_context(share_frame(merged_df))
+            shared_data = [{key: stack.enter_context(share_frame(df)) for key, df in data.items()}
+                           for _, _, data in tasks]
+            pool = stack.enter_context(ProcessPoolExecutor(
+                max_workers=len(tasks), initializer=pd.set_option,
+                initargs=('mode.copy_on_write', copy_on_write)))
+            futures = [pool.submit(run_task_in_process, name, task, shared, task_data)
+                       for (name, task, _), task_data in zip(tasks, shared_data)]
+            outputs = [future.result() for future in futures]
+
+    for output in outputs:
+        sys.stdout.write(output)
+
+
+def run_task(
+        name: str, task: Callable[..., None], merged_df: pd.DataFrame,
+        data: Dict[str, pd.DataFrame],
+) -> None:
+    """
+    Run the task and log its errors, so they do not stop the other tasks.
+
+    :param name: str: Name of the task
+    :param task: Callable[..., None]: Function performing the task
+    :param merged_df: pd.DataFrame: Merged data
+    :param data: Dict[str, pd.DataFrame]: Other data of the task
+
+    :return: None
+    """
+    try:
+        task(merged_df, **data)
+    except KeyError as key_err:
+        logging.error("Key error in %s: %s", name, str(key_err))
+    except Exception as exc_err:
+        logging.error("An error occurred during %s: %s", name, str(exc_err))
+
+
+def run_task_in_thread(
+        name: str, task: Callable[..., None], merged_df: pd.DataFrame,
+        data: Dict[str, pd.DataFrame],
+) -> str:
+    """
+    Run the task in a worker thread with its printed text buffered.
+
+    :param name: str: Name of the task
+    :param task: Callable[..., None]: Function performing the task
+    :param merged_df: pd.DataFrame: Merged data
+    :param data: Dict[str, pd.DataFrame]: Other data of the task
+
+    :return: str: Text printed by the task
+    """
+    _THREAD_OUTPUT.buffer = io.StringIO()
+    try:
+        run_task(name, task, merged_df, data)
+        return _THREAD_OUTPUT.buffer.getvalue()
+    finally:
+        del _THREAD_OUTPUT.buffer
+
+
+def run_task_in_process(
+        name: str, task: Callable[..., None], shared: SharedFrame,
+        shared_data: Dict[str, SharedFrame],
+) -> str:
+    """
+    Run the task in a worker process on the merged data and its other data in shared memory,
+    with its printed text buffered.
+
+    :param name: str: Name of the task
+    :param task: Callable[..., None]: Function performing the task
+    :param shared: SharedFrame: Description of the merged data in shared memory
+    :param shared_data: Dict[str, SharedFrame]: Descriptions of the other data of the task
+
+    :return: str: Text printed by the task
+    """
+    buffer = io.StringIO()
+    with redirect_stdout(buffer):
+        call_with_shared_frames(
+            [shared, *shared_data.values()],
+            partial(run_task_on_frames, name, task, list(shared_data)),
+        )
+    return buffer.getvalue()
+
+
+def run_task_on_frames(
+        name: str, task: Callable[..., None], keys: List[str],
+        merged_df: pd.DataFrame, *data_dfs: pd.DataFrame,
+) -> None:
+    """
+    Run the task on the merged data and its other data given in the order of their keys.
+
+    :param name: str: Name of the task
+    :param task: Callable[..., None]: Function performing the task
+    :param keys: List[str]: Names of the other data of the task
+    :param merged_df: pd.DataFrame: Merged data
+    :param data_dfs: pd.DataFrame: Other data of the task
+
+    :return: None
+    """
+    run_task(name, task, merged_df, dict(zip(keys, data_dfs)))
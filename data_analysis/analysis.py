@@ -1,25 +1,47 @@
 """Perform analysis on the merged data."""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
 import pandas as pd
+from pandas.api.types import is_integer_dtype
 
 PATH_TO_SAVE_RESULTS = "./results"
 MARGIN = 100
 NUM_OF_FILMS_TO_PROCESS = (10, 20, 50, 100, 200)
-
-
-def perform_task_1(merged_df: pd.DataFrame) -> None:
+# Columns of the merged data describing the movies, the other ones are the country indicators
+MOVIE_COLUMNS = ('country_code', 'country_name', 'year', 'title', 'average_rating',
+                 'num_of_votes')
+# Columns of the merged data used by the tasks (the task 2 uses also the country indicators)
+TASK_1_COLUMNS = ('country_code', 'country_name', 'year', 'title', 'average_rating', 'num_of_votes')
+TASK_2_COLUMNS = ('country_code', 'country_name', 'year', 'average_rating', 'num_of_votes')
+TASK_3_COLUMNS = ('year', 'average_rating', 'num_of_votes')
+# Country indicators always present in the merged data with the names of their rank columns,
+# the names in the result files and the names in the printed results
+HEGEMONY_INDICATORS = {
+    'population': ('pop_rank', 'pop', 'population'),
+    'gdp': ('gdp_rank', 'gdp', 'GDP'),
+    'gdp_per_population': ('gdp_per_population_rank', 'gdp_per_pop', 'GDP per population'),
+}
+
+
+def perform_task_1(
+        merged_df: pd.DataFrame, ns: Sequence[int] = NUM_OF_FILMS_TO_PROCESS,
+) -> None:
     """
     Perform the task 1 analysis.
 
     :param merged_df: pd.DataFrame: Merged dataframe with the movie data
+    :param ns: Sequence[int]: Numbers of top movies per country to process
 
     :return: None
     """
+    merged_df = select_columns(merged_df, TASK_1_COLUMNS)
     start_year = merged_df['year'].min()
     end_year = merged_df['year'].max()
+    top_ratings = get_top_movies_per_country(merged_df, ns)
 
     print('----- Results for Task 1: -----')
-    for n in NUM_OF_FILMS_TO_PROCESS:
-        top_n_ratings_df = get_top_n_movies_per_country(merged_df, n)
+    for n, top_n_ratings_df in top_ratings.items():
         top_n_ratings_df = top_n_ratings_df.sort_values(by='avg_rating', ascending=False)
         top_n_ratings_df.to_csv(
             f'{PATH_TO_SAVE_RESULTS}/1_top_{n}_ratings_{start_year}_{end_year}.csv',
@@ -31,6 +53,20 @@ def perform_task_1(merged_df: pd.DataFrame) -> None:
     print('\nThe full results are saved in the results folder.')
 
 
+def select_columns(merged_df: pd.DataFrame, columns: Sequence[str]) -> pd.DataFrame:
+    """
+    Select the columns of the merged data used by a task.
+    The merged data is shared by the tasks and is never modified by them. With the copy-on-write
+    mode of pandas (enabled by the app) the selected columns share the data of the merged data.
+
+    :param merged_df: pd.DataFrame: Merged dataframe with the movie data
+    :param columns: Sequence[str]: Columns used by the task
+
+    :return: pd.DataFrame: Dataframe with the selected columns
+    """
+    return merged_df[list(columns)]
+
+
 def get_top_n_movies_per_country(movies_df: pd.DataFrame, n: int) -> pd.DataFrame:
     """
     Get the average rating of the top n movies per country.
@@ -43,107 +79,237 @@ def get_top_n_movies_per_country(movies_df: pd.DataFrame, n: int) -> pd.DataFram
 
     :return: Pd.DataFrame: Dataframe with the average rating of the top n movies per country
     """
+    return get_top_movies_per_country(movies_df, [n])[n]
+
+
+def get_top_movies_per_country(
+        movies_df: pd.DataFrame, ns: Sequence[int],
+) -> Dict[int, pd.DataFrame]:
+    """
+    Get the average rating of the top n movies per country for every n.
+    The top movies of every country for the largest n are selected without sorting
+    all the movies, and only they are sorted. The top n movies of a country are the first
+    n movies of the country, so the numbers of votes and films for every n are read from
+    the cumulative sums over the sorted movies at the n-th movie of each country.
+    The average ratings are the means of these movies (the differences of the cumulative sums
+    of the ratings would carry the rounding errors of the other movies).
+
+    :param movies_df: pd.DataFrame: Dataframe with the movies data
+    :param ns: Sequence[int]: Numbers of top movies to choose per country
+
+    :return: Dict[int, pd.DataFrame]: Dataframes with the average rating
+        of the top n movies per country by n
+    """
+    if not ns:
+        return {}
+
     country_movie_counts = movies_df['country_code'].value_counts()
-    countries_with_at_least_n_films = country_movie_counts[country_movie_counts >= n].index
-    valid_df = movies_df[movies_df['country_code'].isin(countries_with_at_least_n_films)]
+    countries_with_enough_films = country_movie_counts[country_movie_counts >= min(ns)].index
+    valid_df = movies_df[movies_df['country_code'].isin(countries_with_enough_films)]
+    # Only the top movies of the countries for the largest n are sorted
+    valid_df = valid_df.iloc[select_top_movies(valid_df, max(ns))]
     valid_df = valid_df.sort_values(
         by=['country_name', 'country_code', 'average_rating', 'num_of_votes'],
         ascending=[True, True, False, False],
     )
 
-    top_n_movies_df = valid_df.groupby('country_code').head(n)
-    top_n_ratings_df = top_n_movies_df.groupby(['country_name', 'country_code']).agg({
-        'average_rating': 'mean',
-        'num_of_votes': 'sum',
-        'title': 'count'
-    }).reset_index()
+    country_starts, country_sizes = get_blocks(valid_df, ['country_name', 'country_code'])
+
+    ratings = get_ratings(valid_df)
+    votes = valid_df['num_of_votes']
+    votes = votes.to_numpy(dtype='int64' if is_integer_dtype(votes) else 'float64', na_value=0)
+    cumulative = {
+        'total_votes': cumulative_sum(votes),
+        'film_count': cumulative_sum(valid_df['title'].notna().to_numpy()),
+    }
+
+    top_ratings = {}
+    for n in ns:
+        starts = country_starts[country_sizes >= n]
+        sums = {column: values[starts + n] - values[starts]
+                for column, values in cumulative.items()}
+        top_ratings[n] = pd.DataFrame({
+            'country_name': valid_df['country_name'].iloc[starts].reset_index(drop=True),
+            'country_code': valid_df['country_code'].iloc[starts].reset_index(drop=True),
+            'avg_rating': window_means(ratings, starts, n),
+            'total_votes': sums['total_votes'],
+            'film_count': sums['film_count'].astype('int64'),
+        })
+    return top_ratings
+
+
+def select_top_movies(movies_df: pd.DataFrame, n: int) -> np.ndarray:
+    """
+    Select the top n movies of every country by the rating and then the number of votes
+    without sorting the movies. The movies without the rating or votes are the last ones.
+
+    :param movies_df: pd.DataFrame: Dataframe with the movies data
+    :param n: int: Number of top movies to select per country
+
+    :return: np.ndarray: Positions of the selected movies (in no particular order)
+    """
+    ratings = movies_df['average_rating'].to_numpy(dtype='float64', na_value=-np.inf)
+    votes = movies_df['num_of_votes'].to_numpy(dtype='float64', na_value=-np.inf)
+
+    selected = [np.empty(0, dtype='int64')]
+    for positions in movies_df.groupby(
+            ['country_name', 'country_code'], observed=True).indices.values():
+        if len(positions) > n:
+            positions = positions[top_n_positions(ratings[positions], votes[positions], n)]
+        selected.append(positions)
+    return np.concatenate(selected)
+
+
+def top_n_positions(ratings: np.ndarray, votes: np.ndarray, n: int) -> np.ndarray:
+    """
+    Find the positions of the n largest ratings, with the ties of the n-th rating
+    broken by the larger number of votes, by partitioning instead of sorting.
+
+    :param ratings: np.ndarray: Ratings of the movies
+    :param votes: np.ndarray: Numbers of votes of the movies
+    :param n: int: Number of movies to select (less than the number of movies)
+
+    :return: np.ndarray: Positions of the selected movies
+    """
+    threshold = np.partition(ratings, len(ratings) - n)[len(ratings) - n]
+    above = np.flatnonzero(ratings > threshold)
+    tied = np.flatnonzero(ratings == threshold)
+    missing = n - len(above)
+    if len(tied) > missing:
+        tied = tied[np.argpartition(-votes[tied], missing - 1)[:missing]]
+    return np.concatenate([above, tied])
+
+
+def get_blocks(df: pd.DataFrame, columns: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the blocks of the consecutive rows with the same keys in the sorted data.
+
+    :param df: pd.DataFrame: Data sorted by the keys
+    :param columns: List[str]: Columns with the keys
+
+    :return: Tuple[np.ndarray, np.ndarray]: Positions of the first rows of the blocks
+        and the numbers of their rows
+    """
+    groups = df.groupby(columns, observed=True, sort=False)
+    starts = np.flatnonzero(np.diff(groups.ngroup().to_numpy(), prepend=-1))
+    return starts, np.diff(np.append(starts, len(df)))
+
+
+def get_ratings(movies_df: pd.DataFrame) -> np.ndarray:
+    """
+    Get the ratings of the movies as float64 numbers to compute their averages.
+    The ratings stored as float32 are converted by their shortest decimal representation
+    (7.3 instead of 7.300000190734863), so they are the numbers of the IMDb data
+    and the averages do not carry the float32 rounding errors.
+
+    :param movies_df: pd.DataFrame: Dataframe with the movies data
+
+    :return: np.ndarray: Ratings of the movies (NaN for the missing ones)
+    """
+    ratings = movies_df['average_rating']
+    if ratings.dtype != np.float32:
+        return ratings.to_numpy(dtype='float64', na_value=np.nan)
+    # The ratings have few distinct values, so only these are converted by their text
+    values, inverse = np.unique(ratings.to_numpy(), return_inverse=True)
+    return values.astype(str).astype('float64')[inverse]
+
+
+def window_means(values: np.ndarray, starts: np.ndarray, length: int) -> np.ndarray:
+    """
+    Compute the means of the windows of the values (without the missing values)
+    in the same way as the means of the groups of pandas.
+
+    :param values: np.ndarray: Values to average
+    :param starts: np.ndarray: Positions of the first values of the windows
+    :param length: int: Number of values in every window
+
+    :return: np.ndarray: Means of the windows (NaN for the windows without values)
+    """
+    if length == 0 or len(starts) == 0:
+        return np.full(len(starts), np.nan)
+    window_ids = np.repeat(np.arange(len(starts)), length)
+    rows = np.repeat(starts, length) + np.tile(np.arange(length), len(starts))
+    return pd.Series(values[rows]).groupby(window_ids).mean().to_numpy()
+
+
+def cumulative_sum(values: np.ndarray) -> np.ndarray:
+    """
+    Compute the cumulative sum of the values starting with 0,
+    so the sum of the values from i to j - 1 is the difference of the sums at j and i.
+
+    :param values: np.ndarray: Values to sum
 
-    top_n_ratings_df.columns = [
-        'country_name', 'country_code', 'avg_rating', 'total_votes', 'film_count',
-    ]
-    return top_n_ratings_df
+    :return: np.ndarray: Cumulative sums (one more than the values)
+    """
+    return np.concatenate([[0], np.cumsum(values)])
 
 
 def perform_task_2(merged_df: pd.DataFrame) -> None:
     """
     Perform the task 2 analysis.
+    The hegemony is computed for the population, GDP and GDP per population
+    and for every other country indicator in the merged data.
 
     :param merged_df: pd.DataFrame: Merged dataframe with the movie data
     :return: None
     """
+    merged_df = select_columns(merged_df, TASK_2_COLUMNS + tuple(get_indicator_columns(merged_df)))
     impact_df = calculate_impact_metrics(merged_df)
     rank_df = create_rank_dataframe(impact_df, merged_df)
 
     start_year = merged_df['year'].min()
     end_year = merged_df['year'].max()
 
-    # Compute hegemony for population
-    hegemony_pop_df = compute_hegemony(rank_df, 'population', 'pop_rank')
-    hegemony_pop_df.to_csv(
-        f'{PATH_TO_SAVE_RESULTS}/2_hegemony_pop_result_{start_year}_{end_year}.csv',
-        index=False)
-
-    # Compute hegemony for GDP
-    hegemony_gdp_df = compute_hegemony(rank_df, 'gdp', 'gdp_rank')
-    hegemony_gdp_df.to_csv(
-        f'{PATH_TO_SAVE_RESULTS}/2_hegemony_gdp_result_{start_year}_{end_year}.csv',
-        index=False)
-
-    # Compute hegemony for GDP per population
-    hegemony_gdp_per_pop_df = compute_hegemony(
-        rank_df, 'gdp_per_population', 'gdp_per_population_rank',
-    )
-    hegemony_gdp_per_pop_df.to_csv(
-        f'{PATH_TO_SAVE_RESULTS}/2_hegemony_gdp_per_pop_result_{start_year}_{end_year}.csv',
-        index=False)
-
-    hegemony_pop_weak_df = (hegemony_pop_df[['Country Name', 'Weak Hegemony Indicator',
-                                             'Country Population Rank', 'Weak Impact Rank']].
-                            sort_values(by='Weak Hegemony Indicator', ascending=False))
-    hegemony_pop_strong_df = (hegemony_pop_df[['Country Name', 'Strong Hegemony Indicator',
-                                               'Country Population Rank', 'Strong Impact Rank']].
-                              sort_values(by='Strong Hegemony Indicator', ascending=False))
-
-    hegemony_gdp_weak_df = (hegemony_gdp_df[['Country Name', 'Weak Hegemony Indicator',
-                                             'Country Gdp Rank', 'Weak Impact Rank']].
-                            sort_values(by='Weak Hegemony Indicator', ascending=False))
-    hegemony_gdp_strong_df = (hegemony_gdp_df[['Country Name', 'Strong Hegemony Indicator',
-                                               'Country Gdp Rank', 'Strong Impact Rank']].
-                              sort_values(by='Strong Hegemony Indicator', ascending=False))
-
-    hegemony_gdp_per_pop_weak_df = (hegemony_gdp_per_pop_df[
-                                        ['Country Name', 'Weak Hegemony Indicator',
-                                         'Country GdpPerPopulation Rank', 'Weak Impact Rank']].
-                                    sort_values(by='Weak Hegemony Indicator', ascending=False))
-    hegemony_gdp_per_pop_strong_df = (hegemony_gdp_per_pop_df[
-                                          ['Country Name', 'Strong Hegemony Indicator',
-                                           'Country GdpPerPopulation Rank',
-                                           'Strong Impact Rank']].
-                                      sort_values(by='Strong Hegemony Indicator', ascending=False))
+    hegemony_dfs = []
+    for indicator in get_indicator_columns(merged_df):
+        rank_column, file_name, label = get_indicator_names(indicator)
+        hegemony_df = compute_hegemony(rank_df, indicator, rank_column)
+        hegemony_df.to_csv(
+            f'{PATH_TO_SAVE_RESULTS}/2_hegemony_{file_name}_result_{start_year}_{end_year}.csv',
+            index=False)
+        hegemony_dfs.append((label, hegemony_df))
 
     print('----- Results for Task 2: -----')
-    print('-' * MARGIN)
-    print('Top 10 countries with the highest weak population hegemony:')
-    print(hegemony_pop_weak_df.head(10))
-    print('-' * MARGIN)
-    print('Top 10 countries with the highest strong population hegemony:')
-    print(hegemony_pop_strong_df.head(10))
-    print('-' * MARGIN)
-    print('Top 10 countries with the highest weak GDP hegemony:')
-    print(hegemony_gdp_weak_df.head(10))
-    print('-' * MARGIN)
-    print('Top 10 countries with the highest strong GDP hegemony:')
-    print(hegemony_gdp_strong_df.head(10))
-    print('-' * MARGIN)
-    print('Top 10 countries with the highest weak GDP per population hegemony:')
-    print(hegemony_gdp_per_pop_weak_df.head(10))
-    print('-' * MARGIN)
-    print('Top 10 countries with the highest strong GDP per population hegemony:')
-    print(hegemony_gdp_per_pop_strong_df.head(10))
+    for label, hegemony_df in hegemony_dfs:
+        country_rank = hegemony_df.columns[1]
+        for impact in ('Weak', 'Strong'):
+            print('-' * MARGIN)
+            print(f'Top 10 countries with the highest {impact.lower()} {label} hegemony:')
+            print(hegemony_df[['Country Name', f'{impact} Hegemony Indicator',
+                               country_rank, f'{impact} Impact Rank']].
+                  sort_values(by=f'{impact} Hegemony Indicator', ascending=False).head(10))
 
     print('\nThe full results are saved in the results folder.')
 
 
+def get_indicator_columns(merged_df: pd.DataFrame) -> List[str]:
+    """
+    Get the country indicators of the merged data: the GDP, population
+    and GDP per population first, then the other indicators in the order of the columns.
+
+    :param merged_df: pd.DataFrame: Merged data
+
+    :return: List[str]: Names of the indicator columns
+    """
+    other_indicators = [column for column in merged_df.columns
+                        if column not in MOVIE_COLUMNS and column not in HEGEMONY_INDICATORS]
+    return list(HEGEMONY_INDICATORS) + other_indicators
+
+
+def get_indicator_names(indicator: str) -> Tuple[str, str, str]:
+    """
+    Get the name of the rank column of the indicator, its name in the result files
+    and its name in the printed results.
+
+    :param indicator: str: Name of the indicator column
+
+    :return: Tuple[str, str, str]: Rank column, file name and label of the indicator
+    """
+    return HEGEMONY_INDICATORS.get(
+        indicator, (f'{indicator}_rank', indicator, indicator.replace('_', ' ')),
+    )
+
+
 def calculate_impact_metrics(merged_df: pd.DataFrame) -> pd.DataFrame:
     """
     Calculate weak impact and strong impact metrics.
@@ -151,7 +317,9 @@ def calculate_impact_metrics(merged_df: pd.DataFrame) -> pd.DataFrame:
     :param merged_df: pd.DataFrame: Merged data
     :return: pd.DataFrame: Data with impact metrics
     """
-    impact_df = merged_df.groupby(['country_name', 'country_code']).agg(
+    if merged_df['average_rating'].dtype == np.float32:
+        merged_df = merged_df.assign(average_rating=get_ratings(merged_df))
+    impact_df = merged_df.groupby(['country_name', 'country_code'], observed=True).agg(
         weak_impact=('num_of_votes', 'sum'),
         strong_impact=('average_rating', 'mean')
     ).reset_index()
@@ -161,28 +329,32 @@ def calculate_impact_metrics(merged_df: pd.DataFrame) -> pd.DataFrame:
 
 def create_rank_dataframe(impact_df: pd.DataFrame, merged_df: pd.DataFrame) -> pd.DataFrame:
     """
-    Create a dataframe with the ranks of the impact metrics.
+    Create a dataframe with the ranks of the impact metrics and of the country indicators.
+    Countries without the value of an indicator get the last ranks of that indicator.
 
     :param impact_df: pd.DataFrame: Data with impact metrics
     :param merged_df: pd.DataFrame: Merged data
 
     :return: pd.DataFrame: Data with adjusted impact metrics
     """
-    population_gdp_df = (merged_df[['country_code', 'population', 'gdp', 'gdp_per_population']].
-                         drop_duplicates('country_code'))
+    indicators = get_indicator_columns(merged_df)
+    population_gdp_df = merged_df[['country_code'] + indicators].drop_duplicates('country_code')
 
     # Merge once with population and GDP data
     impact_df = impact_df.merge(population_gdp_df, on='country_code', how='left')
 
     impact_df['weak_impact_rank'] = impact_df['weak_impact'].rank(ascending=False).astype(int)
     impact_df['strong_impact_rank'] = impact_df['strong_impact'].rank(ascending=False).astype(int)
-    impact_df['gdp_rank'] = impact_df['gdp'].rank(ascending=False).astype(int)
-    impact_df['pop_rank'] = impact_df['population'].rank(ascending=False).astype(int)
-    impact_df['gdp_per_population_rank'] = (impact_df['gdp_per_population'].
-                                            rank(ascending=False).astype(int))
+    rank_columns = []
+    # The GDP rank comes first in the rank data
+    for indicator in ['gdp'] + [indicator for indicator in indicators if indicator != 'gdp']:
+        rank_column = get_indicator_names(indicator)[0]
+        impact_df[rank_column] = (impact_df[indicator].
+                                  rank(ascending=False, na_option='bottom').astype(int))
+        rank_columns.append(rank_column)
 
-    return impact_df[['country_name', 'country_code', 'weak_impact_rank', 'strong_impact_rank',
-                      'gdp_rank', 'pop_rank', 'gdp_per_population_rank']]
+    return impact_df[['country_name', 'country_code', 'weak_impact_rank', 'strong_impact_rank']
+                     + rank_columns]
 
 
 def compute_hegemony(rank_df: pd.DataFrame, rank_type: str, rank_column: str) -> pd.DataFrame:
@@ -197,9 +369,10 @@ def compute_hegemony(rank_df: pd.DataFrame, rank_type: str, rank_column: str) ->
 
     :return: pd.DataFrame: Dataframe with the hegemony metrics for the specified rank type
     """
-    df = rank_df[['country_name', rank_column, 'weak_impact_rank', 'strong_impact_rank']].copy()
-    df[f'weak_{rank_type}_hegemony'] = df[rank_column] - df['weak_impact_rank']
-    df[f'strong_{rank_type}_hegemony'] = df[rank_column] - df['strong_impact_rank']
+    df = rank_df[['country_name', rank_column, 'weak_impact_rank', 'strong_impact_rank']].assign(**{
+        f'weak_{rank_type}_hegemony': rank_df[rank_column] - rank_df['weak_impact_rank'],
+        f'strong_{rank_type}_hegemony': rank_df[rank_column] - rank_df['strong_impact_rank'],
+    })
 
     df.columns = ['Country Name',
                   f'Country {"".join(x.capitalize() for x in rank_type.split("_"))} Rank',
@@ -209,29 +382,44 @@ def compute_hegemony(rank_df: pd.DataFrame, rank_type: str, rank_column: str) ->
     return df
 
 
-def perform_task_3(merged_df: pd.DataFrame) -> None:
+def perform_task_3(
+        merged_df: pd.DataFrame,
+        directors_df: pd.DataFrame,
+        ns: Sequence[int] = NUM_OF_FILMS_TO_PROCESS,
+) -> None:
     """
     Perform the task 3 analysis.
+    The movies are joined with their directors here and the names of the directors
+    are looked up only for the results.
 
     :param merged_df: pd.DataFrame: Merged dataframe with the movie data
+    :param directors_df: pd.DataFrame: Bridge table of the movies and their directors
+        (title_id, director_id and director_name columns)
+    :param ns: Sequence[int]: Numbers of films of the directors to process
 
     :return: None
     """
-    merged_df.dropna(subset=['director_name', 'director_id'], inplace=True)
-
-    film_counts = merged_df['director_id'].value_counts()
+    director_films = get_director_films(
+        select_columns(merged_df, TASK_3_COLUMNS), directors_df[['title_id', 'director_id']],
+    )
+    director_names = directors_df.drop_duplicates('director_id').set_index(
+        'director_id')['director_name']
 
-    start_year = merged_df['year'].min()
-    end_year = merged_df['year'].max()
+    start_year = director_films['year'].min()
+    end_year = director_films['year'].max()
+    career_progressions = get_career_progressions(director_films, list(dict.fromkeys(ns)))
 
     print('----- Results for Task 3: -----')
-    for n in NUM_OF_FILMS_TO_PROCESS:
-        eligible_directors = film_counts[film_counts >= n].index
-        if not eligible_directors.any():
+    for n in dict.fromkeys(ns):
+        if n not in career_progressions:
             print(f"No directors with at least {n} films found in specified time range.")
             continue
 
-        career_progression = calculate_career_progression(merged_df, n, eligible_directors)
+        # The directors are ordered by their names, so the directors with the same
+        # progression are listed by their names
+        career_progression = career_progressions[n].assign(
+            directors=lambda df: director_names.reindex(df['director_id']).to_numpy(),
+        ).sort_values(by='directors', kind='stable')
 
         res_rating = career_progression[
             ['directors', 'first_avg_rating', 'last_avg_rating', 'rating_diff']
@@ -263,6 +451,23 @@ def perform_task_3(merged_df: pd.DataFrame) -> None:
     print('\nThe full results are saved in the results folder.')
 
 
+def get_director_films(movies_df: pd.DataFrame, directors_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Join the movies with the bridge table of their directors,
+    so a co-directed movie counts for each of its directors.
+    The films are in the order of the movies, which decides the first and the last films
+    of a director among the films of the same year.
+
+    :param movies_df: pd.DataFrame: Dataframe with the movies data (indexed by title_id)
+    :param directors_df: pd.DataFrame: Bridge table of the movies and their directors
+
+    :return: pd.DataFrame: Films of the directors (indexed by title_id)
+    """
+    positions = pd.DataFrame({'title_id': movies_df.index, 'position': np.arange(len(movies_df))})
+    films = positions.merge(directors_df, on='title_id').sort_values(by='position', kind='stable')
+    return movies_df.iloc[films['position']].assign(director_id=films['director_id'].to_numpy())
+
+
 def calculate_career_progression(
         merged_df: pd.DataFrame, n: int, eligible_directors: pd.Series,
 ) -> pd.DataFrame:
@@ -270,32 +475,100 @@ def calculate_career_progression(
     Calculate the career progression of the directors
     based on the average rating and the number of votes.
 
-    :param merged_df: pd.DataFrame: Merged data
+    :param merged_df: pd.DataFrame: Films of the directors (indexed by title_id)
     :param n: int: Number of films to consider
     :param eligible_directors: pd.Series: Series with the eligible directors
 
     :return: pd.DataFrame: Dataframe with the career progression of the directors
     """
     director_films = merged_df[merged_df['director_id'].isin(eligible_directors)]
+    return get_career_progressions(director_films, [n]).get(n, empty_career_progression())
+
+
+def get_career_progressions(
+        director_films: pd.DataFrame, ns: Sequence[int],
+) -> Dict[int, pd.DataFrame]:
+    """
+    Calculate the career progression of the directors with at least n films for every n.
+    The directors are identified by their identifiers (the names are not unique).
+    The films are sorted once by the director and the year, so the first and the last n / 2
+    films of a director are at the start and the end of the director's block. Their numbers
+    of votes for every n are read from the cumulative sums over the sorted films and their
+    average ratings are the means of these films.
+
+    :param director_films: pd.DataFrame: Films of the directors (indexed by title_id)
+    :param ns: Sequence[int]: Numbers of films to consider
+
+    :return: Dict[int, pd.DataFrame]: Dataframes with the career progression of the directors
+        by n (without the n for which no director has enough films)
+    """
+    if not ns or director_films.empty:
+        return {}
+
+    film_counts = director_films['director_id'].value_counts()
+    director_films = director_films[
+        director_films['director_id'].isin(film_counts[film_counts >= min(ns)].index)]
     director_films = director_films.sort_values(by=['director_id', 'year'])
 
-    first_films = director_films.groupby('director_id').head(n / 2)
-    last_films = director_films.groupby('director_id').tail(n / 2)
+    director_starts, director_sizes = get_blocks(director_films, ['director_id'])
+
+    ratings = get_ratings(director_films)
+    votes = director_films['num_of_votes']
+    votes = votes.to_numpy(dtype='int64' if is_integer_dtype(votes) else 'float64', na_value=0)
+    cumulative_votes = cumulative_sum(votes)
+
+    career_progressions = {}
+    for n in ns:
+        eligible = director_sizes >= n
+        if not eligible.any():
+            continue
+        first_starts = director_starts[eligible]
+        last_starts = first_starts + director_sizes[eligible] - n // 2
+        first_stats, last_stats = (
+            {'avg_rating': window_means(ratings, starts, n // 2),
+             'num_of_votes': cumulative_votes[starts + n // 2] - cumulative_votes[starts]}
+            for starts in (first_starts, last_starts))
+        career_progressions[n] = compute_progression(
+            director_films['director_id'].iloc[first_starts], first_stats, last_stats,
+            n // 2 > 0,
+        )
+    return career_progressions
+
+
+def compute_progression(
+        directors: pd.Series, first_stats: Dict[str, np.ndarray],
+        last_stats: Dict[str, np.ndarray], has_films: bool,
+) -> pd.DataFrame:
+    """
+    Compute the progression between the first and the last films of the directors
+    from the average ratings and the sums of the votes of these films.
 
-    first_stats = first_films.groupby('director_name').agg({
-        'average_rating': 'mean',
-        'num_of_votes': 'sum'
-    }).reset_index()
-    first_stats.columns = ['directors', 'first_avg_rating', 'first_num_of_votes']
+    :param directors: pd.Series: Identifiers of the directors
+    :param first_stats: Dict[str, np.ndarray]: Statistics of the first films of the directors
+    :param last_stats: Dict[str, np.ndarray]: Statistics of the last films of the directors
+    :param has_films: bool: Whether the first and the last films are not empty
 
-    last_stats = last_films.groupby('director_name').agg({
-        'average_rating': 'mean',
-        'num_of_votes': 'sum'
-    }).reset_index()
-    last_stats.columns = ['directors', 'last_avg_rating', 'last_num_of_votes']
+    :return: pd.DataFrame: Dataframe with the career progression of the directors
+    """
+    if not has_films:
+        return empty_career_progression()
 
-    progression = first_stats.merge(last_stats, on='directors')
+    progression = pd.DataFrame({'director_id': directors.reset_index(drop=True)})
+    for period, stats in (('first', first_stats), ('last', last_stats)):
+        progression[f'{period}_avg_rating'] = stats['avg_rating']
+        progression[f'{period}_num_of_votes'] = stats['num_of_votes']
     progression['rating_diff'] = progression['last_avg_rating'] - progression['first_avg_rating']
     progression['votes_diff'] = progression['last_num_of_votes'] - progression['first_num_of_votes']
 
     return progression
+
+
+def empty_career_progression() -> pd.DataFrame:
+    """
+    Create the career progression without any director.
+
+    :return: pd.DataFrame: Empty dataframe with the columns of the career progression
+    """
+    return pd.DataFrame(columns=['director_id', 'first_avg_rating', 'first_num_of_votes',
+                                 'last_avg_rating', 'last_num_of_votes',
+                                 'rating_diff', 'votes_diff'])
@@ -0,0 +1,213 @@
+"""Persistent columnar cache of the parsed data files."""
+import hashlib
+import json
+import logging
+import os
+from typing import Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+CACHE_DIR = './cache'
+CACHE_MODES = ('use', 'bypass', 'rebuild')
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def file_fingerprint(file_path: str) -> Dict[str, object]:
+    """
+    Get the cheap fingerprint of the file (path, size and modification time).
+
+    :param file_path: str: Path to the file
+
+    :return: Dict[str, object]: Fingerprint of the file
+    """
+    stat = os.stat(file_path)
+    return {
+        'path': os.path.abspath(file_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+    }
+
+
+def content_hash(file_path: str) -> str:
+    """
+    Compute the hash of the file content.
+
+    :param file_path: str: Path to the file
+
+    :return: str: Hex digest of the file content
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(file_path: str, options: Optional[Dict[str, object]] = None) -> str:
+    """
+    Compute the name of the cache entry for the file loaded with the given options.
+
+    :param file_path: str: Path to the source file
+    :param options: Optional[Dict[str, object]]: Options used to load the file
+
+    :return: str: Name of the cache entry
+    """
+    payload = json.dumps(
+        {'path': os.path.abspath(file_path), 'options': options or {}},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def is_cache_valid(file_path: str, metadata: Dict[str, object]) -> bool:
+    """
+    Check whether the cache entry described by the metadata matches the source file.
+    The content hash is computed only when the size matches but the modification time not.
+    If the content is the same, the new modification time is set in the metadata,
+    so the file is not hashed again once the caller saves it.
+
+    :param file_path: str: Path to the source file
+    :param metadata: Dict[str, object]: Metadata saved together with the cache entry
+
+    :return: bool: True if the cached data can be used
+    """
+    fingerprint = file_fingerprint(file_path)
+    if metadata.get('size') != fingerprint['size']:
+        return False
+    if metadata.get('mtime_ns') == fingerprint['mtime_ns']:
+        return True
+    if metadata.get('content_hash') != content_hash(file_path):
+        return False
+    metadata['mtime_ns'] = fingerprint['mtime_ns']
+    return True
+
+
+def cache_entry_paths(
+        file_path: str, options: Optional[Dict[str, object]], cache_dir: str,
+) -> Tuple[str, str]:
+    """
+    Get the paths to the cached data and to the metadata of the cache entry.
+
+    :param file_path: str: Path to the source file
+    :param options: Optional[Dict[str, object]]: Options used to load the file
+    :param cache_dir: str: Directory with the cache entries
+
+    :return: Tuple[str, str]: Paths to the cached data and to the metadata
+    """
+    key = cache_key(file_path, options)
+    return os.path.join(cache_dir, f'{key}.parquet'), os.path.join(cache_dir, f'{key}.json')
+
+
+def read_cache_entry(
+        file_path: str,
+        content_digest: str,
+        options: Optional[Dict[str, object]] = None,
+        cache_dir: str = CACHE_DIR,
+) -> Optional[pd.DataFrame]:
+    """
+    Read the cached data of the given version of the file, whether the file changed or not.
+
+    :param file_path: str: Path to the source file
+    :param content_digest: str: Hash of the content of the version of the file
+    :param options: Optional[Dict[str, object]]: Options used to load the file
+    :param cache_dir: str: Directory with the cache entries
+
+    :return: Optional[pd.DataFrame]: Cached data (None if the version is not in the cache)
+    """
+    data_path, metadata_path = cache_entry_paths(file_path, options, cache_dir)
+    if not os.path.exists(data_path) or not os.path.exists(metadata_path):
+        return None
+    with open(metadata_path, 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    if metadata.get('content_hash') != content_digest:
+        return None
+    return pd.read_parquet(data_path)
+
+
+def load_cached(
+        loader: Callable[[], pd.DataFrame],
+        file_path: str,
+        options: Optional[Dict[str, object]] = None,
+        cache_dir: str = CACHE_DIR,
+        mode: str = 'use',
+) -> pd.DataFrame:
+    """
+    Load the data through the cache.
+    The source file is parsed with the loader only if the cache entry is missing or stale.
+
+    :param loader: Callable[[], pd.DataFrame]: Function parsing the source file
+    :param file_path: str: Path to the source file
+    :param options: Optional[Dict[str, object]]: Options used by the loader (part of the key)
+    :param cache_dir: str: Directory with the cache entries
+    :param mode: str: 'use' the cache, 'bypass' it or 'rebuild' the entry
+
+    :return: pd.DataFrame: Data from the cache or from the source file
+    """
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Invalid cache mode: {mode}. Available modes: {CACHE_MODES}.")
+    if mode == 'bypass':
+        return loader()
+
+    data_path, metadata_path = cache_entry_paths(file_path, options, cache_dir)
+
+    if mode == 'use' and os.path.exists(data_path) and os.path.exists(metadata_path):
+        with open(metadata_path, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        mtime_ns = metadata.get('mtime_ns')
+        if is_cache_valid(file_path, metadata):
+            logging.info("Cache hit for %s.", file_path)
+            if metadata['mtime_ns'] != mtime_ns:
+                write_metadata(metadata, metadata_path)
+            return pd.read_parquet(data_path)
+        logging.info("Cache entry for %s is stale.", file_path)
+
+    logging.info("Cache miss for %s, parsing the source file...", file_path)
+    data = loader()
+
+    try:
+        save_cache_entry(data, file_path, data_path, metadata_path)
+    except Exception as e:
+        logging.warning("Could not save the cache entry for %s: %s", file_path, str(e))
+
+    return data
+
+
+def save_cache_entry(
+        data: pd.DataFrame, file_path: str, data_path: str, metadata_path: str,
+) -> None:
+    """
+    Save the data and the fingerprint of its source file in the cache.
+
+    :param data: pd.DataFrame: Data parsed from the source file
+    :param file_path: str: Path to the source file
+    :param data_path: str: Path to the cached data
+    :param metadata_path: str: Path to the metadata of the cache entry
+
+    :return: None
+    """
+    os.makedirs(os.path.dirname(data_path) or '.', exist_ok=True)
+    metadata = file_fingerprint(file_path)
+    metadata['content_hash'] = content_hash(file_path)
+
+    tmp_path = f'{data_path}.tmp'
+    try:
+        data.to_parquet(tmp_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, data_path)
+    write_metadata(metadata, metadata_path)
+
+
+def write_metadata(metadata: Dict[str, object], metadata_path: str) -> None:
+    """
+    Save the metadata of the cache entry.
+
+    :param metadata: Dict[str, object]: Fingerprint and content hash of the source file
+    :param metadata_path: str: Path to the metadata of the cache entry
+
+    :return: None
+    """
+    with open(metadata_path, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f)
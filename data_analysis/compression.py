@@ -0,0 +1,198 @@
+"""Open the data files for parsing (pipelined decompression or memory mapping)."""
+import bz2
+import contextlib
+import gzip
+import io
+import logging
+import mmap
+import queue
+import threading
+from typing import BinaryIO, Iterator, Optional, Union
+
+# Suffixes of the compressed files and names of their compressions
+COMPRESSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.zst': 'zstd'}
+BLOCK_SIZE = 1 << 20
+QUEUE_SIZE = 8
+
+
+def get_compression(file_path: str) -> Optional[str]:
+    """
+    Get the compression of the file based on its suffix.
+
+    :param file_path: str: Path to the file
+
+    :return: Optional[str]: Name of the compression or None for an uncompressed file
+    """
+    for suffix, compression in COMPRESSIONS.items():
+        if file_path.endswith(suffix):
+            return compression
+    return None
+
+
+def strip_compression_suffix(file_path: str) -> str:
+    """
+    Remove the suffix of the compression from the file path.
+
+    :param file_path: str: Path to the file
+
+    :return: str: Path to the file without the suffix of the compression
+    """
+    for suffix in COMPRESSIONS:
+        if file_path.endswith(suffix):
+            return file_path[:-len(suffix)]
+    return file_path
+
+
+def open_compressed(file_path: str, compression: str) -> BinaryIO:
+    """
+    Open the compressed file for reading its decompressed content.
+
+    :param file_path: str: Path to the compressed file
+    :param compression: str: Name of the compression ('gzip', 'bz2' or 'zstd')
+
+    :return: BinaryIO: File object with the decompressed content
+    """
+    if compression == 'gzip':
+        return gzip.open(file_path, 'rb')
+    if compression == 'bz2':
+        return bz2.open(file_path, 'rb')
+    if compression == 'zstd':
+        import zstandard  # pylint: disable=import-outside-toplevel
+        return zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), closefd=True)
+    raise ValueError(f"Invalid compression: {compression}.")
+
+
+class PipelinedDecompressor(io.RawIOBase):
+    """
+    Raw stream of the decompressed file content.
+    The file is decompressed by a background thread into a bounded queue of blocks,
+    so the parser reading the stream does not wait for the decompression.
+    """
+
+    def __init__(self, file_path: str, compression: str,
+                 block_size: int = BLOCK_SIZE, queue_size: int = QUEUE_SIZE):
+        super().__init__()
+        self._blocks = queue.Queue(maxsize=queue_size)
+        self._pending = memoryview(b'')
+        self._finished = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._decompress, args=(file_path, compression, block_size), daemon=True,
+        )
+        self._thread.start()
+
+    def _decompress(self, file_path: str, compression: str, block_size: int) -> None:
+        """
+        Decompress the file block by block and put the blocks into the queue.
+        The end of the content is marked with None, an error is passed to the reader.
+
+        :param file_path: str: Path to the compressed file
+        :param compression: str: Name of the compression
+        :param block_size: int: Size of the decompressed blocks
+
+        :return: None
+        """
+        try:
+            with open_compressed(file_path, compression) as f:
+                while not self._stopped.is_set():
+                    block = f.read(block_size)
+                    if not block:
+                        break
+                    self._put(block)
+        except Exception as e:
+            self._put(e)
+        self._put(None)
+
+    def _put(self, item: Union[bytes, Exception, None]) -> None:
+        """
+        Put the item into the queue unless the reader has been closed.
+
+        :param item: Union[bytes, Exception, None]: Block, error or end of the content
+
+        :return: None
+        """
+        while not self._stopped.is_set():
+            try:
+                self._blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        """
+        Read the decompressed content into the buffer.
+
+        :param buffer: Writable buffer
+
+        :return: int: Number of bytes read (0 at the end of the content)
+        """
+        if not self._pending:
+            if self._finished:
+                return 0
+            item = self._blocks.get()
+            if item is None:
+                self._finished = True
+                return 0
+            if isinstance(item, Exception):
+                self._finished = True
+                raise item
+            self._pending = memoryview(item)
+
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+    def close(self) -> None:
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        super().close()
+
+
+def map_file(file_path: str) -> Optional[mmap.mmap]:
+    """
+    Memory-map the file for reading.
+
+    :param file_path: str: Path to the file
+
+    :return: Optional[mmap.mmap]: Mapped file or None if the file cannot be memory-mapped
+    """
+    with open(file_path, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            logging.info("Cannot memory-map %s, using buffered reads: %s", file_path, str(e))
+            return None
+
+
+@contextlib.contextmanager
+def open_data_file(
+        file_path: str, memory_map: bool = False,
+) -> Iterator[Union[str, BinaryIO, mmap.mmap]]:
+    """
+    Open the data file for pd.read_csv.
+    Compressed files are decompressed in a background thread, uncompressed files
+    are memory-mapped if requested and possible, otherwise they are passed on by their path.
+
+    :param file_path: str: Path to the data file
+    :param memory_map: bool: Whether to memory-map the uncompressed file
+
+    :return: Iterator[Union[str, BinaryIO, mmap.mmap]]: Path or file object to read the data from
+    """
+    compression = get_compression(file_path)
+    if compression is not None:
+        with io.BufferedReader(PipelinedDecompressor(file_path, compression), BLOCK_SIZE) as f:
+            yield f
+        return
+
+    mapped = map_file(file_path) if memory_map else None
+    if mapped is None:
+        yield file_path
+        return
+
+    with mapped:
+        yield mapped
@@ -1,9 +1,53 @@
 """Basic processing of the data."""
-from typing import Tuple
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
 import logging
+import re
 
+import numpy as np
 import pandas as pd
 
+from pandas.api.types import is_numeric_dtype
+
+from data_analysis.keys import build_key_index, has_key_index
+
+JOIN_SAMPLE_SIZE = 10_000
+# Low-cardinality columns of the cleaned data stored as categoricals with sorted categories
+CATEGORICAL_COLUMNS = ['country_code', 'country_name']
+POSITION_COLUMN = '_akas_position'
+# Director of the titles with one named director, used only to order the merged rows
+DIRECTOR_KEY_COLUMN = '_director'
+# Alpha-3 code of the movies with the World Bank data, used only to order the merged rows
+COUNTRY_KEY_COLUMN = '_country'
+# Columns of the joined rows which give the order of the chain of joins
+ORDER_COLUMNS = [POSITION_COLUMN, DIRECTOR_KEY_COLUMN, COUNTRY_KEY_COLUMN]
+# Names of the columns of the cleaned data
+CLEAN_COLUMN_NAMES = {
+    'titleId': 'title_id', 'region': 'country_code', 'startYear': 'year',
+    'primaryTitle': 'title', 'averageRating': 'average_rating', 'numVotes': 'num_of_votes',
+}
+# Names of the columns of the bridge table of the movies and their directors
+DIRECTOR_COLUMN_NAMES = {'tconst': 'title_id', 'directors': 'director_id'}
+DIRECTOR_NAME_COLUMN = 'director_name'
+
+# Names of the World Bank series in the export with many indicators
+# (the other series are named by their codes)
+WORLD_BANK_INDICATORS = {
+    'SP.POP.TOTL': 'Population',
+    'NY.GDP.MKTP.CD': 'GDP',
+    'NY.GDP.MKTP.PP.CD': 'GDP PPP',
+    'IT.NET.USER.ZS': 'Internet Users',
+}
+# Indicators which the analysis needs for every movie
+REQUIRED_INDICATORS = ['Population', 'GDP']
+WORLD_BANK_KEYS = ['Country Code', 'Year']
+
+# Join of the merged data with one of the tables, with the distinct keys of the table
+# and the average number of its rows per key
+JoinStep = namedtuple(
+    'JoinStep', ['name', 'right', 'left_on', 'right_on', 'after', 'keys', 'fanout'],
+)
+
 
 def process_data_and_merge(
         basics_df: pd.DataFrame,
@@ -16,9 +60,15 @@ def process_data_and_merge(
         gdp_df: pd.DataFrame,
         start: int,
         end: int,
+        indicators_df: Optional[pd.DataFrame] = None,
+        finish: bool = True,
 ) -> pd.DataFrame:
     """
     Filter the dataframes to keep only the interesting columns.
+    If the World Bank export with many indicators is given, it replaces the population
+    and GDP data and all its indicators are added to the movies in one lookup.
+    Without finishing, the joined rows of all the title types are returned unordered,
+    so the rows of any range of years can be finished later by finish_merge.
 
     :param basics_df: pd.DataFrame:
         Data with basic information about the movies
@@ -38,8 +88,11 @@ def process_data_and_merge(
         Data with the GDP of the countries
     :param start: int: Start year for the filter
     :param end: int: End year for the filter
+    :param indicators_df: Optional[pd.DataFrame]:
+        World Bank export with many series (the population and GDP data are not used if given)
+    :param finish: bool: Whether to order and clean the joined rows
 
-    :return: pd.DataFrame: Filtered and merged data
+    :return: pd.DataFrame: Filtered and merged data (or the joined rows if not finished)
     """
     try:
         basics_df = basics_df[['tconst', 'titleType', 'primaryTitle', 'startYear']]
@@ -55,9 +108,9 @@ def process_data_and_merge(
     except KeyError as e:
         logging.error("Error selecting columns from akas_df: %s", str(e))
     try:
-        crew_df = crew_df.drop(columns=['writers'])
+        crew_df = crew_df[['tconst', 'directors']]
     except KeyError as e:
-        logging.error("Error dropping columns from crew_df: %s", str(e))
+        logging.error("Error selecting columns from crew_df: %s", str(e))
     try:
         name_df = name_df[['nconst', 'primaryName']]
     except KeyError as e:
@@ -67,27 +120,44 @@ def process_data_and_merge(
     except KeyError as e:
         logging.error("Error selecting columns from countries_df: %s", str(e))
 
-    try:
-        population_df = process_world_bank_data(population_df, 'Population')
-    except Exception as e:
-        logging.error("Error processing population_df: %s", str(e))
-    try:
-        gdp_df = process_world_bank_data(gdp_df, 'GDP')
-    except Exception as e:
-        logging.error("Error processing gdp_df: %s", str(e))
+    population_df, gdp_df = process_world_bank_tables(population_df, gdp_df, indicators_df)
 
     try:
-        basics_df, population_df, gdp_df = filter_years(
-            basics_df, population_df, gdp_df, start, end,
-        )
+        if gdp_df is None:
+            basics_df, population_df, _ = filter_years(
+                basics_df, population_df, population_df, start, end,
+            )
+        else:
+            basics_df, population_df, gdp_df = filter_years(
+                basics_df, population_df, gdp_df, start, end,
+            )
     except ValueError as e:
         logging.error("Error filtering the dataframes: %s", str(e))
 
     try:
-        merged_df = merge_data(
+        joined_df = join_data(
             basics_df, ratings_df, akas_df, crew_df,
             name_df, countries_df, population_df, gdp_df,
         )
+    except Exception as e:
+        logging.error("Error merging the dataframes: %s", str(e))
+        joined_df = pd.DataFrame()
+
+    if not finish:
+        return joined_df
+    return finish_merge(joined_df)
+
+
+def finish_merge(joined_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Order the joined rows like the chain of joins and clean them.
+
+    :param joined_df: pd.DataFrame: Joined rows of the movies
+
+    :return: pd.DataFrame: Merged and cleaned data
+    """
+    try:
+        merged_df = order_rows(joined_df)
     except Exception as e:
         logging.error("Error merging the dataframes: %s", str(e))
         merged_df = pd.DataFrame()
@@ -100,21 +170,126 @@ def process_data_and_merge(
     return merged_df
 
 
+def process_world_bank_tables(
+        population_df: pd.DataFrame,
+        gdp_df: pd.DataFrame,
+        indicators_df: Optional[pd.DataFrame] = None,
+) -> Tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+    """
+    Process the population and GDP data or the World Bank export with many indicators.
+
+    :param population_df: pd.DataFrame: Data with the population of the countries
+    :param gdp_df: pd.DataFrame: Data with the GDP of the countries
+    :param indicators_df: Optional[pd.DataFrame]: World Bank export with many series
+
+    :return: Tuple[pd.DataFrame, Optional[pd.DataFrame]]: Processed population and GDP data,
+        or the processed indicators and None if the export is given
+    """
+    if indicators_df is not None:
+        try:
+            indicators_df = process_world_bank_indicators(indicators_df)
+        except Exception as e:
+            logging.error("Error processing indicators_df: %s", str(e))
+        # The indicators of a country and year are in one row, so they are looked up at once
+        return indicators_df, None
+
+    try:
+        population_df = process_world_bank_data(population_df, 'Population')
+    except Exception as e:
+        logging.error("Error processing population_df: %s", str(e))
+    try:
+        gdp_df = process_world_bank_data(gdp_df, 'GDP')
+    except Exception as e:
+        logging.error("Error processing gdp_df: %s", str(e))
+    return population_df, gdp_df
+
+
 def process_world_bank_data(df: pd.DataFrame, value_name: str) -> pd.DataFrame:
     """
     Process the World Bank data.
+    The wide table with a column per year is reshaped into a row per country and year.
+    The years are parsed once from the column headers (e.g. '2000 [YR2000]') and the values
+    of all the year columns are reshaped at once. The input data is not modified.
 
     :param df: pd.DataFrame: Dataframe with the World Bank data
     :param value_name: str: Name of the value column
 
     :return: pd.DataFrame: Processed data
     """
-    df.drop(columns=['Series Name', 'Series Code', 'Country Name'], inplace=True)
-    df = df.melt(id_vars=['Country Code'], var_name='Year', value_name=value_name)
-    df['Year'] = df['Year'].map(lambda x: int(x[:5]))
-    df.dropna(subset=['Country Code', value_name], inplace=True)
+    df = df.drop(columns=['Series Name', 'Series Code', 'Country Name'])
+    year_columns = df.columns.drop('Country Code')
+    years = parse_world_bank_years(year_columns)
+
+    country_codes = df['Country Code'].to_numpy(dtype='object')
+    values = df[year_columns].to_numpy(dtype='float64', na_value=np.nan)
+
+    # Like in the melt, the rows of all the countries for the first year come first
+    processed_df = pd.DataFrame({
+        'Country Code': np.tile(country_codes, len(years)),
+        'Year': np.repeat(years, len(df)),
+        value_name: values.ravel(order='F'),
+    })
+    return processed_df[
+        processed_df['Country Code'].notna() & processed_df[value_name].notna()
+    ].reset_index(drop=True)
+
+
+def process_world_bank_indicators(
+        df: pd.DataFrame, names: Optional[Dict[str, str]] = None,
+) -> pd.DataFrame:
+    """
+    Process the World Bank export with many series into the matrix with a row per country
+    and year and a column per indicator. The rows without the required indicators are dropped.
+
+    :param df: pd.DataFrame: Dataframe with the World Bank data of many series
+    :param names: Optional[Dict[str, str]]: Names of the indicators by their series codes
+        (WORLD_BANK_INDICATORS if None, the other series are named by their codes)
 
-    return df
+    :return: pd.DataFrame: Indicators by the country code and year
+    """
+    names = WORLD_BANK_INDICATORS if names is None else names
+    df = df.drop(columns=['Series Name', 'Country Name'])
+    df = df.dropna(subset=['Series Code'])
+    year_columns = df.columns.drop(['Country Code', 'Series Code'])
+    years = parse_world_bank_years(year_columns)
+
+    series, series_codes = pd.factorize(df['Series Code'])
+    indicators = [names.get(code, code) for code in series_codes]
+    missing = [name for name in REQUIRED_INDICATORS if name not in indicators]
+    if missing:
+        raise ValueError(f"The World Bank data has no series of the indicators: {missing}.")
+
+    countries, country_codes = pd.factorize(df['Country Code'])
+    values = df[year_columns].to_numpy(dtype='float64', na_value=np.nan)
+
+    # Every row of the export is placed at once in the (country, year) x indicator matrix
+    matrix = np.full((len(country_codes), len(years), len(indicators)), np.nan)
+    rows = np.flatnonzero(countries >= 0)
+    matrix[countries[rows], :, series[rows]] = values[rows]
+
+    processed_df = pd.DataFrame(
+        matrix.reshape(-1, len(indicators)), columns=indicators,
+    ).assign(**{
+        'Country Code': np.repeat(country_codes.to_numpy(dtype='object'), len(years)),
+        'Year': np.tile(years, len(country_codes)),
+    })[WORLD_BANK_KEYS + indicators]
+    return processed_df.dropna(subset=REQUIRED_INDICATORS).reset_index(drop=True)
+
+
+def parse_world_bank_years(columns: pd.Index) -> np.ndarray:
+    """
+    Parse the years from the headers of the year columns of the World Bank data.
+
+    :param columns: pd.Index: Headers of the year columns (e.g. '2000 [YR2000]')
+
+    :return: np.ndarray: Years of the columns
+    """
+    years = columns.astype(str).str.extract(r'^\s*(\d{4})\b', expand=False)
+    if years.isna().any():
+        raise ValueError(
+            f"Cannot parse the years of the columns: {list(columns[years.isna()])}."
+        )
+    return years.astype('int16').to_numpy()
 
 
 def filter_years(
@@ -154,6 +329,73 @@ def filter_years(
     return basics_filtered, population_filtered, gdp_filtered
 
 
+def join_data(
+        basics_df: pd.DataFrame,
+        ratings_df: pd.DataFrame,
+        akas_df: pd.DataFrame,
+        crew_df: pd.DataFrame,
+        name_df: pd.DataFrame,
+        countries_df: pd.DataFrame,
+        population_df: pd.DataFrame,
+        gdp_df: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """
+    Join the data from the dataframes without ordering the joined rows.
+    The rows keep the columns which give their order in the chain of joins and also the rows
+    which the chain of joins drops after ordering them (the rows without the country data),
+    as they decide the order of the other rows. The rows are put in the order and reduced
+    to the merged data by order_rows.
+
+    :param basics_df: pd.DataFrame:
+        Data with basic information about the movies
+    :param ratings_df: pd.DataFrame:
+        Data with ratings of the movies
+    :param akas_df: pd.DataFrame:
+        Data with information about the different regions where the movies were presented
+    :param crew_df: pd.DataFrame:
+        Data with information about the crew of the movies
+    :param name_df: pd.DataFrame:
+        Data with information about the names of the people
+    :param countries_df: pd.DataFrame:
+        Data with information about the names of the countries based on the region codes
+    :param population_df: pd.DataFrame:
+        Data with the population of the countries (or with all the World Bank indicators)
+    :param gdp_df: Optional[pd.DataFrame]:
+        Data with the GDP of the countries (None if the population data has all the indicators)
+
+    :return: pd.DataFrame: Joined rows with the country data (missing for the rows
+        without it) and the order columns
+    """
+    # The position of the akas rows keeps the order of the chain of joins starting
+    # from the akas data whatever the join order
+    positioned_akas_df = akas_df.assign(**{POSITION_COLUMN: np.arange(len(akas_df))})
+    steps = [
+        make_join_step('ratings', ratings_df, ['tconst'], ['tconst']),
+        make_join_step('directors', get_directed_titles(crew_df, name_df), ['tconst'], ['tconst']),
+        make_join_step('akas', positioned_akas_df, ['tconst'], ['titleId']),
+    ]
+    columns = reference_columns(akas_df, [
+        JoinStep('basics', basics_df, ['titleId'], ['tconst'], (), None, None),
+    ] + [step for step in steps if step.name != 'akas'])
+    columns.remove(DIRECTOR_KEY_COLUMN)
+    columns += [POSITION_COLUMN, DIRECTOR_KEY_COLUMN]
+
+    merged_df = basics_df
+    plan = []
+    while steps:
+        step = plan_next_join(merged_df, steps, plan)
+        steps.remove(step)
+        plan.append(step.name)
+        if has_key_index(step.right, step.right_on):
+            merged_df = lookup_join(merged_df, step.right, step.left_on, step.right_on)
+        else:
+            merged_df = merged_df.merge(step.right, left_on=step.left_on, right_on=step.right_on)
+        logging.info("Joined %s: %d rows.", step.name, len(merged_df))
+    logging.info("Join plan: basics -> %s", ' -> '.join(plan))
+
+    return lookup_country_data(merged_df[columns], countries_df, population_df, gdp_df)
+
+
 def merge_data(
         basics_df: pd.DataFrame,
         ratings_df: pd.DataFrame,
@@ -162,10 +404,12 @@ def merge_data(
         name_df: pd.DataFrame,
         countries_df: pd.DataFrame,
         population_df: pd.DataFrame,
-        gdp_df: pd.DataFrame,
+        gdp_df: Optional[pd.DataFrame] = None,
 ) -> pd.DataFrame:
     """
     Merge the data from the dataframes.
+    Rows are returned in the order of the chain of joins starting from the akas data
+    whatever the join order.
 
     :param basics_df: pd.DataFrame:
         Data with basic information about the movies
@@ -180,23 +424,420 @@ def merge_data(
     :param countries_df: pd.DataFrame:
         Data with information about the names of the countries based on the region codes
     :param population_df: pd.DataFrame:
-        Data with the population of the countries
-    :param gdp_df: pd.DataFrame:
-        Data with the GDP of the countries
+        Data with the population of the countries (or with all the World Bank indicators)
+    :param gdp_df: Optional[pd.DataFrame]:
+        Data with the GDP of the countries (None if the population data has all the indicators)
 
-    :return: pd.DataFrame: Merged data from the dataframes
+    :return: pd.DataFrame: Merged data from the dataframes (one row per movie and region)
+        with the country name, population, GDP (and the other World Bank indicators)
+        and GDP per population of the movie region
     """
-    merged_df = akas_df.merge(basics_df, left_on='titleId', right_on='tconst')
-    merged_df = merged_df.merge(ratings_df, on='tconst')
-    merged_df = merged_df.merge(crew_df, on='tconst')
-    merged_df = merged_df.merge(name_df, left_on='directors', right_on='nconst')
-    merged_df = merged_df.merge(countries_df, left_on='region', right_on='alpha-2')
-    merged_df = merged_df.merge(population_df, left_on=['alpha-3', 'startYear'],
-                                right_on=['Country Code', 'Year'])
-    merged_df = merged_df.merge(gdp_df, left_on=['alpha-3', 'startYear'],
-                                right_on=['Country Code', 'Year'])
+    return order_rows(join_data(
+        basics_df, ratings_df, akas_df, crew_df, name_df, countries_df, population_df, gdp_df,
+    ))
+
+
+def order_rows(joined_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Put the joined rows in the order of the chain of joins starting from the akas data
+    and drop the rows without the country data.
+    Every join of the chain groups the rows by its key in the order of the first appearance
+    of the keys, so the groups are taken over the rows dropped by the later joins too.
+
+    :param joined_df: pd.DataFrame: Joined rows with the order columns
+
+    :return: pd.DataFrame: Merged data without the order columns
+    """
+    positions = np.argsort(joined_df[POSITION_COLUMN].to_numpy(), kind='stable')
+    positions = positions[group_order(joined_df['tconst'].iloc[positions])]
+    # The co-directed titles are not joined with the names in the chain of joins,
+    # so each of them is a group of its own
+    directors = joined_df[DIRECTOR_KEY_COLUMN].iloc[positions]
+    positions = positions[group_order(
+        directors, joined_df['tconst'].iloc[positions].where(directors.isna()),
+    )]
+    positions = positions[country_join_order(
+        joined_df['region'].iloc[positions],
+        joined_df[COUNTRY_KEY_COLUMN].iloc[positions],
+        joined_df['startYear'].iloc[positions],
+    )]
+    return joined_df.iloc[positions].drop(columns=ORDER_COLUMNS).reset_index(drop=True)
+
+
+def group_order(*keys: pd.Series) -> np.ndarray:
+    """
+    Get the positions of the rows grouped by the keys like in the result of pd.merge:
+    the groups in the order of the first appearance of their keys
+    and the rows of every group in their order.
+
+    :param keys: pd.Series: Key columns (or arrays) of the rows
+
+    :return: np.ndarray: Positions of the rows in the grouped order
+    """
+    groups = np.zeros(len(keys[0]), dtype='int64')
+    for key in keys:
+        codes, uniques = pd.factorize(key, use_na_sentinel=False)
+        groups = pd.factorize(groups * len(uniques) + codes)[0]
+    return np.argsort(groups, kind='stable')
+
+
+def get_directed_titles(crew_df: pd.DataFrame, name_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Get the titles with at least one director found in the names data.
+    Joining them keeps the movies which have a named director without adding a row
+    per director: the directors are kept in the bridge table used only by the task 3.
+    The titles with one named director keep it to order the merged rows.
+
+    :param crew_df: pd.DataFrame: Bridge table of the titles and their directors
+    :param name_df: pd.DataFrame: Data with the names of the people
+
+    :return: pd.DataFrame: Titles indexed by their unique identifiers with their director
+        (missing for the co-directed titles)
+    """
+    named = crew_df['directors'].isin(name_df['nconst'].dropna())
+    titles_df = crew_df.loc[named, ['tconst', 'directors']].drop_duplicates()
+    co_directed = titles_df['tconst'].duplicated(keep=False)
+    titles_df = titles_df.assign(directors=titles_df['directors'].where(~co_directed))
+    titles_df = titles_df.drop_duplicates('tconst').rename(
+        columns={'directors': DIRECTOR_KEY_COLUMN})
+    return build_key_index(titles_df, ['tconst'])
+
+
+def process_directors(
+        crew_df: pd.DataFrame, name_df: pd.DataFrame, title_ids: pd.Index,
+) -> pd.DataFrame:
+    """
+    Get the bridge table of the movies and their directors with the names of the directors.
+    It is kept apart from the merged movie data: the task 3 joins the bridge table
+    with the movies and looks up the names only for the directors in its results.
+    Only the given movies and the directors with a name are kept,
+    like in the join with the names data.
+
+    :param crew_df: pd.DataFrame: Bridge table of the titles and their directors
+    :param name_df: pd.DataFrame: Data with the names of the people
+    :param title_ids: pd.Index: Identifiers of the movies of the merged data
+
+    :return: pd.DataFrame: Bridge table with the title_id, director_id
+        and director_name columns
+    """
+    names = pd.Series(name_df['primaryName'].to_numpy(),
+                      index=pd.Index(name_df['nconst'].to_numpy())).dropna()
+    names = names[~names.index.duplicated()]
+    directors_df = crew_df[list(DIRECTOR_COLUMN_NAMES)].rename(columns=DIRECTOR_COLUMN_NAMES)
+    directors_df = directors_df[directors_df['title_id'].isin(title_ids)
+                                & directors_df['director_id'].isin(names.index)]
+    directors_df = directors_df.drop_duplicates().reset_index(drop=True)
+    return directors_df.assign(**{
+        DIRECTOR_NAME_COLUMN: names.reindex(directors_df['director_id']).to_numpy(),
+    })
+
+
+def reference_columns(akas_df: pd.DataFrame, steps: List[JoinStep]) -> List[str]:
+    """
+    Get the columns of the data merged in the reference order, i.e. starting from the akas
+    data and joining the other tables in the order of the steps.
+    Columns present in both joined tables get the '_x' and '_y' suffixes like in pd.merge.
+
+    :param akas_df: pd.DataFrame: Data with the regions where the movies were presented
+    :param steps: List[JoinStep]: Joins in the reference order
+
+    :return: List[str]: Columns of the merged data
+    """
+    columns = list(akas_df.columns)
+    for step in steps:
+        common_keys = {left for left, right in zip(step.left_on, step.right_on) if left == right}
+        right_columns = [column for column in step.right.columns if column not in common_keys]
+        overlap = set(columns) & set(right_columns)
+        columns = [f'{column}_x' if column in overlap else column for column in columns]
+        columns += [f'{column}_y' if column in overlap else column for column in right_columns]
+    return columns
+
+
+def plan_next_join(
+        merged_df: pd.DataFrame, steps: List[JoinStep], done: List[str],
+) -> JoinStep:
+    """
+    Choose the next join: among the joins whose dependencies are already joined,
+    the one with the smallest estimated number of resulting rows.
+
+    :param merged_df: pd.DataFrame: Data merged so far
+    :param steps: List[JoinStep]: Joins left to perform
+    :param done: List[str]: Names of the performed joins
+
+    :return: JoinStep: Next join to perform
+    """
+    ready = [step for step in steps if all(name in done for name in step.after)]
+    if len(ready) == 1:
+        return ready[0]
+    return min(ready, key=lambda step: estimate_join_rows(merged_df, step))
+
+
+def make_join_step(
+        name: str,
+        right_df: pd.DataFrame,
+        left_on: List[str],
+        right_on: List[str],
+        after: Tuple[str, ...] = (),
+) -> JoinStep:
+    """
+    Describe the join with the table together with the statistics of its keys.
+
+    :param name: str: Name of the joined table
+    :param right_df: pd.DataFrame: Joined table
+    :param left_on: List[str]: Key columns of the merged data
+    :param right_on: List[str]: Key columns of the joined table
+    :param after: Tuple[str, ...]: Names of the tables which have to be joined before
+
+    :return: JoinStep: Description of the join
+    """
+    if has_key_index(right_df, right_on):
+        keys = right_df.index
+    else:
+        keys = key_values(right_df[right_on].drop_duplicates())
+    fanout = len(right_df) / max(len(keys), 1)
+    return JoinStep(name, right_df, left_on, right_on, after, keys, fanout)
+
+
+def estimate_join_rows(left_df: pd.DataFrame, step: JoinStep) -> float:
+    """
+    Estimate the number of rows of the join as the number of left rows times
+    the fraction of the matching keys (checked on a sample) times the average number
+    of the joined rows per key.
+
+    :param left_df: pd.DataFrame: Data merged so far
+    :param step: JoinStep: Join to estimate
+
+    :return: float: Estimated number of rows
+    """
+    if left_df.empty:
+        return 0.0
+
+    sample = left_df[step.left_on].sample(min(len(left_df), JOIN_SAMPLE_SIZE), random_state=0)
+    selectivity = (step.keys.get_indexer(key_values(sample)) >= 0).mean()
+
+    return len(left_df) * selectivity * step.fanout
+
+
+def lookup_join(
+        left_df: pd.DataFrame, right_df: pd.DataFrame, left_on: List[str], right_on: List[str],
+) -> pd.DataFrame:
+    """
+    Inner join of the data with the table indexed by the unique values of its key columns.
+    The rows of the table are looked up by the keys of the data instead of factorizing
+    the keys of both sides. The columns are named like in pd.merge.
+
+    :param left_df: pd.DataFrame: Data to join
+    :param right_df: pd.DataFrame: Table with the unique index on the key columns
+    :param left_on: List[str]: Key columns of the data
+    :param right_on: List[str]: Key columns of the table
+
+    :return: pd.DataFrame: Joined data
+    """
+    for left, right in zip(left_on, right_on):
+        if is_numeric_dtype(left_df[left]) != is_numeric_dtype(right_df[right]):
+            raise ValueError(
+                f"Cannot join the column {left} of type {left_df[left].dtype} "
+                f"with the column {right} of type {right_df[right].dtype}."
+            )
+
+    indexer = right_df.index.get_indexer(key_values(left_df[left_on]))
+    matched = indexer >= 0
+
+    common_keys = {left for left, right in zip(left_on, right_on) if left == right}
+    right_columns = [column for column in right_df.columns if column not in common_keys]
+    overlap = set(left_df.columns) & set(right_columns)
+
+    left_part = left_df[matched].reset_index(drop=True)
+    right_part = right_df[right_columns].iloc[indexer[matched]].reset_index(drop=True)
+    return pd.concat([
+        left_part.rename(columns={column: f'{column}_x' for column in overlap}),
+        right_part.rename(columns={column: f'{column}_y' for column in overlap}),
+    ], axis=1)
+
+
+def key_values(df: pd.DataFrame) -> pd.Index:
+    """
+    Get the values of the key columns to look them up in the key index.
+
+    :param df: pd.DataFrame: Key columns
+
+    :return: pd.Index: Values of the key columns
+    """
+    if len(df.columns) == 1:
+        return pd.Index(df.iloc[:, 0])
+    return pd.MultiIndex.from_frame(df)
+
+
+def add_country_data(
+        merged_df: pd.DataFrame,
+        countries_df: pd.DataFrame,
+        population_df: pd.DataFrame,
+        gdp_df: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """
+    Add the country name, population, GDP and GDP per population of the movie region
+    and year in the order of the chain of joins with the country tables.
+    Movies without the country data are dropped like in the inner join.
+
+    :param merged_df: pd.DataFrame: Merged movie data with the region and start year
+    :param countries_df: pd.DataFrame: Data with the names of the countries
+    :param population_df: pd.DataFrame: Data with the population of the countries
+        (or with all the World Bank indicators)
+    :param gdp_df: Optional[pd.DataFrame]: Data with the GDP of the countries
+        (None if the population data has all the indicators)
+
+    :return: pd.DataFrame: Movie data with the country data
+    """
+    merged_df = lookup_country_data(merged_df, countries_df, population_df, gdp_df)
+    positions = country_join_order(
+        merged_df['region'], merged_df[COUNTRY_KEY_COLUMN], merged_df['startYear'],
+    )
+    return merged_df.iloc[positions].drop(columns=COUNTRY_KEY_COLUMN).reset_index(drop=True)
+
+
+def lookup_country_data(
+        merged_df: pd.DataFrame,
+        countries_df: pd.DataFrame,
+        population_df: pd.DataFrame,
+        gdp_df: Optional[pd.DataFrame] = None,
+) -> pd.DataFrame:
+    """
+    Look up the country name, population, GDP and GDP per population of the movie region
+    and year. The small country tables are looked up by the positions of the regions
+    and the offsets of the years instead of being merged, so only the final columns are added.
+    All the value columns of a World Bank table are taken from the rows of one lookup.
+    The rows are kept in their order, the values are missing for the movies without
+    the country data and their alpha-3 code is missing too.
+
+    :param merged_df: pd.DataFrame: Merged movie data with the region and start year
+    :param countries_df: pd.DataFrame: Data with the names of the countries
+    :param population_df: pd.DataFrame: Data with the population of the countries
+        (or with all the World Bank indicators)
+    :param gdp_df: Optional[pd.DataFrame]: Data with the GDP of the countries
+        (None if the population data has all the indicators)
+
+    :return: pd.DataFrame: Movie data with the country data and the alpha-3 code
+    """
+    if not has_key_index(countries_df, ['alpha-2']):
+        countries_df = build_key_index(countries_df, ['alpha-2'])
+        if not countries_df.index.is_unique:
+            raise ValueError("The region codes of the countries are not unique.")
+
+    country_positions = lookup_regions(merged_df['region'], countries_df.index)
+    country_codes, codes = pd.factorize(countries_df['alpha-3'])
+    movie_codes = np.where(country_positions >= 0, country_codes[country_positions], -1)
+    years = merged_df['startYear']
+    if not is_numeric_dtype(years):
+        raise ValueError(f"Cannot look up the years of type {years.dtype}.")
+    years = years.to_numpy(dtype='float64', na_value=np.nan)
+
+    matched = country_positions >= 0
+    row_positions = []
+    world_bank_dfs = [df for df in (population_df, gdp_df) if df is not None]
+    for world_bank_df in world_bank_dfs:
+        rows = lookup_world_bank_rows(world_bank_df, codes, movie_codes, years)
+        matched &= rows >= 0
+        row_positions.append(rows)
+
+    return merged_df.reset_index(drop=True).assign(
+        country_name=countries_df['name'].astype('category').array.take(
+            country_positions, allow_fill=True,
+        ),
+        **{
+            indicator_column(value_name): world_bank_df[value_name].array.take(
+                rows, allow_fill=True,
+            )
+            for world_bank_df, rows in zip(world_bank_dfs, row_positions)
+            for value_name in world_bank_df.columns.drop(WORLD_BANK_KEYS)
+        },
+        gdp_per_population=lambda df: df['gdp'] / df['population'],
+        **{COUNTRY_KEY_COLUMN: pd.Categorical.from_codes(
+            np.where(matched, movie_codes, -1), categories=codes,
+        )},
+    )
+
+
+def country_join_order(
+        regions: pd.Series, country_codes: pd.Series, years: pd.Series,
+) -> np.ndarray:
+    """
+    Get the positions of the movies with the country data in the order of the chain of joins
+    with the countries and the World Bank data: grouped by the region and then by the country
+    and year. The regions are grouped over all the movies, as the join with the countries
+    comes before the joins dropping the movies without the World Bank data.
+
+    :param regions: pd.Series: Region codes of the movies
+    :param country_codes: pd.Series: Alpha-3 codes of the movies (missing for the movies
+        without the country data)
+    :param years: pd.Series: Start years of the movies
+
+    :return: np.ndarray: Positions of the movies with the country data
+    """
+    positions = group_order(regions)
+    positions = positions[country_codes.iloc[positions].notna().to_numpy()]
+    return positions[group_order(country_codes.iloc[positions], years.iloc[positions])]
 
-    return merged_df
+
+def indicator_column(value_name: str) -> str:
+    """
+    Get the name of the column of the World Bank indicator in the merged data
+    (e.g. 'GDP PPP' -> 'gdp_ppp').
+
+    :param value_name: str: Name of the indicator
+
+    :return: str: Name of the column
+    """
+    return re.sub(r'\W+', '_', value_name.lower()).strip('_')
+
+
+def lookup_regions(regions: pd.Series, country_index: pd.Index) -> np.ndarray:
+    """
+    Get the positions of the countries of the regions.
+    Categorical regions are looked up once per category.
+
+    :param regions: pd.Series: Region codes of the movies
+    :param country_index: pd.Index: Unique region codes of the countries
+
+    :return: np.ndarray: Positions of the countries (-1 for the regions without a country)
+    """
+    if isinstance(regions.dtype, pd.CategoricalDtype):
+        category_positions = np.append(country_index.get_indexer(regions.cat.categories), -1)
+        return category_positions[regions.cat.codes.to_numpy()]
+    return country_index.get_indexer(regions)
+
+
+def lookup_world_bank_rows(
+        world_bank_df: pd.DataFrame,
+        codes: pd.Index,
+        movie_codes: np.ndarray,
+        movie_years: np.ndarray,
+) -> np.ndarray:
+    """
+    Get the rows of the World Bank data for the countries and years of the movies.
+    The rows are stored in the array indexed by the country code and the year offset.
+
+    :param world_bank_df: pd.DataFrame: World Bank data with the country code and year
+    :param codes: pd.Index: Distinct alpha-3 codes of the countries
+    :param movie_codes: np.ndarray: Positions of the alpha-3 codes of the movies in the codes
+    :param movie_years: np.ndarray: Start years of the movies (NaN if missing)
+
+    :return: np.ndarray: Positions of the rows (-1 for the movies without the data)
+    """
+    rows = np.full(len(movie_codes), -1)
+    if world_bank_df.empty or codes.empty:
+        return rows
+
+    data_codes = codes.get_indexer(world_bank_df['Country Code'])
+    data_years = world_bank_df['Year'].to_numpy(dtype='int64')
+    first_year = data_years.min()
+    table = np.full((len(codes), data_years.max() - first_year + 1), -1)
+    known = data_codes >= 0
+    table[data_codes[known], data_years[known] - first_year] = np.arange(len(world_bank_df))[known]
+
+    offsets = movie_years - first_year
+    found = (movie_codes >= 0) & (offsets >= 0) & (offsets < table.shape[1])
+    rows[found] = table[movie_codes[found], offsets[found].astype('int64')]
+    return rows
 
 
 def clean(merged_df: pd.DataFrame) -> pd.DataFrame:
@@ -208,21 +849,29 @@ def clean(merged_df: pd.DataFrame) -> pd.DataFrame:
     :return: pd.DataFrame: Cleaned data
     """
     merged_df = merged_df[merged_df['titleType'] == 'movie']
-    merged_df = merged_df.drop(
-        columns=['tconst', 'titleType', 'startYear', 'alpha-2', 'alpha-3',
-                 'Country Code_x', 'Country Code_y', 'Year_y', 'nconst'],
-    )
-    merged_df.rename(columns={'titleId': 'title_id', 'region': 'country_code',
-                              'Year_x': 'year', 'primaryTitle': 'title', 'name': 'country_name',
-                              'averageRating': 'average_rating', 'numVotes': 'num_of_votes',
-                              'primaryName': 'director_name', 'directors': 'director_id',
-                              'Population': 'population', 'GDP': 'gdp'}, inplace=True)
+    merged_df = merged_df.drop(columns=['tconst', 'titleType'])
+    merged_df.rename(columns=CLEAN_COLUMN_NAMES, inplace=True)
     merged_df = merged_df.drop_duplicates(
         subset=['country_code', 'title_id', 'year', 'average_rating', 'num_of_votes',
-                'director_id', 'director_name', 'population', 'gdp'],
+                'population', 'gdp'],
         keep='first',
     )
-    merged_df['gdp_per_population'] = merged_df['gdp'] / merged_df['population']
+    merged_df = merged_df.assign(**{
+        column: as_sorted_categorical(merged_df[column]) for column in CATEGORICAL_COLUMNS
+    })
     merged_df.set_index('title_id', inplace=True)
 
     return merged_df
+
+
+def as_sorted_categorical(series: pd.Series) -> pd.Series:
+    """
+    Convert the column to a categorical with only the used categories in the sorted order,
+    so the sorting and grouping by the codes gives the same order as by the values.
+
+    :param series: pd.Series: Column to convert
+
+    :return: pd.Series: Categorical column
+    """
+    categorical = series.astype('category').cat.remove_unused_categories()
+    return categorical.cat.reorder_categories(categorical.cat.categories.sort_values())
@@ -0,0 +1,80 @@
+"""Incremental update of the joined rows with the new versions of the daily IMDb datasets."""
+from typing import Callable, Dict, Tuple
+
+import pandas as pd
+
+from data_analysis.snapshot import TITLE_COLUMN, SnapshotUpdate
+
+# Datasets whose changes are applied to the joined rows without joining all of them again
+INCREMENTAL_DATASETS = ('basics', 'ratings')
+TITLE_KEY = 'tconst'
+RATING_COLUMNS = ['averageRating', 'numVotes']
+
+
+def compute_update(
+        previous: Dict[str, pd.DataFrame],
+        dataframes: Dict[str, pd.DataFrame],
+        merge: Callable[[pd.DataFrame], Dict[str, pd.DataFrame]],
+) -> SnapshotUpdate:
+    """
+    Compute the changes of the tables of the joined rows from the differences
+    between the previous and the new versions of the basics and ratings data.
+    The titles which were added to or removed from the data, or whose basic information changed,
+    are joined again. The titles whose rating or number of votes changed get the new values
+    without being joined.
+
+    :param previous: Dict[str, pd.DataFrame]: Previous versions of the changed datasets
+    :param dataframes: Dict[str, pd.DataFrame]: New versions of all the datasets
+    :param merge: Callable[[pd.DataFrame], Dict[str, pd.DataFrame]]:
+        Function joining the titles of the basics data with the other datasets into the tables
+
+    :return: SnapshotUpdate: Changes of the tables
+    """
+    basics_df = dataframes['basics']
+    ratings_df = dataframes['ratings']
+    added_basics, changed_basics = diff_rows(previous.get('basics', basics_df), basics_df)
+    added_ratings, changed_ratings = diff_rows(previous.get('ratings', ratings_df), ratings_df)
+
+    remerged = added_basics.union(changed_basics).union(added_ratings)
+    if remerged.empty:
+        inserted = {}
+    else:
+        inserted = merge(basics_df[basics_df[TITLE_KEY].isin(remerged)])
+
+    updated_df = ratings_df[ratings_df[TITLE_KEY].isin(changed_ratings.difference(remerged))]
+    updated_df = updated_df.set_index(TITLE_KEY).rename_axis(TITLE_COLUMN)[RATING_COLUMNS]
+
+    return SnapshotUpdate(remerged, updated_df, inserted)
+
+
+def diff_rows(old_df: pd.DataFrame, new_df: pd.DataFrame) -> Tuple[pd.Index, pd.Index]:
+    """
+    Compare the rows of the two versions of the data by the title identifiers.
+
+    :param old_df: pd.DataFrame: Previous version of the data
+    :param new_df: pd.DataFrame: New version of the data
+
+    :return: Tuple[pd.Index, pd.Index]: Titles present in only one of the versions
+        and titles whose rows differ
+    """
+    old_hashes = row_hashes(old_df)
+    new_hashes = row_hashes(new_df)
+
+    common = old_hashes.index.intersection(new_hashes.index)
+    differ = old_hashes[common].to_numpy() != new_hashes[common].to_numpy()
+    return old_hashes.index.symmetric_difference(new_hashes.index), common[differ]
+
+
+def row_hashes(df: pd.DataFrame) -> pd.Series:
+    """
+    Hash the rows of the data by the title identifiers (the last row of a duplicated title).
+
+    :param df: pd.DataFrame: Data with the title identifiers
+
+    :return: pd.Series: Hashes of the rows indexed by the title identifiers
+    """
+    hashes = pd.Series(
+        pd.util.hash_pandas_object(df, index=False).to_numpy(),
+        index=pd.Index(df[TITLE_KEY].to_numpy()),
+    )
+    return hashes[~hashes.index.duplicated(keep='last')]
@@ -0,0 +1,99 @@
+"""Integer encoding of the IMDb identifiers."""
+from typing import Dict, List
+
+import pandas as pd
+
+# Identifiers are stored as their numbers without the prefix (e.g. tt0111161 -> 111161)
+ID_DTYPE = 'Int32'
+
+# Levels of the key indexes are named after the key columns with the suffix,
+# so they are not ambiguous with the columns kept in the data
+KEY_INDEX_SUFFIX = '_key'
+
+
+def encode_ids(ids: pd.Series, prefix: str) -> pd.Series:
+    """
+    Encode the IMDb identifiers as integers by stripping their prefix.
+    Values which are not a single identifier with the prefix (e.g. lists of identifiers)
+    become missing values.
+
+    :param ids: pd.Series: Identifiers (e.g. 'tt0111161' or 'nm0000001')
+    :param prefix: str: Prefix of the identifiers ('tt' or 'nm')
+
+    :return: pd.Series: Integer identifiers
+    """
+    if pd.api.types.is_integer_dtype(ids.dtype):
+        return ids.astype(ID_DTYPE)
+
+    ids = ids.astype('object')
+    digits = ids.str.slice(len(prefix)).where(ids.str.startswith(prefix, na=False))
+    return pd.to_numeric(digits, errors='coerce').astype(ID_DTYPE)
+
+
+def explode_id_lists(df: pd.DataFrame, lists: Dict[str, str]) -> pd.DataFrame:
+    """
+    Split the columns with the lists of identifiers (e.g. 'nm0000001,nm0000002')
+    into one row per identifier. The rows with a missing list are kept with a missing value.
+
+    :param df: pd.DataFrame: Data with the columns of the lists
+    :param lists: Dict[str, str]: Names of the columns of the lists and their separators
+
+    :return: pd.DataFrame: Data with one identifier per row
+    """
+    for column, separator in lists.items():
+        if column in df.columns:
+            df = df.assign(**{column: df[column].str.split(separator)})
+            df = df.explode(column, ignore_index=True)
+    return df
+
+
+def encode_id_columns(df: pd.DataFrame, ids: Dict[str, str]) -> pd.DataFrame:
+    """
+    Encode the identifier columns of the dataframe as integers.
+
+    :param df: pd.DataFrame: Data with the identifier columns
+    :param ids: Dict[str, str]: Names of the identifier columns and their prefixes
+
+    :return: pd.DataFrame: Data with the integer identifier columns
+    """
+    return df.assign(**{
+        column: encode_ids(df[column], prefix)
+        for column, prefix in ids.items() if column in df.columns
+    })
+
+
+def key_index_names(keys: List[str]) -> List[str]:
+    """
+    Get the names of the levels of the index on the key columns.
+
+    :param keys: List[str]: Names of the key columns
+
+    :return: List[str]: Names of the index levels
+    """
+    return [f'{key}{KEY_INDEX_SUFFIX}' for key in keys]
+
+
+def build_key_index(df: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    """
+    Index the data by the key columns and sort it by the index.
+    The key columns are kept in the data.
+
+    :param df: pd.DataFrame: Data with the key columns
+    :param keys: List[str]: Names of the key columns
+
+    :return: pd.DataFrame: Data sorted by the index on the key columns
+    """
+    return df.set_index(keys, drop=False).rename_axis(key_index_names(keys)).sort_index()
+
+
+def has_key_index(df: pd.DataFrame, keys: List[str]) -> bool:
+    """
+    Check whether the data is indexed by the unique values of the key columns,
+    so the rows can be looked up by their keys.
+
+    :param df: pd.DataFrame: Data to check
+    :param keys: List[str]: Names of the key columns
+
+    :return: bool: True if the data has the unique index on the key columns
+    """
+    return list(df.index.names) == key_index_names(keys) and df.index.is_unique
@@ -1,15 +1,106 @@
 """Load the data from the files."""
 import argparse
 import logging
-from typing import Dict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import pandas as pd
 import numpy as np
+from pandas.api.types import union_categoricals
+
+from data_analysis.cache import CACHE_DIR, load_cached, read_cache_entry
+from data_analysis.compression import open_data_file, strip_compression_suffix
+from data_analysis.keys import build_key_index, encode_id_columns, explode_id_lists
+
+CHUNK_SIZE = 1_000_000
+NA_VALUES = [np.NAN, '\\N', '..']
+
+# Row filter applied while reading: (column, operator, value)
+Filter = Tuple[str, str, Any]
+
+# Names of the datasets and of the command line arguments with their paths
+DATASETS = (
+    ('basics', 'basics_title_data'),
+    ('ratings', 'rating_title_data'),
+    ('akas', 'akas_title_data'),
+    ('crew', 'crew_title_data'),
+    ('name', 'name_people_data'),
+    ('countries', 'countries_name_data'),
+    ('population', 'population_data'),
+    ('gdp', 'gdp_data'),
+    ('indicators', 'indicators_data'),
+)
+
+# Columns and their types read from each dataset (the rest is never materialized),
+# the columns with the lists of identifiers split into one row per identifier,
+# the IMDb identifier columns encoded as integers with their prefixes
+# and the key columns indexed for the joins
+SCHEMAS = {
+    'basics': {
+        'usecols': ['tconst', 'titleType', 'primaryTitle', 'startYear'],
+        'dtype': {'titleType': 'category', 'startYear': 'Int16'},
+        'ids': {'tconst': 'tt'},
+        'index': ['tconst'],
+    },
+    'ratings': {
+        'usecols': ['tconst', 'averageRating', 'numVotes'],
+        'dtype': {'averageRating': 'float32', 'numVotes': 'Int32'},
+        'ids': {'tconst': 'tt'},
+        'index': ['tconst'],
+    },
+    'akas': {
+        'usecols': ['titleId', 'region'],
+        'dtype': {'region': 'category'},
+        'ids': {'titleId': 'tt'},
+    },
+    'crew': {
+        'usecols': ['tconst', 'directors'],
+        'lists': {'directors': ','},
+        'ids': {'tconst': 'tt', 'directors': 'nm'},
+    },
+    'name': {
+        'usecols': ['nconst', 'primaryName'],
+        'ids': {'nconst': 'nm'},
+        'index': ['nconst'],
+    },
+    'countries': {
+        'usecols': ['alpha-2', 'alpha-3', 'name'],
+        'index': ['alpha-2'],
+    },
+    'population': {},
+    'gdp': {},
+    'indicators': {},
+}
+
+
+def get_filters(start_year: Optional[int], end_year: Optional[int]) -> Dict[str, List[Filter]]:
+    """
+    Get the row filters pushed down into the loading of each dataset.
+    The filters only drop rows and keep the other rows in the order of the file,
+    so the merged data has the same rows in the same order as when filtered after the merge.
+    Only the rows which the merge drops before the joins are filtered: the titles of all
+    the types give the order of the merged rows, so the movies are chosen in the cleaning.
+
+    :param start_year: Optional[int]: Start year for the filter
+    :param end_year: Optional[int]: End year for the filter
+
+    :return: Dict[str, List[Filter]]: Row filters of the datasets
+    """
+    basics_filters = []
+    if start_year and end_year:
+        basics_filters.append(('startYear', 'between', (start_year, end_year)))
+
+    return {
+        'basics': basics_filters,
+        'akas': [('region', 'notna', None)],
+    }
 
 
 def load_all_data(args: argparse.Namespace) -> Dict[str, pd.DataFrame]:
     """
     Load all the data from the files.
+    With more than one worker, the files are loaded concurrently in a process pool.
 
     :param args: argparse.Namespace: Arguments from the command line
 
@@ -18,18 +109,17 @@ def load_all_data(args: argparse.Namespace) -> Dict[str, pd.DataFrame]:
     dataframes = {}
     errors = []
 
-    def load_data_wrapper(data_name: str, file_path: str) -> None:
+    def load_data_wrapper(data_name: str, load: Callable[[], pd.DataFrame]) -> None:
         """
         Wrapper function to load the data and handle the exceptions.
 
         :param data_name: str: Name of the data
-        :param file_path: str: Path to the file with the data
+        :param load: Callable[[], pd.DataFrame]: Function returning the loaded data
 
         :return: None
         """
         try:
-            logging.info("Loading data for %s...", data_name)
-            dataframes[data_name] = load_data(file_path)
+            dataframes[data_name] = load()
         except FileNotFoundError as file_err:
             logging.error("File not found for %s: %s", data_name, str(file_err))
             errors.append(f"File not found for {data_name}: {str(file_err)}")
@@ -42,14 +132,41 @@ def load_all_data(args: argparse.Namespace) -> Dict[str, pd.DataFrame]:
                 data_name, str(exc_err))
             errors.append(f"Error loading {data_name}: {str(exc_err)}")
 
-    load_data_wrapper('basics', args.basics_title_data)
-    load_data_wrapper('ratings', args.rating_title_data)
-    load_data_wrapper('akas', args.akas_title_data)
-    load_data_wrapper('crew', args.crew_title_data)
-    load_data_wrapper('name', args.name_people_data)
-    load_data_wrapper('countries', args.countries_name_data)
-    load_data_wrapper('population', args.population_data)
-    load_data_wrapper('gdp', args.gdp_data)
+    files = get_data_files(args)
+    filters = get_filters(args.start, args.end)
+    streamed = {'akas'} if args.stream_akas else set()
+    options = {
+        'cache_dir': args.cache_dir, 'cache_mode': args.cache,
+        'chunksize': args.chunk_size, 'memory_map': args.mmap,
+    }
+
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = {}
+            for data_name, file_path in files.items():
+                if data_name in streamed:
+                    continue
+                logging.info("Loading data for %s...", data_name)
+                futures[data_name] = executor.submit(
+                    load_dataset, data_name, file_path, filters.get(data_name), **options,
+                )
+            for data_name, future in futures.items():
+                load_data_wrapper(data_name, future.result)
+    else:
+        for data_name, file_path in files.items():
+            if data_name in streamed:
+                continue
+            logging.info("Loading data for %s...", data_name)
+            load_data_wrapper(data_name, partial(
+                load_dataset, data_name, file_path, filters.get(data_name), **options,
+            ))
+
+    if 'akas' in streamed:
+        logging.info("Streaming data for akas...")
+        load_data_wrapper('akas', partial(
+            stream_akas, files['akas'], dataframes.get('basics'), filters['akas'],
+            args.chunk_size, args.max_memory_mb, args.mmap,
+        ))
 
     if errors:
         logging.info("Data loading completed with errors:")
@@ -61,29 +178,323 @@ def load_all_data(args: argparse.Namespace) -> Dict[str, pd.DataFrame]:
     return dataframes
 
 
-def load_data(file_path: str) -> pd.DataFrame:
+def get_data_files(args: argparse.Namespace) -> Dict[str, str]:
+    """
+    Get the paths to the data files given in the command line.
+    The optional datasets without a path are left out.
+
+    :param args: argparse.Namespace: Arguments from the command line
+
+    :return: Dict[str, str]: Paths to the files by the names of the data
+    """
+    files = {data_name: getattr(args, arg_name, None) for data_name, arg_name in DATASETS}
+    return {data_name: file_path for data_name, file_path in files.items() if file_path}
+
+
+def load_dataset(
+        data_name: str,
+        file_path: str,
+        filters: Optional[List[Filter]] = None,
+        cache_dir: str = CACHE_DIR,
+        cache_mode: str = 'use',
+        chunksize: int = CHUNK_SIZE,
+        memory_map: bool = False,
+) -> pd.DataFrame:
+    """
+    Load one of the datasets with its schema through the cache.
+
+    :param data_name: str: Name of the data
+    :param file_path: str: Path to the file with the data
+    :param filters: Optional[List[Filter]]: Row filters applied while reading
+    :param cache_dir: str: Directory with the cache entries
+    :param cache_mode: str: 'use' the cache, 'bypass' it or 'rebuild' the entry
+    :param chunksize: int: Number of rows in a chunk when the filters are applied
+    :param memory_map: bool: Whether to memory-map the uncompressed file
+
+    :return: pd.DataFrame: Data from the file
+    """
+    options = dict(SCHEMAS.get(data_name, {}), filters=filters)
+    loader = partial(load_data, file_path, chunksize=chunksize, memory_map=memory_map, **options)
+    return load_cached(
+        loader, file_path, options=options,
+        cache_dir=cache_dir, mode=cache_mode,
+    )
+
+
+def load_previous_dataset(
+        data_name: str,
+        file_path: str,
+        content_digest: str,
+        filters: Optional[List[Filter]] = None,
+        cache_dir: str = CACHE_DIR,
+) -> Optional[pd.DataFrame]:
+    """
+    Load the previous version of the dataset from the cache, before the file was replaced.
+
+    :param data_name: str: Name of the data
+    :param file_path: str: Path to the file with the data
+    :param content_digest: str: Hash of the content of the previous version of the file
+    :param filters: Optional[List[Filter]]: Row filters applied while reading
+    :param cache_dir: str: Directory with the cache entries
+
+    :return: Optional[pd.DataFrame]: Previous data (None if it is not in the cache any more)
+    """
+    options = dict(SCHEMAS.get(data_name, {}), filters=filters)
+    return read_cache_entry(file_path, content_digest, options=options, cache_dir=cache_dir)
+
+
+def load_data(
+        file_path: str,
+        usecols: Optional[List[str]] = None,
+        dtype: Optional[Dict[str, str]] = None,
+        filters: Optional[List[Filter]] = None,
+        chunksize: int = CHUNK_SIZE,
+        memory_map: bool = False,
+        lists: Optional[Dict[str, str]] = None,
+        ids: Optional[Dict[str, str]] = None,
+        index: Optional[List[str]] = None,
+) -> pd.DataFrame:
     """
     Load the data from the CSV or TSV file.
+    If filters are given, the file is read in chunks and only the matching rows are kept.
 
     :param file_path: str: Path to the CSV  or TSV file with the data
+    :param usecols: Optional[List[str]]: Columns to read (all columns if None)
+    :param dtype: Optional[Dict[str, str]]: Types of the columns (inferred if None)
+    :param filters: Optional[List[Filter]]: Row filters as (column, operator, value) tuples
+    :param chunksize: int: Number of rows in a chunk when the filters are applied
+    :param memory_map: bool: Whether to memory-map the uncompressed file
+        (falls back to buffered reads if memory mapping is not available)
+    :param lists: Optional[Dict[str, str]]: Columns with the lists of identifiers
+        split into one row per identifier with their separators
+    :param ids: Optional[Dict[str, str]]: IMDb identifier columns encoded as integers
+        with their prefixes (the filters are applied to the encoded values)
+    :param index: Optional[List[str]]: Key columns of the sorted index built on the data
 
     :return pd.DataFrame: Data from the file
     """
-    if file_path.endswith('.tsv'):
-        sep = '\t'
-    elif file_path.endswith('.csv'):
-        sep = ','
-    else:
-        raise ValueError("Invalid file format. Only CSV and TSV files are supported.")
-
+    read_options = {
+        'low_memory': False, 'na_values': NA_VALUES, 'sep': get_separator(file_path),
+        'usecols': usecols, 'dtype': dtype,
+    }
     try:
-        data = pd.read_csv(file_path, low_memory=False, na_values=[np.NAN, '\\N', '..'], sep=sep)
+        if filters:
+            data, num_of_rows = read_filtered(
+                file_path, filters, chunksize, memory_map, lists, ids, **read_options,
+            )
+        else:
+            with open_data_file(file_path, memory_map) as source:
+                data = pd.read_csv(source, **read_options)
+            num_of_rows = len(data)
+            if lists:
+                data = explode_id_lists(data, lists)
+            if ids:
+                data = encode_id_columns(data, ids)
     except Exception as e:
         logging.error("Error loading data from %s: %s", file_path, str(e))
         raise
 
-    if data.empty:
+    if num_of_rows == 0:
         logging.warning("The file %s is empty.", file_path)
         raise ValueError("The file is empty.")
+    if data.empty:
+        logging.warning("No rows of the file %s match the filters.", file_path)
+
+    if index:
+        data = build_key_index(data, index)
 
     return data
+
+
+def get_separator(file_path: str) -> str:
+    """
+    Get the separator of the CSV or TSV file based on its extension.
+    The file can be compressed with gzip (.gz), bz2 (.bz2) or zstd (.zst).
+
+    :param file_path: str: Path to the CSV or TSV file
+
+    :return: str: Separator of the values in the file
+    """
+    file_path = strip_compression_suffix(file_path)
+    if file_path.endswith('.tsv'):
+        return '\t'
+    if file_path.endswith('.csv'):
+        return ','
+    raise ValueError("Invalid file format. Only CSV and TSV files are supported "
+                     "(optionally compressed with gzip, bz2 or zstd).")
+
+
+def stream_akas(
+        file_path: str,
+        basics_df: Optional[pd.DataFrame],
+        filters: List[Filter],
+        chunksize: int = CHUNK_SIZE,
+        memory_limit_mb: Optional[int] = None,
+        memory_map: bool = False,
+) -> pd.DataFrame:
+    """
+    Stream the akas data keeping only the distinct regions of the titles from the basics data.
+
+    :param file_path: str: Path to the file with the akas data
+    :param basics_df: Optional[pd.DataFrame]: Loaded (and filtered) basics data
+    :param filters: List[Filter]: Row filters of the akas data
+    :param chunksize: int: Number of rows in a chunk
+    :param memory_limit_mb: Optional[int]: Memory ceiling of the accumulated result in MB
+    :param memory_map: bool: Whether to memory-map the uncompressed file
+
+    :return: pd.DataFrame: Distinct (titleId, region) pairs
+    """
+    if basics_df is None:
+        raise RuntimeError("The basics data is required to stream the akas data.")
+
+    title_filter = ('titleId', 'in', pd.Index(basics_df['tconst'].unique()))
+    return stream_data(
+        file_path, filters + [title_filter], chunksize, memory_limit_mb, memory_map,
+        **SCHEMAS['akas'],
+    )
+
+
+def stream_data(
+        file_path: str,
+        filters: List[Filter],
+        chunksize: int = CHUNK_SIZE,
+        memory_limit_mb: Optional[int] = None,
+        memory_map: bool = False,
+        usecols: Optional[List[str]] = None,
+        dtype: Optional[Dict[str, str]] = None,
+        ids: Optional[Dict[str, str]] = None,
+) -> pd.DataFrame:
+    """
+    Read the file chunk by chunk reducing every chunk to the distinct rows matching the filters.
+    When the accumulated result exceeds the memory limit, it is compacted and, if it still
+    does not fit, the loading is stopped.
+
+    :param file_path: str: Path to the CSV or TSV file with the data
+    :param filters: List[Filter]: Row filters as (column, operator, value) tuples
+    :param chunksize: int: Number of rows in a chunk
+    :param memory_limit_mb: Optional[int]: Memory ceiling of the accumulated result in MB
+    :param memory_map: bool: Whether to memory-map the uncompressed file
+    :param usecols: Optional[List[str]]: Columns to read (all columns if None)
+    :param dtype: Optional[Dict[str, str]]: Types of the columns (inferred if None)
+    :param ids: Optional[Dict[str, str]]: IMDb identifier columns encoded as integers
+        with their prefixes
+
+    :return: pd.DataFrame: Distinct rows of the file matching the filters
+    """
+    reduced = []
+    reduced_size = 0
+    num_of_rows = 0
+
+    sep = get_separator(file_path)
+    with open_data_file(file_path, memory_map) as source, pd.read_csv(
+            source, chunksize=chunksize, na_values=NA_VALUES, sep=sep,
+            usecols=usecols, dtype=dtype) as reader:
+        for chunk in reader:
+            num_of_rows += len(chunk)
+            if ids:
+                chunk = encode_id_columns(chunk, ids)
+            chunk = chunk[filter_mask(chunk, filters)].drop_duplicates()
+            reduced.append(chunk)
+            reduced_size += chunk.memory_usage(deep=True).sum()
+
+            if memory_limit_mb and reduced_size > memory_limit_mb * 2 ** 20:
+                reduced = [concat_chunks(reduced).drop_duplicates()]
+                reduced_size = reduced[0].memory_usage(deep=True).sum()
+                if reduced_size > memory_limit_mb * 2 ** 20:
+                    raise MemoryError(
+                        f"The data streamed from {file_path} exceeds the memory limit "
+                        f"of {memory_limit_mb} MB.")
+
+    if num_of_rows == 0:
+        logging.warning("The file %s is empty.", file_path)
+        raise ValueError("The file is empty.")
+
+    return concat_chunks(reduced).drop_duplicates(ignore_index=True)
+
+
+def read_filtered(
+        file_path: str,
+        filters: List[Filter],
+        chunksize: int,
+        memory_map: bool = False,
+        lists: Optional[Dict[str, str]] = None,
+        ids: Optional[Dict[str, str]] = None,
+        **read_options,
+) -> Tuple[pd.DataFrame, int]:
+    """
+    Read the file chunk by chunk and keep only the rows matching the filters.
+
+    :param file_path: str: Path to the file with the data
+    :param filters: List[Filter]: Row filters as (column, operator, value) tuples
+    :param chunksize: int: Number of rows in a chunk
+    :param memory_map: bool: Whether to memory-map the uncompressed file
+    :param lists: Optional[Dict[str, str]]: Columns with the lists of identifiers
+        split into one row per identifier with their separators
+    :param ids: Optional[Dict[str, str]]: IMDb identifier columns encoded as integers
+        with their prefixes
+    :param read_options: Options passed to pd.read_csv
+
+    :return: Tuple[pd.DataFrame, int]: Filtered data and the number of rows in the file
+    """
+    chunks = []
+    num_of_rows = 0
+    with open_data_file(file_path, memory_map) as source, \
+            pd.read_csv(source, chunksize=chunksize, **read_options) as reader:
+        for chunk in reader:
+            num_of_rows += len(chunk)
+            if lists:
+                chunk = explode_id_lists(chunk, lists)
+            if ids:
+                chunk = encode_id_columns(chunk, ids)
+            chunks.append(chunk[filter_mask(chunk, filters)])
+
+    return concat_chunks(chunks), num_of_rows
+
+
+def filter_mask(df: pd.DataFrame, filters: List[Filter]) -> np.ndarray:
+    """
+    Compute the mask of the rows matching all the filters.
+    Supported operators: '==', 'in', 'between' (inclusive) and 'notna'.
+
+    :param df: pd.DataFrame: Data to filter
+    :param filters: List[Filter]: Row filters as (column, operator, value) tuples
+
+    :return: np.ndarray: Boolean mask of the matching rows
+    """
+    mask = np.ones(len(df), dtype=bool)
+    for column, operator, value in filters:
+        if operator == '==':
+            condition = df[column] == value
+        elif operator == 'in':
+            condition = df[column].isin(value)
+        elif operator == 'between':
+            condition = df[column].between(*value)
+        elif operator == 'notna':
+            condition = df[column].notna()
+        else:
+            raise ValueError(f"Invalid filter operator: {operator}.")
+        mask &= condition.fillna(False).to_numpy(dtype=bool)
+
+    return mask
+
+
+def concat_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenate the chunks of the data keeping the categorical columns categorical.
+
+    :param chunks: List[pd.DataFrame]: Chunks of the data with the same columns
+
+    :return: pd.DataFrame: Concatenated data
+    """
+    if len(chunks) == 1:
+        return chunks[0].reset_index(drop=True)
+
+    for column, column_type in chunks[0].dtypes.items():
+        if isinstance(column_type, pd.CategoricalDtype):
+            categories = union_categoricals(
+                [chunk[column] for chunk in chunks], ignore_order=True,
+            ).categories
+            chunks = [chunk.assign(**{column: chunk[column].cat.set_categories(categories)})
+                      for chunk in chunks]
+
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,260 @@
+"""Hand the merged data to the worker processes through shared memory instead of pickling it."""
+import contextlib
+import gc
+import logging
+from collections import namedtuple
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pandas.api.types import is_string_dtype
+
+# Alignment of the column buffers in the shared memory block
+ALIGNMENT = 64
+# Nullable arrays of pandas with the values and the mask of the missing values
+MASKED_ARRAYS = (pd.arrays.IntegerArray, pd.arrays.FloatingArray, pd.arrays.BooleanArray)
+
+# Column of the shared data: kind of the column ('numpy', 'masked', 'categorical', 'string'
+# or 'object'), its data type, the positions and sizes of its buffers in the shared memory block
+# and the values which are pickled with the description (the categories or the objects)
+SharedColumn = namedtuple('SharedColumn', ['name', 'kind', 'dtype', 'buffers', 'values'])
+# Description of the shared data passed to the worker processes
+SharedFrame = namedtuple('SharedFrame', ['memory_name', 'num_rows', 'index', 'columns'])
+Buffer = Optional[Tuple[int, int]]
+
+# Blocks which could not be closed because their data was still referenced,
+# closed by the next calls once the data is released
+_IN_USE: List[SharedMemory] = []
+
+
+@contextlib.contextmanager
+def share_frame(df: pd.DataFrame) -> Iterator[SharedFrame]:
+    """
+    Copy the data into a shared memory block and describe it for the worker processes.
+    The numeric columns, the masks of the nullable columns, the codes of the categorical columns
+    and the string columns (as Arrow buffers) are placed in the shared memory,
+    only the categories and the columns of other objects are pickled with the description.
+    The block is removed when the context exits, also on an error; if the process crashes,
+    the resource tracker of multiprocessing removes it.
+
+    :param df: pd.DataFrame: Data to share
+
+    :yield: SharedFrame: Description of the shared data
+    """
+    layout = [share_column(df.index.name, df.index)]
+    layout += [share_column(column, df[column]) for column in df.columns]
+
+    size = 0
+    for _, arrays in layout:
+        for array in arrays:
+            if array is not None:
+                size = align(size) + len(array)
+    memory = SharedMemory(create=True, size=max(size, 1))
+    try:
+        shared_columns = []
+        offset = 0
+        for column, arrays in layout:
+            buffers = []
+            for array in arrays:
+                if array is None:
+                    buffers.append(None)
+                    continue
+                offset = align(offset)
+                memory.buf[offset:offset + len(array)] = array
+                buffers.append((offset, len(array)))
+                offset += len(array)
+            shared_columns.append(column._replace(buffers=buffers))
+        del layout
+
+        yield SharedFrame(memory.name, len(df), shared_columns[0], shared_columns[1:])
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def call_with_shared_frame(shared: SharedFrame, func: Callable[[pd.DataFrame], Any]) -> Any:
+    """
+    Call the function on the shared data reconstructed from the shared memory block
+    without copying the columns. The data must not be used after the function returns:
+    the block is closed then (it is removed by the process sharing the data).
+
+    :param shared: SharedFrame: Description of the shared data
+    :param func: Callable[[pd.DataFrame], Any]: Function to call on the shared data
+        (the arrays of the data are read-only, as the data is shared by all the processes)
+
+    :return: Any: Result of the function
+    """
+    return call_with_shared_frames([shared], func)
+
+
+def call_with_shared_frames(shared: Sequence[SharedFrame], func: Callable[..., Any]) -> Any:
+    """
+    Call the function on the shared data of many blocks, passed in their order,
+    like call_with_shared_frame.
+
+    :param shared: Sequence[SharedFrame]: Descriptions of the shared data
+    :param func: Callable[..., Any]: Function to call on the shared data
+
+    :return: Any: Result of the function
+    """
+    memories = []
+    try:
+        for shared_frame in shared:
+            memories.append(SharedMemory(name=shared_frame.memory_name))
+        return func(*(attach_frame(memory, shared_frame)
+                      for memory, shared_frame in zip(memories, shared)))
+    finally:
+        _IN_USE.extend(memories)
+        close_released_memory()
+
+
+def close_released_memory() -> None:
+    """
+    Close the shared memory blocks of the process whose data is no longer referenced.
+    The blocks still in use are kept to be closed by the next call.
+
+    :return: None
+    """
+    gc.collect()
+    for memory in list(_IN_USE):
+        try:
+            memory.close()
+        except BufferError:
+            continue
+        _IN_USE.remove(memory)
+    if _IN_USE:
+        logging.warning("The shared data is still in use after the function returned.")
+
+
+def attach_frame(memory: SharedMemory, shared: SharedFrame) -> pd.DataFrame:
+    """
+    Reconstruct the shared data from the shared memory block without copying the columns.
+
+    :param memory: SharedMemory: Shared memory block
+    :param shared: SharedFrame: Description of the shared data
+
+    :return: pd.DataFrame: Shared data
+    """
+    index = attach_column(memory, shared.index, shared.num_rows)
+    return pd.DataFrame(
+        {column.name: attach_column(memory, column, shared.num_rows)
+         for column in shared.columns},
+        index=pd.Index(index, name=shared.index.name), copy=False,
+    )
+
+
+def share_column(name, values) -> Tuple[SharedColumn, List[Optional[memoryview]]]:
+    """
+    Describe the column and get its buffers to place in the shared memory.
+
+    :param name: Name of the column
+    :param values: Values of the column (pd.Series or pd.Index)
+
+    :return: Tuple[SharedColumn, List[Optional[memoryview]]]:
+        Description of the column (without the positions of the buffers) and its buffers
+    """
+    dtype = values.dtype
+    array = values.array
+    if isinstance(dtype, pd.CategoricalDtype):
+        return SharedColumn(name, 'categorical', dtype, None, None), [byte_view(array.codes)]
+    if isinstance(array, MASKED_ARRAYS):
+        data = array.to_numpy(dtype=dtype.numpy_dtype, na_value=0)
+        return SharedColumn(name, 'masked', dtype, None, None), [
+            byte_view(data), byte_view(np.asarray(array.isna()))]
+    if isinstance(dtype, np.dtype) and dtype.kind in 'biufcmM':
+        return SharedColumn(name, 'numpy', dtype, None, None), [byte_view(values.to_numpy())]
+    if is_string_dtype(dtype):
+        try:
+            strings = pa.array(values.to_numpy(dtype=object), type=pa.large_string(),
+                               from_pandas=True)
+            return (SharedColumn(name, 'string', dtype, None, strings.null_count),
+                    [None if buffer is None else memoryview(buffer).cast('B')
+                     for buffer in strings.buffers()])
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+    return SharedColumn(name, 'object', dtype, None, values.to_numpy(dtype=object)), []
+
+
+def attach_column(memory: SharedMemory, column: SharedColumn, num_rows: int):
+    """
+    Reconstruct the column from the shared memory block without copying it.
+
+    :param memory: SharedMemory: Shared memory block
+    :param column: SharedColumn: Description of the column
+    :param num_rows: int: Number of the rows of the data
+
+    :return: Values of the column (pandas array or numpy array)
+    """
+    if column.kind == 'categorical':
+        codes = array_view(memory, column.buffers[0], codes_dtype(column.dtype), num_rows)
+        return pd.Categorical.from_codes(codes, dtype=column.dtype)
+    if column.kind == 'masked':
+        data = array_view(memory, column.buffers[0], column.dtype.numpy_dtype, num_rows)
+        # The hash tables of pandas do not accept read-only masks, so the masks
+        # (one byte per row) are copied, while the values stay in the shared memory
+        mask = array_view(memory, column.buffers[1], np.dtype('bool'), num_rows).copy()
+        return column.dtype.construct_array_type()(data, mask)
+    if column.kind == 'numpy':
+        return array_view(memory, column.buffers[0], column.dtype, num_rows)
+    if column.kind == 'string':
+        validity, offsets, data = (
+            None if buffer is None else
+            pa.py_buffer(memory.buf[buffer[0]:buffer[0] + buffer[1]])
+            for buffer in column.buffers)
+        strings = pa.LargeStringArray.from_buffers(
+            num_rows, offsets, data if data is not None else pa.py_buffer(b''),
+            validity, column.values)
+        return pd.arrays.ArrowExtensionArray(strings)
+    return column.values
+
+
+def codes_dtype(dtype: pd.CategoricalDtype) -> np.dtype:
+    """
+    Get the data type of the codes of the categorical data type (as chosen by pandas).
+
+    :param dtype: pd.CategoricalDtype: Categorical data type
+
+    :return: np.dtype: Data type of the codes
+    """
+    return pd.Categorical([], dtype=dtype).codes.dtype
+
+
+def array_view(memory: SharedMemory, buffer: Buffer, dtype: np.dtype, num_rows: int) -> np.ndarray:
+    """
+    Get the read-only array over the buffer in the shared memory block.
+
+    :param memory: SharedMemory: Shared memory block
+    :param buffer: Buffer: Position and size of the buffer
+    :param dtype: np.dtype: Data type of the values
+    :param num_rows: int: Number of the values
+
+    :return: np.ndarray: Array sharing the memory of the block
+    """
+    array = np.ndarray((num_rows,), dtype=dtype, buffer=memory.buf,
+                       offset=buffer[0] if buffer else 0)
+    array.setflags(write=False)
+    return array
+
+
+def byte_view(values: np.ndarray) -> memoryview:
+    """
+    Get the bytes of the values of the array.
+
+    :param values: np.ndarray: Array
+
+    :return: memoryview: Bytes of the values
+    """
+    return memoryview(np.ascontiguousarray(values).view(np.uint8))
+
+
+def align(offset: int) -> int:
+    """
+    Round the offset up to the alignment of the column buffers.
+
+    :param offset: int: Offset in the shared memory block
+
+    :return: int: Aligned offset
+    """
+    return -(-offset // ALIGNMENT) * ALIGNMENT
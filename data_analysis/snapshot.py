@@ -0,0 +1,440 @@
+"""Snapshot of the tables of the joined movie rows partitioned by year."""
+import hashlib
+import json
+import logging
+import os
+from collections import namedtuple
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from data_analysis.cache import content_hash, file_fingerprint, is_cache_valid
+from data_analysis.load_data import concat_chunks
+
+SNAPSHOT_DIR = './snapshot'
+SNAPSHOT_MODES = ('use', 'bypass', 'refresh', 'incremental', 'rebuild')
+MANIFEST_FILE = 'manifest.json'
+# Version of the layout of the partitions, the snapshots of other versions are rebuilt
+SNAPSHOT_FORMAT = 4
+# Columns of every table of the snapshot with the titles and the years of their rows
+TITLE_COLUMN = 'titleId'
+YEAR_COLUMN = 'startYear'
+
+# Changes of the tables: the titles whose rows are removed from all the tables, the new values
+# of the columns of the kept titles (indexed by their identifiers, set in the tables
+# with these columns) and the rows of the tables of the new or changed titles
+SnapshotUpdate = namedtuple('SnapshotUpdate', ['deleted', 'updated', 'inserted'])
+# Function computing the changes of the tables from the names of the changed data
+# and the fingerprints of the source files of the snapshot (None if it cannot be done)
+Updater = Callable[[List[str], Dict[str, Dict]], Optional[SnapshotUpdate]]
+
+
+def load_snapshot(
+        builder: Callable[[], Dict[str, pd.DataFrame]],
+        source_files: Dict[str, str],
+        start_year: Optional[int] = None,
+        end_year: Optional[int] = None,
+        snapshot_dir: str = SNAPSHOT_DIR,
+        mode: str = 'use',
+        updater: Optional[Updater] = None,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Load the tables of the joined rows of the years through the snapshot.
+    The builder joins the data of all the years into the tables. It is called only if the snapshot
+    is missing, built from other files, or refreshed or rebuilt after the source files changed.
+    A refresh joins all the data again and rewrites only the partitions whose data changed.
+    In the incremental mode, the changes computed by the updater are applied to the snapshot
+    instead (the builder is used if the updater cannot compute them).
+    Only the partitions of the years in the range are read. The rows are not in any order:
+    they keep the columns to order them, as their order depends on the rows of the range.
+
+    :param builder: Callable[[], Dict[str, pd.DataFrame]]:
+        Function joining the data of all the years into the tables
+    :param source_files: Dict[str, str]: Paths to the source files by the names of the data
+    :param start_year: Optional[int]: Start year for the filter
+    :param end_year: Optional[int]: End year for the filter
+    :param snapshot_dir: str: Directory with the snapshot
+    :param mode: str: 'use' the snapshot as it is (it fails if the source files changed),
+        'refresh' the partitions after the source files changed, apply the 'incremental'
+        changes or 'rebuild' it
+    :param updater: Optional[Updater]: Function computing the changes of the tables
+
+    :return: Dict[str, pd.DataFrame]: Tables of the years by their names
+        (empty if nothing was joined)
+    :raises RuntimeError: If the source files changed since the snapshot used as it is
+    """
+    if mode not in SNAPSHOT_MODES or mode == 'bypass':
+        raise ValueError(f"Invalid snapshot mode: {mode}. Available modes: {SNAPSHOT_MODES}.")
+
+    manifest = read_manifest(snapshot_dir)
+    if manifest is not None and set(manifest['sources']) != set(source_files.values()):
+        logging.info("Snapshot in %s was built from other files.", snapshot_dir)
+        manifest = None
+
+    if manifest is None or mode == 'rebuild':
+        manifest = build_snapshot(builder, source_files, snapshot_dir, manifest=None)
+    else:
+        mtimes = {file_path: source['mtime_ns']
+                  for file_path, source in manifest['sources'].items()}
+        changed = changed_sources(source_files, manifest)
+        if changed and mode == 'incremental' and updater is not None:
+            logging.info("Updating the snapshot with the changes of %s...", ', '.join(changed))
+            manifest = update_snapshot(
+                builder, updater, changed, source_files, snapshot_dir, manifest,
+            )
+        elif changed and mode in ('refresh', 'incremental'):
+            logging.info("Refreshing the snapshot after the changes of %s...", ', '.join(changed))
+            manifest = build_snapshot(builder, source_files, snapshot_dir, manifest)
+        elif changed:
+            raise RuntimeError(f"Snapshot in {snapshot_dir} is stale ({', '.join(changed)} "
+                               f"changed), refresh it to use the new data.")
+        else:
+            logging.info("Snapshot hit in %s.", snapshot_dir)
+            # The new modification times of the unchanged source files are saved,
+            # so the files are not hashed again by the next runs
+            if any(source['mtime_ns'] != mtimes[file_path]
+                   for file_path, source in manifest['sources'].items()):
+                write_manifest(manifest, snapshot_dir)
+
+    if manifest is None:
+        return {}
+    return read_partitions(snapshot_dir, manifest, start_year, end_year)
+
+
+def read_manifest(snapshot_dir: str) -> Optional[Dict[str, Dict]]:
+    """
+    Read the manifest of the snapshot with the fingerprints of the source files
+    and the hashes of the partitions.
+
+    :param snapshot_dir: str: Directory with the snapshot
+
+    :return: Optional[Dict[str, Dict]]: Manifest of the snapshot
+        (None if there is no snapshot or it has another format)
+    """
+    manifest_path = os.path.join(snapshot_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != SNAPSHOT_FORMAT:
+        logging.info("Snapshot in %s has another format.", snapshot_dir)
+        return None
+    return manifest
+
+
+def changed_sources(source_files: Dict[str, str], manifest: Dict[str, Dict]) -> List[str]:
+    """
+    Get the names of the data whose source files changed since the snapshot was built.
+    The new modification times of the files with the same content are set in the manifest.
+
+    :param source_files: Dict[str, str]: Paths to the source files by the names of the data
+    :param manifest: Dict[str, Dict]: Manifest of the snapshot
+
+    :return: List[str]: Names of the changed data
+    """
+    return [
+        data_name for data_name, file_path in source_files.items()
+        if not os.path.exists(file_path)
+        or not is_cache_valid(file_path, manifest['sources'][file_path])
+    ]
+
+
+def build_snapshot(
+        builder: Callable[[], Dict[str, pd.DataFrame]],
+        source_files: Dict[str, str],
+        snapshot_dir: str,
+        manifest: Optional[Dict[str, Dict]] = None,
+) -> Optional[Dict[str, Dict]]:
+    """
+    Join the data of all the years and save the tables partitioned by year.
+    The whole data is joined even if only some partitions change, but only the partitions
+    whose data differ from the previous snapshot are written.
+
+    :param builder: Callable[[], Dict[str, pd.DataFrame]]:
+        Function joining the data of all the years into the tables
+    :param source_files: Dict[str, str]: Paths to the source files by the names of the data
+    :param snapshot_dir: str: Directory with the snapshot
+    :param manifest: Optional[Dict[str, Dict]]: Manifest of the previous snapshot
+
+    :return: Optional[Dict[str, Dict]]: Manifest of the snapshot (None if nothing was joined)
+    """
+    sources = source_manifest(source_files)
+    tables = builder()
+    if all(table_df.empty for table_df in tables.values()):
+        logging.warning("No joined data to save in the snapshot.")
+        return None
+
+    partition_dfs = {table: dict(iter_partitions(table_df)) for table, table_df in tables.items()}
+    return write_snapshot(partition_dfs, sources, snapshot_dir, manifest)
+
+
+def update_snapshot(
+        builder: Callable[[], Dict[str, pd.DataFrame]],
+        updater: Updater,
+        changed: List[str],
+        source_files: Dict[str, str],
+        snapshot_dir: str,
+        manifest: Dict[str, Dict],
+) -> Optional[Dict[str, Dict]]:
+    """
+    Apply the changes of the tables to the partitions of the snapshot.
+    The rows of the deleted titles are removed, the updated columns are overwritten
+    and the inserted rows are added to the partitions of their years.
+    If the updater cannot compute the changes, the whole data is joined again.
+
+    :param builder: Callable[[], Dict[str, pd.DataFrame]]:
+        Function joining the data of all the years into the tables
+    :param updater: Updater: Function computing the changes of the tables
+    :param changed: List[str]: Names of the changed data
+    :param source_files: Dict[str, str]: Paths to the source files by the names of the data
+    :param snapshot_dir: str: Directory with the snapshot
+    :param manifest: Dict[str, Dict]: Manifest of the snapshot
+
+    :return: Optional[Dict[str, Dict]]: Manifest of the updated snapshot
+    """
+    sources = source_manifest(source_files)
+    update = updater(changed, manifest['sources'])
+    if update is None:
+        logging.info("Cannot update the snapshot incrementally, refreshing it...")
+        return build_snapshot(builder, source_files, snapshot_dir, manifest)
+
+    partition_dfs = {
+        table: update_partitions(snapshot_dir, table, manifest['partitions'].get(table, {}), update)
+        for table in sorted(set(manifest['partitions']) | set(update.inserted))
+    }
+
+    logging.info("Snapshot update: %d deleted or changed titles, %d updated titles, "
+                 "%d inserted rows.", len(update.deleted), len(update.updated),
+                 sum(len(inserted_df) for inserted_df in update.inserted.values()))
+    return write_snapshot(partition_dfs, sources, snapshot_dir, manifest)
+
+
+def update_partitions(
+        snapshot_dir: str, table: str, years: Dict[str, str], update: SnapshotUpdate,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Apply the changes to the partitions of the table.
+
+    :param snapshot_dir: str: Directory with the snapshot
+    :param table: str: Name of the table
+    :param years: Dict[str, str]: Hashes of the partitions of the table by their years
+    :param update: SnapshotUpdate: Changes of the tables
+
+    :return: Dict[str, pd.DataFrame]: Data of the updated partitions by their years
+    """
+    previous_dfs = {
+        year: pd.read_parquet(os.path.join(snapshot_dir, partition_file(table, year)))
+        for year in years
+    }
+    inserted_df = update.inserted.get(table, pd.DataFrame())
+    inserted = dict(iter_partitions(inserted_df)) if not inserted_df.empty else {}
+    partition_dfs = {}
+    for year in sorted(set(previous_dfs) | set(inserted), key=int):
+        partitions = [inserted[year]] if year in inserted else []
+        if year in previous_dfs:
+            partitions.insert(0, apply_update(previous_dfs.pop(year), update))
+        partition_df = concat_chunks(partitions)
+        if not partition_df.empty:
+            partition_dfs[year] = partition_df
+    return partition_dfs
+
+
+def apply_update(partition_df: pd.DataFrame, update: SnapshotUpdate) -> pd.DataFrame:
+    """
+    Remove the rows of the deleted titles from the partition and overwrite
+    the updated columns of its titles (if the table has them).
+
+    :param partition_df: pd.DataFrame: Data of the partition
+    :param update: SnapshotUpdate: Changes of the tables
+
+    :return: pd.DataFrame: Updated data of the partition
+    """
+    partition_df = partition_df[~partition_df[TITLE_COLUMN].isin(update.deleted)]
+    if not set(update.updated.columns) <= set(partition_df.columns):
+        return partition_df.reset_index(drop=True)
+    positions = update.updated.index.get_indexer(partition_df[TITLE_COLUMN])
+    found = positions >= 0
+    if not found.any():
+        return partition_df.reset_index(drop=True)
+
+    partition_df = partition_df.reset_index(drop=True)
+    for column in update.updated.columns:
+        values = partition_df[column].array.copy()
+        values[found] = update.updated[column].array.take(positions[found])
+        partition_df[column] = values
+    return partition_df
+
+
+def iter_partitions(table_df: pd.DataFrame) -> Iterator[Tuple[str, pd.DataFrame]]:
+    """
+    Split the table into the partitions of the years.
+
+    :param table_df: pd.DataFrame: Table with the year column
+
+    :return: Iterator[Tuple[str, pd.DataFrame]]: Years and the data of their partitions
+    """
+    for year, partition_df in table_df.groupby(YEAR_COLUMN, sort=True):
+        yield str(int(year)), partition_df.reset_index(drop=True)
+
+
+def source_manifest(source_files: Dict[str, str]) -> Dict[str, Dict]:
+    """
+    Get the fingerprints and the content hashes of the source files.
+    They are taken before the join, so the files changed meanwhile are stale.
+
+    :param source_files: Dict[str, str]: Paths to the source files by the names of the data
+
+    :return: Dict[str, Dict]: Fingerprints of the source files by their paths
+    """
+    sources = {}
+    for file_path in source_files.values():
+        sources[file_path] = file_fingerprint(file_path)
+        sources[file_path]['content_hash'] = content_hash(file_path)
+    return sources
+
+
+def write_snapshot(
+        partition_dfs: Dict[str, Dict[str, pd.DataFrame]],
+        sources: Dict[str, Dict],
+        snapshot_dir: str,
+        manifest: Optional[Dict[str, Dict]] = None,
+) -> Dict[str, Dict]:
+    """
+    Write the partitions whose data differ from the previous snapshot and the manifest.
+
+    :param partition_dfs: Dict[str, Dict[str, pd.DataFrame]]:
+        Data of the partitions of the tables by their names and years
+    :param sources: Dict[str, Dict]: Fingerprints of the source files by their paths
+    :param snapshot_dir: str: Directory with the snapshot
+    :param manifest: Optional[Dict[str, Dict]]: Manifest of the previous snapshot
+
+    :return: Dict[str, Dict]: Manifest of the snapshot
+    """
+    previous = manifest['partitions'] if manifest else {}
+    partitions = {}
+    for table, table_partitions in partition_dfs.items():
+        partitions[table] = {}
+        os.makedirs(os.path.join(snapshot_dir, table), exist_ok=True)
+        for year, partition_df in table_partitions.items():
+            partitions[table][year] = partition_hash(partition_df)
+            partition_path = os.path.join(snapshot_dir, partition_file(table, year))
+            if (previous.get(table, {}).get(year) == partitions[table][year]
+                    and os.path.exists(partition_path)):
+                continue
+            logging.info("Writing the snapshot partition of %s of %s...", table, year)
+            write_partition(partition_df, partition_path)
+
+    remove_other_partitions(snapshot_dir, partitions)
+    manifest = {'format': SNAPSHOT_FORMAT, 'sources': sources, 'partitions': partitions}
+    write_manifest(manifest, snapshot_dir)
+    return manifest
+
+
+def remove_other_partitions(snapshot_dir: str, partitions: Dict[str, Dict[str, str]]) -> None:
+    """
+    Remove the partitions of the years which are not in the tables any more
+    (and of the tables which are not in the snapshot).
+
+    :param snapshot_dir: str: Directory with the snapshot
+    :param partitions: Dict[str, Dict[str, str]]: Hashes of the partitions of the tables
+
+    :return: None
+    """
+    partition_files = {os.path.join(snapshot_dir, partition_file(table, year))
+                       for table, table_partitions in partitions.items()
+                       for year in table_partitions}
+    for directory, _, file_names in os.walk(snapshot_dir):
+        for file_name in file_names:
+            file_path = os.path.join(directory, file_name)
+            if file_name.endswith('.parquet') and file_path not in partition_files:
+                os.remove(file_path)
+
+
+def write_manifest(manifest: Dict[str, Dict], snapshot_dir: str) -> None:
+    """
+    Save the manifest of the snapshot.
+
+    :param manifest: Dict[str, Dict]: Manifest of the snapshot
+    :param snapshot_dir: str: Directory with the snapshot
+
+    :return: None
+    """
+    with open(os.path.join(snapshot_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+
+def read_partitions(
+        snapshot_dir: str,
+        manifest: Dict[str, Dict],
+        start_year: Optional[int] = None,
+        end_year: Optional[int] = None,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Read the partitions of the tables of the years in the range
+    (all the years if the range is not given).
+
+    :param snapshot_dir: str: Directory with the snapshot
+    :param manifest: Dict[str, Dict]: Manifest of the snapshot
+    :param start_year: Optional[int]: Start year for the filter
+    :param end_year: Optional[int]: End year for the filter
+
+    :return: Dict[str, pd.DataFrame]: Tables of the years by their names
+        (empty tables if there are no rows of the years)
+    """
+    tables = {}
+    for table, table_partitions in manifest['partitions'].items():
+        years = sorted(table_partitions, key=int)
+        if start_year and end_year:
+            years = [year for year in years if start_year <= int(year) <= end_year]
+        tables[table] = concat_chunks([
+            pd.read_parquet(os.path.join(snapshot_dir, partition_file(table, year)))
+            for year in years
+        ]) if years else pd.DataFrame()
+    if all(table_df.empty for table_df in tables.values()):
+        logging.error("No data of the years %s-%s in the snapshot.", start_year, end_year)
+    return tables
+
+
+def partition_file(table: str, year: str) -> str:
+    """
+    Get the path to the file of the partition in the snapshot directory.
+
+    :param table: str: Name of the table
+    :param year: str: Year of the partition
+
+    :return: str: Path to the file
+    """
+    return os.path.join(table, f'{YEAR_COLUMN}={year}.parquet')
+
+
+def partition_hash(partition_df: pd.DataFrame) -> str:
+    """
+    Compute the hash of the data of the partition.
+
+    :param partition_df: pd.DataFrame: Data of the partition
+
+    :return: str: Hex digest of the data
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(','.join(partition_df.columns).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(partition_df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def write_partition(partition_df: pd.DataFrame, partition_path: str) -> None:
+    """
+    Write the partition through a temporary file, so the partition is never left half-written.
+
+    :param partition_df: pd.DataFrame: Data of the partition
+    :param partition_path: str: Path to the partition
+
+    :return: None
+    """
+    tmp_path = f'{partition_path}.tmp'
+    try:
+        partition_df.to_parquet(tmp_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, partition_path)
@@ -3,6 +3,11 @@ import argparse
 import logging
 
 from app import app
+from app.tasks import TASK_EXECUTORS
+from data_analysis.analysis import NUM_OF_FILMS_TO_PROCESS
+from data_analysis.cache import CACHE_DIR, CACHE_MODES
+from data_analysis.load_data import CHUNK_SIZE
+from data_analysis.snapshot import SNAPSHOT_DIR, SNAPSHOT_MODES
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Film data analysis app')
@@ -18,14 +23,50 @@ if __name__ == '__main__':
                         help='Path to the name people data in CSV or TSV file')
     parser.add_argument('countries_name_data',
                         help='Path to the countries name data in CSV or TSV file')
-    parser.add_argument('population_data',
+    parser.add_argument('population_data', nargs='?',
                         help='Path to the population data in CSV or TSV file')
-    parser.add_argument('gdp_data',
+    parser.add_argument('gdp_data', nargs='?',
                         help='Path to the GDP data in CSV or TSV file')
     parser.add_argument('-start', type=int, default=None, help='Start year for analysis')
     parser.add_argument('-end', type=int, default=None, help='End year for analysis')
+    parser.add_argument('-cache', choices=CACHE_MODES, default='use',
+                        help='Use the cache of the parsed data files, bypass it or rebuild it')
+    parser.add_argument('-cache_dir', default=CACHE_DIR,
+                        help='Directory with the cache of the parsed data files')
+    parser.add_argument('-snapshot', choices=SNAPSHOT_MODES, default='use',
+                        help='Use the snapshot of the merged data of all the years, bypass it, '
+                             'merge it again after the source data changed, apply only '
+                             'the changed titles of the new IMDb data or rebuild it')
+    parser.add_argument('-snapshot_dir', default=SNAPSHOT_DIR,
+                        help='Directory with the snapshot of the merged data')
+    parser.add_argument('-workers', type=int, default=1,
+                        help='Number of processes loading the data files concurrently')
+    parser.add_argument('-mmap', action='store_true',
+                        help='Memory-map the uncompressed data files instead of buffered reads')
+    parser.add_argument('-chunk_size', type=int, default=CHUNK_SIZE,
+                        help='Number of rows in a chunk when the data files are read in chunks')
+    parser.add_argument('-stream_akas', action='store_true',
+                        help='Stream the akas data in chunks keeping only the regions of '
+                             'the filtered titles')
+    parser.add_argument('-max_memory_mb', type=int, default=None,
+                        help='Memory ceiling in MB of the streamed akas data')
+    parser.add_argument('-indicators_data', default=None,
+                        help='Path to the World Bank export with many series in CSV or TSV file '
+                             '(replaces the population and GDP data)')
+    parser.add_argument('-num_of_films', type=int, nargs='+', default=NUM_OF_FILMS_TO_PROCESS,
+                        help='Numbers of the top movies per country (task 1) and the films '
+                             'of the directors (task 3) to process')
+    parser.add_argument('-tasks', choices=TASK_EXECUTORS, default='sequential',
+                        help='Run the analysis tasks sequentially or concurrently in threads '
+                             'or in processes reading the merged data from shared memory')
+
+    arguments = parser.parse_args()
+    if arguments.indicators_data is None and arguments.gdp_data is None:
+        parser.error('the population and GDP data or -indicators_data are required')
+    if min(arguments.num_of_films) < 1:
+        parser.error('the numbers of films must be positive')
 
     try:
-        app.run(parser.parse_args())
+        app.run(arguments)
     except Exception as e:
         logging.critical("An unexpected error occurred: %s", str(e))
@@ -1,5 +1,6 @@
 """Tests for the data_analysis.analysis file."""
 import pytest
+import numpy as np
 import pandas as pd
 import data_analysis.analysis as a
 
@@ -114,6 +115,81 @@ def test_get_top_n_movies_per_country_no_valid_country(movies_data):
     pd.testing.assert_frame_equal(result, expected_df)
 
 
+def test_get_top_n_movies_per_country_categorical(movies_data):
+    """Test the function with the categorical country columns with unused categories."""
+    categorical_data = movies_data.astype({'country_code': 'category',
+                                           'country_name': 'category'})
+    categorical_data['country_code'] = categorical_data['country_code'].cat.add_categories('PL')
+    result = a.get_top_n_movies_per_country(categorical_data, 2)
+    assert result['country_code'].tolist() == ['FR', 'US']
+    assert result['avg_rating'].tolist() == [8.5, 9.25]
+
+
+def test_get_top_n_movies_per_country_float32(movies_data):
+    """Test that the averages of the float32 ratings are computed from their decimal values."""
+    float32_data = movies_data.assign(average_rating=[9.89, 9.89, 7.3, 8.1, 7.5, 9.0, 8.0])
+    result = a.get_top_n_movies_per_country(float32_data.astype({'average_rating': 'float32'}), 2)
+    assert result['avg_rating'].dtype == 'float64'
+    assert result['avg_rating'].tolist() == [8.55, 9.89]
+
+
+def test_get_top_n_movies_per_country_large_votes(movies_data):
+    """Test that the total votes of the Int32 votes do not overflow."""
+    large_votes_data = movies_data.assign(num_of_votes=2_000_000_000).astype(
+        {'num_of_votes': 'Int32'})
+    result = a.get_top_n_movies_per_country(large_votes_data, 2)
+    assert result['total_votes'].dtype == 'int64'
+    assert result['total_votes'].tolist() == [4_000_000_000, 4_000_000_000]
+
+
+def test_get_top_n_movies_per_country_exact_averages():
+    """Test that the average ratings are the means of the top movies
+    without the rounding errors of the other movies."""
+    movies_df = pd.DataFrame({
+        'title': [f'Movie{i}' for i in range(6)],
+        'country_code': ['US', 'US', 'US', 'FR', 'FR', 'FR'],
+        'country_name': ['United States'] * 3 + ['France'] * 3,
+        'average_rating': [9.6, 5.6, 2.3, 9.7, 8.3, 6.1],
+        'num_of_votes': [100, 150, 200, 120, 80, 110],
+    })
+    result = a.get_top_n_movies_per_country(movies_df, 2)
+    expected = movies_df.sort_values('average_rating', ascending=False).groupby(
+        'country_name').head(2).groupby('country_name')['average_rating'].mean()
+    assert result['avg_rating'].tolist() == expected.tolist()
+
+
+def test_get_top_movies_per_country_many_n(movies_data):
+    """Test computing the top movies for many n at once."""
+    result = a.get_top_movies_per_country(movies_data, [1, 2, 3])
+
+    assert list(result) == [1, 2, 3]
+    for n, top_n_ratings_df in result.items():
+        pd.testing.assert_frame_equal(
+            top_n_ratings_df, a.get_top_n_movies_per_country(movies_data, n),
+        )
+    assert result[1]['country_code'].tolist() == ['FR', 'DE', 'US']
+    assert result[3]['avg_rating'].tolist() == [8.166666666666666, 9.0]
+    assert result[3]['total_votes'].tolist() == [310, 450]
+
+
+def test_top_n_positions_tiebreaker():
+    """Test selecting the top movies by the rating and then the number of votes."""
+    ratings = np.array([7.0, 9.0, 8.0, 8.0, 8.0, -np.inf, 6.0])
+    votes = np.array([500, 10, 30, 50, 40, 900, 20])
+
+    result = a.top_n_positions(ratings, votes, 3)
+
+    assert sorted(result.tolist()) == [1, 3, 4]
+
+
+def test_select_top_movies(movies_data):
+    """Test selecting the top movies of every country without sorting them."""
+    result = a.select_top_movies(movies_data, 2)
+
+    selected = movies_data.iloc[result]
+    assert sorted(selected['title'].tolist()) == ['Movie1', 'Movie3', 'Movie4', 'Movie6', 'Movie7']
+
+
 # Test the calculate_impact_metrics function
 @pytest.fixture
 def merged_data():
@@ -278,6 +354,15 @@ def test_create_rank_dataframe_single_country(impact_data, merged_data2):
     pd.testing.assert_frame_equal(result, expected_df)
 
 
+def test_create_rank_dataframe_other_indicator(impact_data, merged_data2):
+    """Test the function with an additional country indicator."""
+    merged_data2['internet_users'] = [90.0, None, 88.0]
+    result = a.create_rank_dataframe(impact_data, merged_data2)
+
+    assert result.columns[-1] == 'internet_users_rank'
+    assert result['internet_users_rank'].tolist() == [1, 3, 2]
+
+
 def test_create_rank_dataframe_empty_df():
     """Test the function with an empty DataFrame."""
     empty_impact_df = pd.DataFrame(
@@ -455,14 +540,11 @@ def merged_data3():
     """Create a DataFrame with merged data."""
     data = {
         'director_id': [1, 1, 1, 1, 2, 2, 2, 2, 3, 3],
-        'director_name': ['Director A', 'Director A', 'Director A', 'Director A',
-                          'Director B', 'Director B', 'Director B', 'Director B',
-                          'Director C', 'Director C'],
         'year': [2000, 2001, 2002, 2003, 2000, 2001, 2002, 2003, 2000, 2001],
         'average_rating': [7.0, 7.5, 8.0, 8.5, 6.0, 6.5, 7.0, 7.5, 9.0, 9.5],
         'num_of_votes': [100, 150, 200, 250, 100, 150, 200, 250, 300, 350]
     }
-    return pd.DataFrame(data)
+    return pd.DataFrame(data, index=pd.RangeIndex(10, name='title_id'))
 
 
 @pytest.fixture
@@ -471,12 +553,34 @@ def eligible_directors():
     return pd.Series([1, 2, 3])
 
 
+@pytest.fixture
+def directors_df(merged_data3):
+    """Return the bridge table of the movies and their directors with their names."""
+    return merged_data3['director_id'].reset_index().assign(
+        director_name=lambda df: df['director_id'].map(
+            {1: 'Director A', 2: 'Director B', 3: 'Director C'}))
+
+
+def test_get_director_films():
+    """Test joining the movies with the bridge table of the co-directed movies."""
+    movies_df = pd.DataFrame({
+        'title_id': [1, 1, 2, 3],
+        'country_code': ['US', 'FR', 'US', 'US'],
+    }).set_index('title_id')
+    directors_df = pd.DataFrame({'title_id': [1, 1, 2, 4], 'director_id': [10, 11, 12, 13]})
+
+    result = a.get_director_films(movies_df, directors_df)
+
+    assert sorted(zip(result.index, result['country_code'], result['director_id'])) == [
+        (1, 'FR', 10), (1, 'FR', 11), (1, 'US', 10), (1, 'US', 11), (2, 'US', 12)]
+
+
 def test_calculate_career_progression_basic(merged_data3):
     """Test the function with basic data."""
     n = 4
     result = a.calculate_career_progression(merged_data3, n, pd.Series([1, 2]))
     expected_data = {
-        'directors': ['Director A', 'Director B'],
+        'director_id': [1, 2],
         'first_avg_rating': [7.25, 6.25],
         'first_num_of_votes': [250, 250],
         'last_avg_rating': [8.25, 7.25],
@@ -493,7 +597,7 @@ def test_calculate_career_progression_half_films(merged_data3, eligible_director
     n = 2
     result = a.calculate_career_progression(merged_data3, n, eligible_directors)
     expected_data = {
-        'directors': ['Director A', 'Director B', 'Director C'],
+        'director_id': [1, 2, 3],
         'first_avg_rating': [7.0, 6.0, 9.0],
         'first_num_of_votes': [100, 100, 300],
         'last_avg_rating': [8.5, 7.5, 9.5],
@@ -505,22 +609,92 @@ def test_calculate_career_progression_half_films(merged_data3, eligible_director
     pd.testing.assert_frame_equal(result, expected_df)
 
 
+def test_calculate_career_progression_odd_n(merged_data3):
+    """Test the function with an odd number of films."""
+    result = a.calculate_career_progression(merged_data3, 3, pd.Series([1]))
+
+    assert result['first_avg_rating'].tolist() == [7.0]
+    assert result['last_avg_rating'].tolist() == [8.5]
+
+
+def test_get_career_progressions_many_n(merged_data3):
+    """Test calculating the career progression for many n at once."""
+    result = a.get_career_progressions(merged_data3, [2, 4, 6])
+
+    assert list(result) == [2, 4]
+    for n, career_progression in result.items():
+        expected_df = a.calculate_career_progression(merged_data3, n, pd.Series([1, 2, 3]))
+        pd.testing.assert_frame_equal(career_progression, expected_df)
+    assert result[4]['director_id'].tolist() == [1, 2]
+    assert result[4]['rating_diff'].tolist() == [1.0, 1.0]
+
+
+def test_perform_task_3_homonyms(merged_data3, directors_df, tmp_path, monkeypatch):
+    """Test that the directors with the same name are not counted together."""
+    monkeypatch.setattr(a, 'PATH_TO_SAVE_RESULTS', str(tmp_path))
+    movies_df = merged_data3.drop(columns='director_id')
+
+    a.perform_task_3(movies_df, directors_df.assign(director_name='Director A'), [2])
+
+    result = pd.read_csv(tmp_path / '3_votes_diff_2_2000_2003.csv')
+    assert result['Director'].tolist() == ['Director A'] * 3
+    assert result['Career Progression Number of Votes'].tolist() == [150, 150, 50]
+
+
+def test_perform_task_3_keeps_merged_data(merged_data3, directors_df, tmp_path, monkeypatch):
+    """Test that the task 3 does not modify the merged data shared with the other tasks."""
+    monkeypatch.setattr(a, 'PATH_TO_SAVE_RESULTS', str(tmp_path))
+    movies_df = merged_data3.drop(columns='director_id')
+    expected_df = movies_df.copy()
+
+    a.perform_task_3(movies_df, directors_df.drop(index=9), [2])
+
+    pd.testing.assert_frame_equal(movies_df, expected_df)
+    assert pd.read_csv(tmp_path / '3_rating_diff_2_2000_2003.csv')['Director'].tolist() == [
+        'Director A', 'Director B']
+
+
+def test_calculate_career_progression_large_votes(merged_data3):
+    """Test that the sums of the Int32 votes do not overflow."""
+    large_votes_data = merged_data3.assign(num_of_votes=2_000_000_000).astype(
+        {'num_of_votes': 'Int32'})
+
+    result = a.calculate_career_progression(large_votes_data, 4, pd.Series([1, 2]))
+
+    assert result['first_num_of_votes'].dtype == 'int64'
+    assert result['first_num_of_votes'].tolist() == [4_000_000_000, 4_000_000_000]
+    assert result['votes_diff'].tolist() == [0, 0]
+
+
+def test_perform_task_3_ties_by_name(merged_data3, directors_df, tmp_path, monkeypatch):
+    """Test that the directors with the same progression are listed by their names."""
+    monkeypatch.setattr(a, 'PATH_TO_SAVE_RESULTS', str(tmp_path))
+    movies_df = merged_data3.drop(columns='director_id')
+    directors_df['director_name'] = directors_df['director_id'].map(
+        {1: 'Director C', 2: 'Director B', 3: 'Director A'})
+
+    a.perform_task_3(movies_df, directors_df, [2])
+
+    result = pd.read_csv(tmp_path / '3_rating_diff_2_2000_2003.csv')
+    assert result['Director'].tolist() == ['Director B', 'Director C', 'Director A']
+
+
 def test_calculate_career_progression_empty_df(eligible_directors):
     """Test the function with an empty DataFrame."""
     empty_df = pd.DataFrame(
-        columns=['director_id', 'director_name', 'year', 'average_rating', 'num_of_votes'])
+        columns=['director_id', 'year', 'average_rating', 'num_of_votes'])
     result = a.calculate_career_progression(empty_df, 4, eligible_directors)
     expected_data = {
+        'director_id': [],
         'first_avg_rating': [],
         'first_num_of_votes': [],
-        'directors': [],
         'last_avg_rating': [],
         'last_num_of_votes': [],
         'rating_diff': [],
         'votes_diff': []
     }
     expected_df = pd.DataFrame(expected_data)
-    expected_df.directors = expected_df.directors.astype('object')
+    expected_df.director_id = expected_df.director_id.astype('object')
     expected_df.first_avg_rating = expected_df.first_avg_rating.astype('object')
     expected_df.first_num_of_votes = expected_df.first_num_of_votes.astype('object')
     expected_df.last_avg_rating = expected_df.last_avg_rating.astype('object')
@@ -0,0 +1,110 @@
+"""Tests for the data_analysis.cache file."""
+import os
+
+import pandas as pd
+import pytest
+
+from data_analysis import cache
+from data_analysis.cache import content_hash, load_cached, read_cache_entry
+
+
+@pytest.fixture
+def source_file(tmp_path):
+    """Create a small CSV source file."""
+    path = tmp_path / 'source.csv'
+    path.write_text('col1,col2\n1,2\n3,4\n', encoding='utf-8')
+    return str(path)
+
+
+def counting_loader(file_path, calls):
+    """Return a loader that records how many times the file was parsed."""
+    def loader():
+        calls.append(file_path)
+        return pd.read_csv(file_path)
+    return loader
+
+
+def test_load_cached_hit(source_file, tmp_path):
+    """Test that the second load is served from the cache."""
+    calls = []
+    cache_dir = str(tmp_path / 'cache')
+    first = load_cached(counting_loader(source_file, calls), source_file, cache_dir=cache_dir)
+    second = load_cached(counting_loader(source_file, calls), source_file, cache_dir=cache_dir)
+
+    assert len(calls) == 1
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_load_cached_source_changed(source_file, tmp_path):
+    """Test that the source file is parsed again after it has changed."""
+    calls = []
+    cache_dir = str(tmp_path / 'cache')
+    load_cached(counting_loader(source_file, calls), source_file, cache_dir=cache_dir)
+    with open(source_file, 'a', encoding='utf-8') as f:
+        f.write('5,6\n')
+    result = load_cached(counting_loader(source_file, calls), source_file, cache_dir=cache_dir)
+
+    assert len(calls) == 2
+    assert len(result) == 3
+
+
+def test_load_cached_touched_source(source_file, tmp_path):
+    """Test that the cache is used when only the modification time has changed."""
+    calls = []
+    cache_dir = str(tmp_path / 'cache')
+    load_cached(counting_loader(source_file, calls), source_file, cache_dir=cache_dir)
+    stat = os.stat(source_file)
+    os.utime(source_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    load_cached(counting_loader(source_file, calls), source_file, cache_dir=cache_dir)
+
+    assert len(calls) == 1
+
+
+def test_load_cached_touched_source_hashed_once(source_file, tmp_path, monkeypatch):
+    """Test that the touched source is hashed only by the first load after the touch."""
+    cache_dir = str(tmp_path / 'cache')
+    load_cached(counting_loader(source_file, []), source_file, cache_dir=cache_dir)
+    stat = os.stat(source_file)
+    os.utime(source_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    hashed = []
+    monkeypatch.setattr(cache, 'content_hash',
+                        lambda file_path: hashed.append(file_path) or content_hash(file_path))
+
+    load_cached(counting_loader(source_file, []), source_file, cache_dir=cache_dir)
+    load_cached(counting_loader(source_file, []), source_file, cache_dir=cache_dir)
+
+    assert hashed == [source_file]
+
+
+def test_load_cached_bypass_and_rebuild(source_file, tmp_path):
+    """Test bypassing and rebuilding the cache."""
+    calls = []
+    cache_dir = str(tmp_path / 'cache')
+    load_cached(counting_loader(source_file, calls), source_file,
+                cache_dir=cache_dir, mode='bypass')
+    assert not os.path.exists(cache_dir)
+
+    load_cached(counting_loader(source_file, calls), source_file, cache_dir=cache_dir)
+    load_cached(counting_loader(source_file, calls), source_file,
+                cache_dir=cache_dir, mode='rebuild')
+    assert len(calls) == 3
+
+
+def test_load_cached_invalid_mode(source_file):
+    """Test loading with an invalid cache mode."""
+    with pytest.raises(ValueError, match="Invalid cache mode"):
+        load_cached(pd.DataFrame, source_file, mode='invalid')
+
+
+def test_read_cache_entry_previous_version(source_file, tmp_path):
+    """Test reading the cached data of the previous version after the source has changed."""
+    cache_dir = str(tmp_path / 'cache')
+    previous_hash = content_hash(source_file)
+    load_cached(counting_loader(source_file, []), source_file, cache_dir=cache_dir)
+    with open(source_file, 'a', encoding='utf-8') as f:
+        f.write('5,6\n')
+
+    previous = read_cache_entry(source_file, previous_hash, cache_dir=cache_dir)
+
+    assert len(previous) == 2
+    assert read_cache_entry(source_file, content_hash(source_file), cache_dir=cache_dir) is None
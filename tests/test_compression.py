@@ -0,0 +1,66 @@
+"""Tests for the data_analysis.compression file."""
+import bz2
+import gzip
+
+import pytest
+
+from data_analysis.compression import (
+    PipelinedDecompressor, get_compression, map_file, open_data_file, strip_compression_suffix,
+)
+
+CONTENT = b"col1\tcol2\n" + b"".join(f"{i}\t{i + 1}\n".encode() for i in range(10000))
+
+
+def test_get_compression():
+    """Test detecting the compression by the file suffix."""
+    assert get_compression("title.akas.tsv.gz") == "gzip"
+    assert get_compression("title.akas.tsv.bz2") == "bz2"
+    assert get_compression("title.akas.tsv.zst") == "zstd"
+    assert get_compression("title.akas.tsv") is None
+    assert strip_compression_suffix("title.akas.tsv.gz") == "title.akas.tsv"
+
+
+@pytest.mark.parametrize("suffix, compress", [(".gz", gzip.compress), (".bz2", bz2.compress)])
+def test_open_data_file_compressed(tmp_path, suffix, compress):
+    """Test reading the content decompressed in the background thread."""
+    path = tmp_path / f"data.tsv{suffix}"
+    path.write_bytes(compress(CONTENT))
+
+    with PipelinedDecompressor(str(path), get_compression(str(path)), block_size=1000) as f:
+        assert f.readall() == CONTENT
+
+
+def test_open_data_file_uncompressed(tmp_path):
+    """Test passing on the path of an uncompressed file."""
+    path = str(tmp_path / "data.tsv")
+    with open_data_file(path) as source:
+        assert source == path
+
+
+def test_open_data_file_corrupted(tmp_path):
+    """Test passing the decompression error to the reader."""
+    path = tmp_path / "data.tsv.gz"
+    path.write_bytes(gzip.compress(CONTENT)[:100])
+
+    with pytest.raises(EOFError):
+        with PipelinedDecompressor(str(path), "gzip") as f:
+            f.readall()
+
+
+def test_open_data_file_memory_map(tmp_path):
+    """Test memory-mapping the uncompressed file."""
+    path = tmp_path / "data.tsv"
+    path.write_bytes(CONTENT)
+
+    with open_data_file(str(path), memory_map=True) as mapped:
+        assert mapped[:len(CONTENT)] == CONTENT
+
+
+def test_map_file_fallback(tmp_path):
+    """Test falling back to buffered reads when the file cannot be memory-mapped."""
+    path = tmp_path / "empty.tsv"
+    path.write_bytes(b"")
+
+    assert map_file(str(path)) is None
+    with open_data_file(str(path), memory_map=True) as source:
+        assert source == str(path)
@@ -4,6 +4,7 @@ import pandas as pd
 import numpy as np
 
 import data_analysis.data_processing as dp
+from data_analysis.keys import build_key_index
 
 
 # Test process_world_bank_data function
@@ -26,8 +27,9 @@ def test_process_world_bank_data(mock_world_bank_data):
 
     expected_df = pd.DataFrame({
         'Country Code': ['USA', 'GBR', 'FRA', 'USA', 'GBR', 'FRA'],
-        'Year': [2000, 2000, 2000, 2001, 2001, 2001],
-        'Population': [300000000, 60000000, 65000000, 305000000, 60500000, 65500000]
+        'Year': np.array([2000, 2000, 2000, 2001, 2001, 2001], dtype='int16'),
+        'Population': [300000000.0, 60000000.0, 65000000.0, 305000000.0, 60500000.0,
+                       65500000.0]
     })
 
     pd.testing.assert_frame_equal(processed_df.reset_index(drop=True), expected_df)
@@ -50,13 +52,68 @@ def test_process_world_bank_data_with_nan(mock_world_bank_data):
 
     expected_df = pd.DataFrame({
         'Country Code': ['GBR', 'FRA', 'USA', 'GBR', 'FRA'],
-        'Year': [2000, 2000, 2001, 2001, 2001],
+        'Year': np.array([2000, 2000, 2001, 2001, 2001], dtype='int16'),
         'Population': [60000000.0, 65000000.0, 305000000.0, 60500000.0, 65500000.0]
     })
 
     pd.testing.assert_frame_equal(processed_df.reset_index(drop=True), expected_df)
 
 
+def test_process_world_bank_data_keeps_input(mock_world_bank_data):
+    """Test that processing the World Bank data does not modify the input."""
+    original_df = mock_world_bank_data.copy()
+    dp.process_world_bank_data(mock_world_bank_data, 'Population')
+
+    pd.testing.assert_frame_equal(mock_world_bank_data, original_df)
+
+
+def test_process_world_bank_data_invalid_year(mock_world_bank_data):
+    """Test processing the World Bank data with a column which is not a year."""
+    invalid_df = mock_world_bank_data.rename(columns={'2001 [YR2001]': 'Notes'})
+
+    with pytest.raises(ValueError, match="Cannot parse the years"):
+        dp.process_world_bank_data(invalid_df, 'Population')
+
+
+# Test process_world_bank_indicators function
+@pytest.fixture
+def mock_indicators_data():
+    """Fixture for the World Bank export with many series."""
+    return pd.DataFrame({
+        'Country Name': ['United States', 'United States', 'France', 'France', 'France'],
+        'Country Code': ['USA', 'USA', 'FRA', 'FRA', 'FRA'],
+        'Series Name': ['Population, total', 'GDP (current US$)', 'Population, total',
+                        'GDP (current US$)', 'Cinema screens'],
+        'Series Code': ['SP.POP.TOTL', 'NY.GDP.MKTP.CD', 'SP.POP.TOTL', 'NY.GDP.MKTP.CD',
+                        'CINEMA.SCREENS'],
+        '2000 [YR2000]': [300000000, 1000000000, 65000000, 300000000, 5000],
+        '2001 [YR2001]': [305000000, np.nan, 65500000, 310000000, np.nan],
+    })
+
+
+def test_process_world_bank_indicators(mock_indicators_data):
+    """Test pivoting the World Bank export into the matrix of the indicators."""
+    processed_df = dp.process_world_bank_indicators(mock_indicators_data)
+
+    expected_df = pd.DataFrame({
+        'Country Code': ['USA', 'FRA', 'FRA'],
+        'Year': np.array([2000, 2000, 2001], dtype='int16'),
+        'Population': [300000000.0, 65000000.0, 65500000.0],
+        'GDP': [1000000000.0, 300000000.0, 310000000.0],
+        'CINEMA.SCREENS': [np.nan, 5000.0, np.nan],
+    })
+
+    pd.testing.assert_frame_equal(processed_df, expected_df)
+
+
+def test_process_world_bank_indicators_missing_series(mock_indicators_data):
+    """Test processing the World Bank export without the GDP series."""
+    no_gdp_df = mock_indicators_data[mock_indicators_data['Series Code'] != 'NY.GDP.MKTP.CD']
+
+    with pytest.raises(ValueError, match="no series of the indicators: \\['GDP'\\]"):
+        dp.process_world_bank_indicators(no_gdp_df)
+
+
 # Test filter_years function
 @pytest.fixture
 def mock_basics_df():
@@ -319,18 +376,11 @@ def test_merge_data_happy_path(
         'startYear': [2000, 2001, 2002],
         'averageRating': [7.5, 8.0, 6.5],
         'numVotes': [1500, 3000, 2500],
-        'directors': ['nm0000001', 'nm0000002', 'nm0000003'],
-        'nconst': ['nm0000001', 'nm0000002', 'nm0000003'],
-        'primaryName': ['Director1', 'Director2', 'Director3'],
-        'alpha-2': ['US', 'GB', 'FR'],
-        'alpha-3': ['USA', 'GBR', 'FRA'],
-        'name': ['United States', 'United Kingdom', 'France'],
-        'Country Code_x': ['USA', 'GBR', 'FRA'],
-        'Year_x': [2000, 2001, 2002],
-        'Population': [300000000, 60000000, 65000000],
-        'Country Code_y': ['USA', 'GBR', 'FRA'],
-        'Year_y': [2000, 2001, 2002],
-        'GDP': [1000000000, 200000000, 300000000]
+        'country_name': pd.Categorical(['United States', 'United Kingdom', 'France']),
+        'population': [300000000, 60000000, 65000000],
+        'gdp': [1000000000, 200000000, 300000000],
+        'gdp_per_population': [1000000000 / 300000000, 200000000 / 60000000,
+                               300000000 / 65000000],
     })
 
     pd.testing.assert_frame_equal(merged_df, expected_df)
@@ -371,18 +421,11 @@ def test_merge_data_missing_data(
         'startYear': [2000, 2002],
         'averageRating': [7.5, 6.5],
         'numVotes': [1500, 2500],
-        'directors': ['nm0000001', 'nm0000003'],
-        'nconst': ['nm0000001', 'nm0000003'],
-        'primaryName': ['Director1', 'Director3'],
-        'alpha-2': ['US', 'FR'],
-        'alpha-3': ['USA', 'FRA'],
-        'name': ['United States', 'France'],
-        'Country Code_x': ['USA', 'FRA'],
-        'Year_x': [2000, 2002],
-        'Population': [300000000, 65000000],
-        'Country Code_y': ['USA', 'FRA'],
-        'Year_y': [2000, 2002],
-        'GDP': [1000000000, 300000000]
+        'country_name': pd.Categorical(['United States', 'France'],
+                                       categories=['France', 'United Kingdom', 'United States']),
+        'population': [300000000, 65000000],
+        'gdp': [1000000000, 300000000],
+        'gdp_per_population': [1000000000 / 300000000, 300000000 / 65000000],
     })
 
     pd.testing.assert_frame_equal(merged_df, expected_df, check_dtype=False)
@@ -400,6 +443,127 @@ def test_merge_data_type_mismatch(
                       countries_df, population_df, gdp_df)
 
 
+def test_merge_data_keeps_akas_order(
+        basics_df, ratings_df, akas_df, crew_df, name_df,
+        countries_df, population_df, gdp_df,
+):
+    """Test that the rows follow the akas data whatever the join order."""
+    reversed_akas_df = akas_df.iloc[::-1].reset_index(drop=True)
+
+    merged_df = dp.merge_data(basics_df, ratings_df, reversed_akas_df, crew_df, name_df,
+                              countries_df, population_df, gdp_df)
+
+    assert merged_df['titleId'].tolist() == reversed_akas_df['titleId'].tolist()
+    assert dp.POSITION_COLUMN not in merged_df.columns
+
+
+def test_group_order():
+    """Test grouping the rows by the keys in the order of their first appearance."""
+    regions = pd.Series(['FR', 'US', 'FR', None, 'US', None])
+    years = np.array([2001, 2000, 2000, 2000, 2000, 2000])
+
+    assert dp.group_order(regions).tolist() == [0, 2, 1, 4, 3, 5]
+    assert dp.group_order(regions, years).tolist() == [0, 1, 4, 2, 3, 5]
+
+
+def test_merge_data_directors(
+        basics_df, ratings_df, akas_df, crew_df, name_df,
+        countries_df, population_df, gdp_df,
+):
+    """Test keeping one row per movie for the co-directed movies and the movies
+    with a named director only."""
+    crew_df = pd.DataFrame({
+        'tconst': ['tt0000001', 'tt0000001', 'tt0000002', 'tt0000003'],
+        'directors': ['nm0000001', 'nm0000002', 'nm0000004', 'nm0000003'],
+    })
+
+    merged_df = dp.merge_data(basics_df, ratings_df, akas_df, crew_df, name_df,
+                              countries_df, population_df, gdp_df)
+
+    assert merged_df['titleId'].tolist() == ['tt0000001', 'tt0000003']
+    assert 'directors' not in merged_df.columns
+
+
+def test_process_directors(name_df):
+    """Test building the bridge table of the given movies and the directors with a name."""
+    crew_df = pd.DataFrame({
+        'tconst': ['tt0000001', 'tt0000001', 'tt0000002', 'tt0000003', 'tt0000003',
+                   'tt0000004'],
+        'directors': ['nm0000001', 'nm0000002', 'nm0000004', 'nm0000002', 'nm0000002',
+                      'nm0000003'],
+    })
+    name_df.loc[0, 'primaryName'] = None
+
+    directors_df = dp.process_directors(
+        crew_df, name_df, pd.Index(['tt0000001', 'tt0000002', 'tt0000003']))
+
+    pd.testing.assert_frame_equal(directors_df, pd.DataFrame({
+        'title_id': ['tt0000001', 'tt0000003'],
+        'director_id': ['nm0000002', 'nm0000002'],
+        'director_name': ['Director2', 'Director2'],
+    }))
+
+
+def test_merge_data_indicators(
+        basics_df, ratings_df, akas_df, crew_df, name_df, countries_df,
+):
+    """Test merging the matrix of the World Bank indicators in one lookup."""
+    indicators_df = pd.DataFrame({
+        'Country Code': ['USA', 'GBR', 'FRA'],
+        'Year': [2000, 2001, 2002],
+        'Population': [300000000.0, 60000000.0, 65000000.0],
+        'GDP': [1000000000.0, 200000000.0, 300000000.0],
+        'GDP PPP': [1100000000.0, np.nan, 350000000.0],
+    })
+
+    merged_df = dp.merge_data(basics_df, ratings_df, akas_df, crew_df, name_df,
+                              countries_df, indicators_df)
+
+    assert merged_df.columns[-5:].tolist() == [
+        'country_name', 'population', 'gdp', 'gdp_ppp', 'gdp_per_population',
+    ]
+    assert merged_df['population'].tolist() == [300000000.0, 60000000.0, 65000000.0]
+    assert merged_df['gdp_ppp'].tolist()[::2] == [1100000000.0, 350000000.0]
+    assert np.isnan(merged_df['gdp_ppp'].iloc[1])
+
+
+def test_plan_next_join_chooses_smallest_join(basics_df, ratings_df, akas_df):
+    """Test that the join with the smallest estimated result is chosen among the ready ones."""
+    many_akas_df = pd.concat([akas_df] * 3, ignore_index=True)
+    steps = [
+        dp.make_join_step('akas', many_akas_df, ['tconst'], ['titleId']),
+        dp.make_join_step('ratings', ratings_df.iloc[:1], ['tconst'], ['tconst']),
+        dp.make_join_step('countries', akas_df, ['region'], ['region'], ('akas',)),
+    ]
+
+    assert dp.estimate_join_rows(basics_df, steps[0]) == 9
+    assert dp.estimate_join_rows(basics_df, steps[1]) == 1
+    assert dp.plan_next_join(basics_df, steps, []).name == 'ratings'
+
+
+def test_lookup_join_matches_merge(akas_df, countries_df, population_df):
+    """Test that the join with the indexed table gives the same data as pd.merge."""
+    left_df = akas_df.merge(countries_df, left_on='region', right_on='alpha-2')
+    left_df['startYear'] = [2000, 2001, 2003]
+    keys = ['Country Code', 'Year']
+    indexed_df = build_key_index(population_df, keys)
+
+    joined_df = dp.lookup_join(left_df, indexed_df, ['alpha-3', 'startYear'], keys)
+
+    expected_df = left_df.merge(population_df, left_on=['alpha-3', 'startYear'],
+                                right_on=keys)
+    pd.testing.assert_frame_equal(joined_df, expected_df)
+
+
+def test_lookup_join_type_mismatch(basics_df, ratings_df):
+    """Test joining the key columns of the incompatible types."""
+    indexed_df = build_key_index(ratings_df, ['tconst'])
+    basics_df['tconst'] = range(len(basics_df))
+
+    with pytest.raises(ValueError):
+        dp.lookup_join(basics_df, indexed_df, ['tconst'], ['tconst'])
+
+
 # Test clean function
 @pytest.fixture
 def merged_df_fixture():
@@ -412,19 +576,11 @@ def merged_df_fixture():
         'startYear': [2000, 2001, 2002, 2003],
         'averageRating': [7.5, 8.0, 6.5, 9.0],
         'numVotes': [1500, 3000, 2500, 4000],
-        'directors': ['nm0000001', 'nm0000002', 'nm0000003', 'nm0000004'],
-        'nconst': ['nm0000001', 'nm0000002', 'nm0000003', 'nm0000004'],
-        'primaryName': ['Director1', 'Director2', 'Director3', 'Director4'],
-        'alpha-2': ['US', 'GB', 'FR', 'DE'],
-        'alpha-3': ['USA', 'GBR', 'FRA', 'DEU'],
         'region': ['US', 'GB', 'FR', 'DE'],
-        'Country Code_x': ['USA', 'GBR', 'FRA', 'DEU'],
-        'Country Code_y': ['USA', 'GBR', 'FRA', 'DEU'],
-        'name': ['United States', 'United Kingdom', 'France', 'Germany'],
-        'Year_x': [2000, 2001, 2002, 2003],
-        'Year_y': [2000, 2001, 2002, 2003],
-        'Population': [300000000, 60000000, 65000000, 80000000],
-        'GDP': [1000000000, 200000000, 300000000, 400000000]
+        'country_name': ['United States', 'United Kingdom', 'France', 'Germany'],
+        'population': [300000000, 60000000, 65000000, 80000000],
+        'gdp': [1000000000, 200000000, 300000000, 400000000],
+        'gdp_per_population': [10 / 3, 10 / 3, 300 / 65, 5.0],
     })
 
 
@@ -435,24 +591,22 @@ def test_clean_happy_path(merged_df_fixture):
     expected_df = pd.DataFrame({
         'title_id': ['tt0000001', 'tt0000002', 'tt0000004'],
         'title': ['Title1', 'Title2', 'Title4'],
+        'year': [2000, 2001, 2003],
         'average_rating': [7.5, 8.0, 9.0],
         'num_of_votes': [1500, 3000, 4000],
-        'director_id': ['nm0000001', 'nm0000002', 'nm0000004'],
-        'director_name': ['Director1', 'Director2', 'Director4'],
         'country_code': ['US', 'GB', 'DE'],
         'country_name': ['United States', 'United Kingdom', 'Germany'],
-        'year': [2000, 2001, 2003],
         'population': [300000000, 60000000, 80000000],
         'gdp': [1000000000, 200000000, 400000000],
         'gdp_per_population': [3.333333, 3.333333, 5.000000]
-    }).set_index('title_id')
+    }).astype({'country_code': 'category', 'country_name': 'category'}).set_index('title_id')
 
     pd.testing.assert_frame_equal(cleaned_df, expected_df)
 
 
 def test_clean_missing_column(merged_df_fixture):
     """Test cleaning the merged dataframe with a missing column."""
-    incomplete_df = merged_df_fixture.drop(columns=['Country Code_x'])
+    incomplete_df = merged_df_fixture.drop(columns=['tconst'])
 
     with pytest.raises(KeyError):
         dp.clean(incomplete_df)
@@ -465,24 +619,26 @@ def test_clean_with_duplicates(merged_df_fixture):
     expected_df = pd.DataFrame({
         'title_id': ['tt0000001', 'tt0000002', 'tt0000004'],
         'title': ['Title1', 'Title2', 'Title4'],
+        'year': [2000, 2001, 2003],
         'average_rating': [7.5, 8.0, 9.0],
         'num_of_votes': [1500, 3000, 4000],
-        'director_id': ['nm0000001', 'nm0000002', 'nm0000004'],
-        'director_name': ['Director1', 'Director2', 'Director4'],
         'country_code': ['US', 'GB', 'DE'],
         'country_name': ['United States', 'United Kingdom', 'Germany'],
-        'year': [2000, 2001, 2003],
         'population': [300000000, 60000000, 80000000],
         'gdp': [1000000000, 200000000, 400000000],
         'gdp_per_population': [3.333333, 3.333333, 5.000000]
-    }).set_index('title_id')
+    }).astype({'country_code': 'category', 'country_name': 'category'}).set_index('title_id')
 
     pd.testing.assert_frame_equal(dp.clean(duplicated_df), expected_df)
 
 
-def test_clean_type_mismatch(merged_df_fixture):
-    """Test cleaning the merged dataframe with type mismatch."""
-    merged_df_fixture['GDP'] = merged_df_fixture['GDP'].astype(str)
+def test_merge_data_gdp_type_mismatch(
+        basics_df, ratings_df, akas_df, crew_df, name_df,
+        countries_df, population_df, gdp_df,
+):
+    """Test merging the GDP data of a non-numeric type."""
+    gdp_df['GDP'] = gdp_df['GDP'].astype(str)
 
     with pytest.raises(TypeError):
-        dp.clean(merged_df_fixture)
+        dp.merge_data(basics_df, ratings_df, akas_df, crew_df, name_df,
+                      countries_df, population_df, gdp_df)
@@ -0,0 +1,287 @@
+"""End-to-end tests of the merging and the analysis tasks."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_analysis.analysis as a
+import data_analysis.data_processing as dp
+
+COUNTRIES = {'US': ('USA', 'United States'), 'GB': ('GBR', 'United Kingdom'),
+             'FR': ('FRA', 'France'), 'DE': ('DEU', 'Germany')}
+YEARS = range(2000, 2005)
+
+
+@pytest.fixture
+def imdb_data():
+    """Create random data with the ties of the ratings and the same-year films of directors."""
+    rng = np.random.default_rng(0)
+    titles = [f'tt{i:07d}' for i in range(400)]
+    basics_df = pd.DataFrame({
+        'tconst': titles,
+        'titleType': rng.choice(['movie', 'movie', 'movie', 'short'], len(titles)),
+        'primaryTitle': [f'Title {i}' for i in range(len(titles))],
+        'startYear': rng.choice(YEARS, len(titles)),
+    })
+    ratings_df = pd.DataFrame({
+        'tconst': titles,
+        'averageRating': rng.choice([6.0, 7.0, 8.0], len(titles)),
+        'numVotes': rng.choice([10, 20], len(titles)),
+    }).sample(frac=0.9, random_state=1)
+    akas_df = pd.DataFrame({
+        'titleId': np.repeat(titles, 3),
+        'region': rng.choice(list(COUNTRIES) + ['XX'], 3 * len(titles)),
+    }).sample(frac=0.8, random_state=2).drop_duplicates().reset_index(drop=True)
+    crew_df = pd.DataFrame({
+        'tconst': np.repeat(titles, 2),
+        'directors': rng.choice([f'nm{i:07d}' for i in range(30)], 2 * len(titles)),
+    }).sample(frac=0.7, random_state=3).drop_duplicates()
+    name_df = pd.DataFrame({
+        'nconst': [f'nm{i:07d}' for i in range(25)],
+        'primaryName': [f'Director {i % 20}' for i in range(25)],
+    })
+    countries_df = pd.DataFrame({
+        'alpha-2': list(COUNTRIES),
+        'alpha-3': [code for code, _ in COUNTRIES.values()],
+        'name': [name for _, name in COUNTRIES.values()],
+    })
+    world_bank_keys = pd.MultiIndex.from_product(
+        [[code for code, _ in COUNTRIES.values()], YEARS], names=['Country Code', 'Year'],
+    ).to_frame(index=False)
+    population_df = world_bank_keys.assign(
+        Population=rng.integers(1, 100, len(world_bank_keys)) * 1e6)
+    gdp_df = world_bank_keys.assign(GDP=rng.integers(1, 100, len(world_bank_keys)) * 1e9)
+    return (basics_df, ratings_df, akas_df, crew_df, name_df,
+            countries_df, population_df, gdp_df)
+
+
+def merge_in_reference_order(basics_df, ratings_df, akas_df, crew_df, name_df,
+                             countries_df, population_df, gdp_df):
+    """Merge the data with the chain of joins starting from the akas data
+    (with a row per director of the co-directed movies)."""
+    merged_df = akas_df.merge(basics_df, left_on='titleId', right_on='tconst')
+    merged_df = merged_df.merge(ratings_df, on='tconst')
+    merged_df = merged_df.merge(crew_df, on='tconst')
+    merged_df = merged_df.merge(name_df, left_on='directors', right_on='nconst')
+    return dp.add_country_data(merged_df, countries_df, population_df, gdp_df)
+
+
+@pytest.fixture
+def baseline_data():
+    """Create random data with one director per movie, unique director names, titles
+    of other types, regions without a country and countries without some World Bank data."""
+    rng = np.random.default_rng(1)
+    titles = [f'tt{i:07d}' for i in range(600)]
+    basics_df = pd.DataFrame({
+        'tconst': titles,
+        'titleType': rng.choice(['movie', 'movie', 'short', 'tvSeries'], len(titles)),
+        'primaryTitle': [f'Title {i}' for i in range(len(titles))],
+        'startYear': rng.choice(YEARS, len(titles)),
+    })
+    ratings_df = pd.DataFrame({
+        'tconst': titles,
+        'averageRating': rng.integers(10, 100, len(titles)) / 10,
+        'numVotes': rng.choice([10, 20, 30], len(titles)),
+    }).sample(frac=0.9, random_state=1)
+    akas_df = pd.DataFrame({
+        'titleId': np.repeat(titles, 3),
+        'region': rng.choice(list(COUNTRIES) + ['XX'], 3 * len(titles)),
+    }).sample(frac=0.8, random_state=2).reset_index(drop=True)
+    crew_df = pd.DataFrame({
+        'tconst': titles,
+        'directors': rng.choice([f'nm{i:07d}' for i in range(35)], len(titles)),
+    }).sample(frac=0.9, random_state=3)
+    name_df = pd.DataFrame({
+        'nconst': [f'nm{i:07d}' for i in range(30)],
+        'primaryName': [f'Director {i}' for i in range(30)],
+    })
+    countries_df = pd.DataFrame({
+        'alpha-2': list(COUNTRIES),
+        'alpha-3': [code for code, _ in COUNTRIES.values()],
+        'name': [name for _, name in COUNTRIES.values()],
+    })
+    world_bank_keys = pd.MultiIndex.from_product(
+        [[code for code, _ in COUNTRIES.values()], YEARS], names=['Country Code', 'Year'],
+    ).to_frame(index=False)
+    population_df = world_bank_keys.assign(
+        Population=rng.integers(1, 100, len(world_bank_keys)) * 1e6).drop(index=[3, 12])
+    gdp_df = world_bank_keys.assign(
+        GDP=rng.integers(1, 100, len(world_bank_keys)) * 1e9).drop(index=[7])
+    return (basics_df, ratings_df, akas_df, crew_df, name_df,
+            countries_df, population_df, gdp_df)
+
+
+def merge_in_baseline_order(basics_df, ratings_df, akas_df, crew_df, name_df,
+                            countries_df, population_df, gdp_df):
+    """Merge and clean the data with the chain of joins starting from the akas data
+    (with a row per director), like before the join planning."""
+    merged_df = akas_df.merge(basics_df, left_on='titleId', right_on='tconst')
+    merged_df = merged_df.merge(ratings_df, on='tconst')
+    merged_df = merged_df.merge(crew_df, on='tconst')
+    merged_df = merged_df.merge(name_df, left_on='directors', right_on='nconst')
+    merged_df = merged_df.merge(countries_df, left_on='region', right_on='alpha-2')
+    merged_df = merged_df.merge(population_df, left_on=['alpha-3', 'startYear'],
+                                right_on=['Country Code', 'Year'])
+    merged_df = merged_df.merge(gdp_df, left_on=['alpha-3', 'startYear'],
+                                right_on=['Country Code', 'Year'])
+    merged_df = merged_df[merged_df['titleType'] == 'movie'].rename(columns={
+        **dp.CLEAN_COLUMN_NAMES, 'name': 'country_name', 'Population': 'population',
+        'GDP': 'gdp', 'directors': 'director_id', 'primaryName': 'director_name',
+    })
+    merged_df = merged_df.drop_duplicates(
+        subset=['country_code', 'title_id', 'year', 'average_rating', 'num_of_votes',
+                'director_id', 'director_name', 'population', 'gdp'],
+    )
+    merged_df['gdp_per_population'] = merged_df['gdp'] / merged_df['population']
+    return merged_df.set_index('title_id')
+
+
+def save_baseline_results(merged_df, ns, path):
+    """Save the results of all the tasks computed like before the single-pass tasks."""
+    os.makedirs(path)
+    years = f"{merged_df['year'].min()}_{merged_df['year'].max()}"
+    save_baseline_task_1(merged_df, ns, path, years)
+    save_baseline_task_2(merged_df, path, years)
+    save_baseline_task_3(merged_df, ns, path, years)
+
+
+def save_baseline_task_1(merged_df, ns, path, years):
+    """Save the results of the task 1 computed for every n separately."""
+    for n in ns:
+        counts = merged_df['country_code'].value_counts()
+        top_df = merged_df[merged_df['country_code'].isin(counts[counts >= n].index)].sort_values(
+            by=['country_name', 'country_code', 'average_rating', 'num_of_votes'],
+            ascending=[True, True, False, False],
+        ).groupby('country_code').head(n)
+        top_df = top_df.groupby(['country_name', 'country_code']).agg(
+            {'average_rating': 'mean', 'num_of_votes': 'sum', 'title': 'count'}).reset_index()
+        top_df.columns = ['country_name', 'country_code', 'avg_rating', 'total_votes',
+                          'film_count']
+        top_df.sort_values(by='avg_rating', ascending=False).to_csv(
+            path / f'1_top_{n}_ratings_{years}.csv', index=False)
+
+
+def save_baseline_task_2(merged_df, path, years):
+    """Save the results of the task 2 with the indicators of the first row of every country."""
+    rank_df = merged_df.groupby(['country_name', 'country_code']).agg(
+        weak_impact=('num_of_votes', 'sum'), strong_impact=('average_rating', 'mean'),
+    ).reset_index().merge(
+        merged_df[['country_code', 'population', 'gdp', 'gdp_per_population']].
+        drop_duplicates('country_code'), on='country_code', how='left')
+    for column in ['weak_impact', 'strong_impact', 'gdp', 'population', 'gdp_per_population']:
+        rank_df[f'{column}_rank'] = rank_df[column].rank(ascending=False).astype(int)
+    for indicator, file_name in [('population', 'pop'), ('gdp', 'gdp'),
+                                 ('gdp_per_population', 'gdp_per_pop')]:
+        hegemony_df = rank_df[['country_name', f'{indicator}_rank', 'weak_impact_rank',
+                               'strong_impact_rank']].copy()
+        hegemony_df['weak'] = hegemony_df[f'{indicator}_rank'] - hegemony_df['weak_impact_rank']
+        hegemony_df['strong'] = (hegemony_df[f'{indicator}_rank']
+                                 - hegemony_df['strong_impact_rank'])
+        hegemony_df.columns = [
+            'Country Name', f'Country {"".join(x.capitalize() for x in indicator.split("_"))} Rank',
+            'Weak Impact Rank', 'Strong Impact Rank',
+            'Weak Hegemony Indicator', 'Strong Hegemony Indicator']
+        hegemony_df.to_csv(path / f'2_hegemony_{file_name}_result_{years}.csv', index=False)
+
+
+def save_baseline_task_3(merged_df, ns, path, years):
+    """Save the results of the task 3 with the directors grouped by their names."""
+    film_counts = merged_df['director_id'].value_counts()
+    for n in ns:
+        director_films = merged_df[merged_df['director_id'].isin(
+            film_counts[film_counts >= n].index)].sort_values(by=['director_id', 'year'])
+        if director_films.empty:
+            continue
+        first_df, last_df = (
+            films_df.groupby('director_name').agg(
+                {'average_rating': 'mean', 'num_of_votes': 'sum'}).reset_index()
+            for films_df in (director_films.groupby('director_id').head(n / 2),
+                             director_films.groupby('director_id').tail(n / 2)))
+        first_df.columns = ['directors', 'first_avg_rating', 'first_num_of_votes']
+        last_df.columns = ['directors', 'last_avg_rating', 'last_num_of_votes']
+        progression = first_df.merge(last_df, on='directors')
+        for column, diff_column, label, diff_label in [
+                ('avg_rating', 'rating_diff', 'Average Rating', 'Rating'),
+                ('num_of_votes', 'votes_diff', 'Number of Votes', 'Number of Votes')]:
+            progression[diff_column] = (progression[f'last_{column}']
+                                        - progression[f'first_{column}'])
+            result_df = progression[['directors', f'first_{column}', f'last_{column}',
+                                     diff_column]].sort_values(by=diff_column, ascending=False)
+            result_df.columns = ['Director', f'First {label}', f'Last {label}',
+                                 f'Career Progression {diff_label}']
+            result_df.to_csv(path / f'3_{diff_column}_{n}_{years}.csv', index=False)
+
+
+def save_results(merged_df, directors_df, ns, path, monkeypatch):
+    """Save the results of all the tasks."""
+    os.makedirs(path)
+    monkeypatch.setattr(a, 'PATH_TO_SAVE_RESULTS', str(path))
+    a.perform_task_1(merged_df, ns)
+    a.perform_task_2(merged_df)
+    a.perform_task_3(merged_df, directors_df, ns)
+
+
+def test_merged_data_in_baseline_order(baseline_data):
+    """Test that the planned joins give the rows of the chain of joins in the same order."""
+    merged_df = dp.clean(dp.merge_data(*baseline_data))
+    baseline_df = merge_in_baseline_order(*baseline_data)
+    columns = ['country_code', 'year', 'title', 'average_rating', 'num_of_votes',
+               'country_name', 'population', 'gdp', 'gdp_per_population']
+
+    assert len(merged_df) > 200
+    pd.testing.assert_frame_equal(merged_df[columns], baseline_df[columns],
+                                  check_dtype=False, check_categorical=False)
+
+
+def test_joined_rows_of_years_match_merged_data(baseline_data):
+    """Test that finishing the joined rows of all the years read by year gives
+    the merged data of the years."""
+    basics_df, *other_data = baseline_data
+    joined_df = dp.join_data(basics_df, *other_data)
+    years_df = joined_df[joined_df['startYear'].between(2001, 2003)].sort_values(
+        'startYear', kind='stable')
+
+    merged_df = dp.finish_merge(years_df)
+
+    expected_df = dp.clean(dp.merge_data(
+        basics_df[basics_df['startYear'].between(2001, 2003)], *other_data))
+    assert len(merged_df) > 100
+    pd.testing.assert_frame_equal(merged_df, expected_df)
+
+
+@pytest.mark.parametrize('reverse', [False, True])
+def test_results_match_baseline(baseline_data, reverse, tmp_path, monkeypatch):
+    """Test that the result files are the ones of the tasks on the data of the chain of joins."""
+    if reverse:
+        baseline_data = tuple(df.iloc[::-1] for df in baseline_data)
+    merged_df = dp.clean(dp.merge_data(*baseline_data))
+    directors_df = dp.process_directors(baseline_data[3], baseline_data[4], merged_df.index)
+    ns = [2, 4, 8]
+
+    save_results(merged_df, directors_df, ns, tmp_path / 'planned', monkeypatch)
+    save_baseline_results(merge_in_baseline_order(*baseline_data), ns, tmp_path / 'baseline')
+
+    file_names = sorted(os.listdir(tmp_path / 'baseline'))
+    assert sorted(os.listdir(tmp_path / 'planned')) == file_names
+    assert sum(name.startswith('3_') for name in file_names) == 2 * len(ns)
+    for file_name in file_names:
+        assert ((tmp_path / 'planned' / file_name).read_text(encoding='utf-8')
+                == (tmp_path / 'baseline' / file_name).read_text(encoding='utf-8')), file_name
+
+
+def test_director_films_match_director_join(imdb_data):
+    """Test that joining the bridge table in the task 3 gives the rows of the join
+    of the merged data with the directors."""
+    merged_df = dp.clean(dp.merge_data(*imdb_data))
+    directors_df = dp.process_directors(imdb_data[3], imdb_data[4], merged_df.index)
+    reference_df = merge_in_reference_order(*imdb_data)
+    reference_df = reference_df[reference_df['primaryName'].notna()
+                                & (reference_df['titleType'] == 'movie')]
+
+    director_films = a.get_director_films(merged_df, directors_df)
+
+    assert sorted(zip(director_films.index, director_films['country_code'],
+                      director_films['director_id'])) == sorted(set(zip(
+                          reference_df['titleId'], reference_df['region'],
+                          reference_df['directors'])))
@@ -0,0 +1,43 @@
+"""Tests for the data_analysis.incremental file."""
+import pandas as pd
+
+from data_analysis.incremental import compute_update, diff_rows
+
+
+def test_diff_rows():
+    """Test finding the added, removed and changed titles."""
+    old_df = pd.DataFrame({'tconst': [1, 2, 3], 'averageRating': [7.0, 8.0, 6.0]})
+    new_df = pd.DataFrame({'tconst': [4, 3, 1], 'averageRating': [5.0, 6.5, 7.0]})
+
+    added_or_removed, changed = diff_rows(old_df, new_df)
+
+    assert added_or_removed.tolist() == [2, 4]
+    assert changed.tolist() == [3]
+
+
+def test_compute_update():
+    """Test that only the added and modified titles are joined again."""
+    old_basics = pd.DataFrame({'tconst': [1, 2, 3], 'primaryTitle': ['A', 'B', 'C']})
+    new_basics = pd.DataFrame({'tconst': [1, 2, 3, 4], 'primaryTitle': ['A', 'B2', 'C', 'D']})
+    old_ratings = pd.DataFrame({'tconst': [1, 2, 3], 'averageRating': [7.0, 8.0, 6.0],
+                                'numVotes': [10, 20, 30]})
+    new_ratings = pd.DataFrame({'tconst': [1, 2, 4], 'averageRating': [7.5, 8.0, 9.0],
+                                'numVotes': [15, 20, 40]})
+    merged = []
+
+    def merge(basics_df):
+        merged.append(basics_df['tconst'].tolist())
+        return {'movies': pd.DataFrame({'titleId': [4], 'startYear': [2000]})}
+
+    update = compute_update(
+        {'basics': old_basics, 'ratings': old_ratings},
+        {'basics': new_basics, 'ratings': new_ratings}, merge,
+    )
+
+    assert merged == [[2, 3, 4]]
+    assert update.deleted.tolist() == [2, 3, 4]
+    assert update.updated.index.tolist() == [1]
+    assert update.updated.index.name == 'titleId'
+    assert update.updated.columns.tolist() == ['averageRating', 'numVotes']
+    assert update.updated['averageRating'].tolist() == [7.5]
+    assert update.inserted['movies']['titleId'].tolist() == [4]
@@ -0,0 +1,59 @@
+"""Tests for the data_analysis.keys file."""
+import pandas as pd
+
+from data_analysis.keys import (
+    build_key_index, encode_id_columns, encode_ids, explode_id_lists,
+    has_key_index,
+)
+
+
+def test_encode_ids():
+    """Test encoding the identifiers as integers."""
+    ids = pd.Series(['tt0111161', 'tt10872600', 'tt0000001'])
+    expected = pd.Series([111161, 10872600, 1], dtype='Int32')
+    pd.testing.assert_series_equal(encode_ids(ids, 'tt'), expected)
+
+
+def test_encode_ids_invalid_values():
+    """Test encoding missing values, lists of identifiers and other prefixes."""
+    ids = pd.Series(['nm0000001', 'nm0000002,nm0000003', None, 'tt0000004'])
+    expected = pd.Series([1, None, None, None], dtype='Int32')
+    pd.testing.assert_series_equal(encode_ids(ids, 'nm'), expected)
+
+
+def test_explode_id_lists():
+    """Test splitting the lists of identifiers into one row per identifier."""
+    df = pd.DataFrame({'tconst': ['tt0000001', 'tt0000002', 'tt0000003'],
+                       'directors': ['nm0000001,nm0000002', 'nm0000003', None]})
+    result = encode_id_columns(explode_id_lists(df, {'directors': ','}),
+                               {'tconst': 'tt', 'directors': 'nm'})
+    expected = pd.DataFrame({'tconst': pd.array([1, 1, 2, 3], dtype='Int32'),
+                             'directors': pd.array([1, 2, 3, None], dtype='Int32')})
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_encode_id_columns():
+    """Test encoding only the identifier columns present in the dataframe."""
+    df = pd.DataFrame({'tconst': ['tt0000001', 'tt0000002'], 'title': ['Title1', 'Title2']})
+    result = encode_id_columns(df, {'tconst': 'tt', 'nconst': 'nm'})
+    expected = pd.DataFrame({'tconst': pd.array([1, 2], dtype='Int32'),
+                             'title': ['Title1', 'Title2']})
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_build_key_index():
+    """Test indexing the data by the sorted key columns keeping the columns."""
+    df = pd.DataFrame({'Country Code': ['USA', 'FRA', 'USA'], 'Year': [2001, 2000, 2000],
+                       'GDP': [3, 1, 2]})
+    result = build_key_index(df, ['Country Code', 'Year'])
+    assert result['GDP'].tolist() == [1, 2, 3]
+    assert list(result.columns) == ['Country Code', 'Year', 'GDP']
+    assert has_key_index(result, ['Country Code', 'Year'])
+    assert not has_key_index(result, ['Country Code'])
+
+
+def test_has_key_index_not_unique():
+    """Test that the index with duplicated keys is not used for the lookups."""
+    df = build_key_index(pd.DataFrame({'tconst': [1, 1, 2]}), ['tconst'])
+    assert not has_key_index(df, ['tconst'])
+    assert not has_key_index(pd.DataFrame({'tconst': [1, 2]}), ['tconst'])
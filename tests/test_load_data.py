@@ -1,8 +1,14 @@
 """Tests for data_analysis.load_data file."""
+import argparse
+import gzip
+
 import pandas as pd
 import pytest
 
-from data_analysis.load_data import load_data
+import data_analysis.data_processing as dp
+import data_analysis.load_data as ld
+from data_analysis.data_processing import process_data_and_merge
+from data_analysis.load_data import DATASETS, load_all_data, load_data, stream_data
 
 
 # Test load_data function
@@ -20,6 +26,35 @@ def test_load_data_tsv():
     pd.testing.assert_frame_equal(df, expected_df)
 
 
+@pytest.mark.parametrize("filters", [None, [("col1", "notna", None)]])
+def test_load_data_memory_map(filters):
+    """Test loading a memory-mapped TSV file."""
+    df = load_data("./tests/mocks/test.tsv", filters=filters, memory_map=True)
+    expected_df = pd.DataFrame({"col1": [1, 3], "col2": [2, 4]})
+    pd.testing.assert_frame_equal(df, expected_df)
+
+
+def test_load_data_tsv_gz(tmp_path):
+    """Test loading a gzip-compressed TSV file."""
+    path = tmp_path / "test.tsv.gz"
+    with open("./tests/mocks/test.tsv", "rb") as f:
+        path.write_bytes(gzip.compress(f.read()))
+    df = load_data(str(path))
+    expected_df = pd.DataFrame({"col1": [1, 3], "col2": [2, 4]})
+    pd.testing.assert_frame_equal(df, expected_df)
+
+
+def test_load_data_tsv_zst(tmp_path):
+    """Test loading a zstd-compressed TSV file."""
+    zstandard = pytest.importorskip("zstandard")
+    path = tmp_path / "test.tsv.zst"
+    with open("./tests/mocks/test.tsv", "rb") as f:
+        path.write_bytes(zstandard.ZstdCompressor().compress(f.read()))
+    df = load_data(str(path), filters=[("col1", "==", 3)])
+    expected_df = pd.DataFrame({"col1": [3], "col2": [4]})
+    pd.testing.assert_frame_equal(df, expected_df)
+
+
 def test_load_data_invalid_format():
     """Test loading a file with an invalid format."""
     with pytest.raises(
@@ -32,3 +67,174 @@ def test_load_data_empty_file():
     """Test loading an empty file."""
     with pytest.raises(ValueError, match="The file is empty."):
         load_data("./tests/mocks/empty.csv")
+
+
+def test_load_data_schema():
+    """Test loading only the selected columns with the given types."""
+    df = load_data("./tests/mocks/test.tsv", usecols=["col2"], dtype={"col2": "Int16"})
+    expected_df = pd.DataFrame({"col2": pd.array([2, 4], dtype="Int16")})
+    pd.testing.assert_frame_equal(df, expected_df)
+
+
+def test_load_data_index():
+    """Test building the sorted index on the key columns."""
+    df = load_data("./tests/mocks/test.tsv", index=["col2"])
+    assert df.index.tolist() == [2, 4]
+    assert df.index.names == ["col2_key"]
+    assert df["col2"].tolist() == [2, 4]
+
+
+@pytest.mark.parametrize("chunksize", [1, 100])
+def test_load_data_filters(chunksize):
+    """Test keeping only the rows matching the filters while reading."""
+    df = load_data("./tests/mocks/test.csv", filters=[("col1", "between", (2, 5))],
+                   chunksize=chunksize)
+    expected_df = pd.DataFrame({"col1": [3], "col2": [4]})
+    pd.testing.assert_frame_equal(df, expected_df)
+
+
+def test_load_data_filters_keep_categories():
+    """Test that the categorical columns stay categorical across the chunks."""
+    df = load_data("./tests/mocks/test.csv", dtype={"col2": "category"},
+                   filters=[("col1", "notna", None)], chunksize=1)
+    assert isinstance(df["col2"].dtype, pd.CategoricalDtype)
+    assert df["col2"].tolist() == ["2", "4"]
+
+
+def test_load_data_filters_invalid_operator():
+    """Test loading the data with an unknown filter operator."""
+    with pytest.raises(ValueError, match="Invalid filter operator"):
+        load_data("./tests/mocks/test.csv", filters=[("col1", "<", 2)])
+
+
+# Test stream_data function
+@pytest.fixture
+def akas_file(tmp_path):
+    """Create a small akas file with repeated regions."""
+    path = tmp_path / "akas.tsv"
+    path.write_text(
+        "titleId\tordering\tregion\n"
+        "tt1\t1\tUS\ntt1\t2\tUS\ntt1\t3\tFR\ntt2\t1\t\\N\ntt3\t1\tDE\n",
+        encoding="utf-8")
+    return str(path)
+
+
+def test_stream_data(akas_file):
+    """Test reducing the streamed chunks to distinct matching rows."""
+    df = stream_data(akas_file, [("region", "notna", None), ("titleId", "in", ["tt1", "tt2"])],
+                     chunksize=2, usecols=["titleId", "region"], dtype={"region": "category"})
+    assert df.values.tolist() == [["tt1", "US"], ["tt1", "FR"]]
+    assert isinstance(df["region"].dtype, pd.CategoricalDtype)
+
+
+def test_stream_data_encoded_ids(akas_file):
+    """Test filtering the streamed chunks on the encoded identifiers."""
+    df = stream_data(akas_file, [("titleId", "in", [1])], chunksize=2,
+                     usecols=["titleId", "region"], ids={"titleId": "tt"})
+    expected_df = pd.DataFrame({"titleId": pd.array([1, 1], dtype="Int32"),
+                                "region": ["US", "FR"]})
+    pd.testing.assert_frame_equal(df, expected_df)
+
+
+def test_stream_data_memory_limit(akas_file):
+    """Test stopping the streaming when the result exceeds the memory limit."""
+    with pytest.raises(MemoryError, match="exceeds the memory limit"):
+        stream_data(akas_file, [("region", "notna", None)], chunksize=2,
+                    memory_limit_mb=1e-6, usecols=["titleId", "region"])
+
+
+# Test load_all_data function
+@pytest.mark.parametrize("workers", [1, 2])
+def test_load_all_data_collects_errors(workers, tmp_path):
+    """Test that loading errors are collected instead of raised, also in parallel mode."""
+    args = argparse.Namespace(start=None, end=None, cache='bypass', cache_dir=str(tmp_path),
+                              workers=workers, chunk_size=10, stream_akas=True,
+                              max_memory_mb=None, mmap=True)
+    for _, arg_name in DATASETS:
+        setattr(args, arg_name, str(tmp_path / "missing.tsv"))
+
+    assert not load_all_data(args)
+
+
+@pytest.fixture
+def imdb_args(tmp_path):
+    """Create small data files with rows which the filters remove and the arguments to load them."""
+    files = {
+        "basics.tsv": "tconst\ttitleType\tprimaryTitle\tstartYear\n"
+                      "tt0000001\tmovie\tA\t2000\ntt0000002\ttvSeries\tB\t2000\n"
+                      "tt0000003\tmovie\tC\t2001\ntt0000004\tmovie\tD\t1990\n"
+                      "tt0000005\tshort\tE\t2001\ntt0000006\tmovie\tF\t2001\n",
+        "ratings.tsv": "tconst\taverageRating\tnumVotes\n"
+                       "tt0000001\t7.5\t100\ntt0000002\t8.0\t200\ntt0000003\t6.5\t300\n"
+                       "tt0000004\t9.0\t400\ntt0000005\t5.0\t500\ntt0000006\t7.5\t600\n",
+        "akas.tsv": "titleId\tregion\n"
+                    "tt0000002\tUS\ntt0000006\tFR\ntt0000001\t\\N\ntt0000003\tUS\n"
+                    "tt0000001\tFR\ntt0000005\tFR\ntt0000004\tUS\ntt0000001\tUS\n"
+                    "tt0000006\tUS\ntt0000003\tFR\ntt0000001\tFR\n",
+        "crew.tsv": "tconst\tdirectors\n"
+                    "tt0000001\tnm0000001,nm0000002\ntt0000002\tnm0000002\n"
+                    "tt0000003\tnm0000002\ntt0000004\tnm0000001\n"
+                    "tt0000005\tnm0000003\ntt0000006\tnm0000003,nm0000001\n",
+        "name.tsv": "nconst\tprimaryName\n"
+                    "nm0000001\tD1\nnm0000002\tD2\nnm0000003\tD3\n",
+        "countries.csv": "name,alpha-2,alpha-3\nUnited States,US,USA\nFrance,FR,FRA\n",
+        "population.csv": "Country Name,Country Code,Series Name,Series Code,"
+                          "1990 [YR1990],2000 [YR2000],2001 [YR2001]\n"
+                          "x,USA,s,SP.POP.TOTL,250,280,290\nx,FRA,s,SP.POP.TOTL,55,60,61\n",
+        "gdp.csv": "Country Name,Country Code,Series Name,Series Code,"
+                   "1990 [YR1990],2000 [YR2000],2001 [YR2001]\n"
+                   "x,USA,s,NY.GDP.MKTP.CD,5000,9000,9500\nx,FRA,s,NY.GDP.MKTP.CD,1000,1300,1400\n",
+    }
+    for file_name, content in files.items():
+        (tmp_path / file_name).write_text(content, encoding="utf-8")
+
+    args = argparse.Namespace(start=2000, end=2001, cache='bypass', cache_dir=str(tmp_path),
+                              workers=1, chunk_size=2, stream_akas=False,
+                              max_memory_mb=None, mmap=False, indicators_data=None)
+    for (_, arg_name), file_name in zip(DATASETS, files):
+        setattr(args, arg_name, str(tmp_path / file_name))
+    return args
+
+
+@pytest.mark.parametrize("stream_akas", [False, True])
+def test_load_all_data_filters_keep_merged_data(imdb_args, stream_akas, monkeypatch):
+    """Test that the merged data is the same whether the filters are applied while reading
+    or after the merge."""
+    imdb_args.stream_akas = stream_akas
+
+    def merge() -> pd.DataFrame:
+        dataframes = load_all_data(imdb_args)
+        return process_data_and_merge(
+            *(dataframes[data_name] for data_name, _ in DATASETS[:8]),
+            imdb_args.start, imdb_args.end,
+        )
+
+    merged_df = merge()
+    monkeypatch.setattr(ld, "get_filters", lambda start, end: {"akas": []})
+    unfiltered_df = merge()
+
+    assert set(merged_df.index) == {1, 3, 6}
+    pd.testing.assert_frame_equal(merged_df, unfiltered_df)
+
+
+@pytest.mark.parametrize("stream_akas", [False, True])
+def test_load_all_data_filters_keep_merged_rows(imdb_args, stream_akas, monkeypatch):
+    """Test that the merged rows of all the title types are the same rows in the same order
+    whether the filters are applied while reading or after the merge."""
+    imdb_args.stream_akas = stream_akas
+    monkeypatch.setattr(dp, "clean", lambda merged_df: merged_df)
+
+    def merge() -> pd.DataFrame:
+        dataframes = load_all_data(imdb_args)
+        return process_data_and_merge(
+            *(dataframes[data_name] for data_name, _ in DATASETS[:8]),
+            imdb_args.start, imdb_args.end,
+        )
+
+    merged_df = merge()
+    monkeypatch.setattr(ld, "get_filters", lambda start, end: {"akas": []})
+    unfiltered_df = merge()
+
+    assert set(merged_df["titleType"]) == {"movie", "tvSeries", "short"}
+    # The categories of the title types are in the order in which the chunks were read
+    pd.testing.assert_frame_equal(merged_df, unfiltered_df, check_categorical=False)
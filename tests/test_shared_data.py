@@ -0,0 +1,77 @@
+"""Tests for the data_analysis.shared_data file."""
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_analysis.shared_data import call_with_shared_frame, call_with_shared_frames, share_frame
+
+
+@pytest.fixture
+def merged_data():
+    """Create a DataFrame with the column types of the merged data."""
+    return pd.DataFrame({
+        'country_code': pd.Categorical(['US', 'FR', None, 'US']),
+        'title': ['Movie1', 'Movie2', None, 'Movie4'],
+        'year': pd.array([2000, None, 2001, 2002], dtype='Int16'),
+        'average_rating': np.array([7.5, 8.0, np.nan, 6.5], dtype='float32'),
+        'gdp': [1.5, 2.5, 3.5, 4.5],
+        'other': [1, 'a', None, 2.5],
+    }, index=pd.Index(pd.array([1, 2, 3, 4], dtype='Int32'), name='title_id'))
+
+
+def test_call_with_shared_frame(merged_data):
+    """Test reconstructing the shared data without copying the columns."""
+    def check(shared_df):
+        pd.testing.assert_frame_equal(shared_df.astype({'title': object}), merged_data)
+        assert str(shared_df['title'].dtype) == 'large_string[pyarrow]'
+        assert not shared_df['gdp'].to_numpy().flags.owndata
+        assert not shared_df['country_code'].cat.codes.to_numpy().flags.owndata
+        assert not shared_df['gdp'].to_numpy().flags.writeable
+        with pytest.raises(ValueError, match="read-only"):
+            shared_df['gdp'].to_numpy()[0] = 0
+        return len(shared_df)
+
+    with share_frame(merged_data) as shared:
+        assert call_with_shared_frame(shared, check) == 4
+
+
+def test_call_with_shared_frames(merged_data):
+    """Test passing the shared data of many blocks in their order."""
+    other_df = pd.DataFrame({'director_id': [10, 11]})
+
+    with share_frame(merged_data) as shared, share_frame(other_df) as other_shared:
+        shapes = call_with_shared_frames(
+            [shared, other_shared], lambda first_df, second_df: (first_df.shape, second_df.shape))
+
+    assert shapes == ((4, 6), (2, 1))
+
+
+def test_share_frame_removes_memory(merged_data):
+    """Test that the shared memory is removed when the context exits, also on an error."""
+    with pytest.raises(RuntimeError):
+        with share_frame(merged_data) as shared:
+            raise RuntimeError('Failed')
+
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=shared.memory_name)
+
+
+def test_share_frame_empty(merged_data):
+    """Test sharing the data without rows."""
+    with share_frame(merged_data.iloc[:0]) as shared:
+        assert call_with_shared_frame(shared, lambda shared_df: shared_df.shape) == (0, 6)
+
+
+def test_call_with_shared_frame_releases_memory(merged_data, caplog):
+    """Test that the block still referenced after the call is closed by the next call."""
+    kept = []
+    with share_frame(merged_data) as shared:
+        call_with_shared_frame(shared, kept.append)
+        assert "still in use" in caplog.text
+
+        kept.clear()
+        caplog.clear()
+        call_with_shared_frame(shared, len)
+        assert "still in use" not in caplog.text
@@ -0,0 +1,232 @@
+"""Tests for the data_analysis.snapshot file."""
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from data_analysis.snapshot import MANIFEST_FILE, SnapshotUpdate, load_snapshot, partition_file
+
+
+@pytest.fixture
+def source_file(tmp_path):
+    """Create a small CSV source file with the movies of three years."""
+    path = tmp_path / 'source.csv'
+    path.write_text('titleId,startYear,country_code,average_rating\n'
+                    '1,2000,US,7.5\n2,2001,FR,8.0\n3,2002,US,6.5\n4,2001,US,9.0\n',
+                    encoding='utf-8')
+    return str(path)
+
+
+def counting_builder(file_path, calls):
+    """Return a builder that records how many times the data was joined."""
+    def builder():
+        calls.append(file_path)
+        return {'movies': pd.read_csv(file_path).astype({'country_code': 'category'})}
+    return builder
+
+
+def test_load_snapshot_hit(source_file, tmp_path):
+    """Test that the second load reads the snapshot without joining the data."""
+    calls = []
+    snapshot_dir = str(tmp_path / 'snapshot')
+    first = load_snapshot(counting_builder(source_file, calls), {'movies': source_file},
+                          snapshot_dir=snapshot_dir)['movies']
+    second = load_snapshot(counting_builder(source_file, calls), {'movies': source_file},
+                           snapshot_dir=snapshot_dir)['movies']
+
+    assert len(calls) == 1
+    assert first['titleId'].tolist() == [1, 2, 4, 3]
+    assert first['country_code'].tolist() == ['US', 'FR', 'US', 'US']
+    assert isinstance(first['country_code'].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_load_snapshot_year_range(source_file, tmp_path):
+    """Test that only the partitions of the years in the range are read."""
+    calls = []
+    snapshot_dir = str(tmp_path / 'snapshot')
+    load_snapshot(counting_builder(source_file, calls), {'movies': source_file},
+                  snapshot_dir=snapshot_dir)
+    os.remove(os.path.join(snapshot_dir, partition_file('movies', '2000')))
+
+    result = load_snapshot(counting_builder(source_file, calls), {'movies': source_file},
+                           2001, 2002, snapshot_dir=snapshot_dir)['movies']
+
+    assert len(calls) == 1
+    assert result['startYear'].tolist() == [2001, 2001, 2002]
+
+
+def test_load_snapshot_refresh(source_file, tmp_path):
+    """Test that the refresh rewrites only the partitions whose data changed."""
+    calls = []
+    snapshot_dir = str(tmp_path / 'snapshot')
+    load_snapshot(counting_builder(source_file, calls), {'movies': source_file},
+                  snapshot_dir=snapshot_dir)
+    with open(source_file, 'a', encoding='utf-8') as f:
+        f.write('5,2002,FR,5.0\n')
+    unchanged_path = os.path.join(snapshot_dir, partition_file('movies', '2000'))
+    os.utime(unchanged_path, ns=(0, 0))
+
+    with pytest.raises(RuntimeError, match="stale"):
+        load_snapshot(counting_builder(source_file, calls), {'movies': source_file},
+                      snapshot_dir=snapshot_dir)
+    assert len(calls) == 1
+
+    refreshed = load_snapshot(counting_builder(source_file, calls), {'movies': source_file},
+                              snapshot_dir=snapshot_dir, mode='refresh')['movies']
+    assert len(calls) == 2
+    assert len(refreshed) == 5
+    assert os.stat(unchanged_path).st_mtime_ns == 0
+
+
+def test_load_snapshot_incremental(source_file, tmp_path):
+    """Test applying the changes computed by the updater instead of merging the data."""
+    calls = []
+    snapshot_dir = str(tmp_path / 'snapshot')
+    load_snapshot(counting_builder(source_file, calls), {'movies': source_file},
+                  snapshot_dir=snapshot_dir)
+    with open(source_file, 'a', encoding='utf-8') as f:
+        f.write('5,2003,PL,5.0\n')
+    unchanged_path = os.path.join(snapshot_dir, partition_file('movies', '2002'))
+    os.utime(unchanged_path, ns=(0, 0))
+
+    def updater(changed, sources):
+        assert changed == ['movies']
+        assert source_file in sources
+        return SnapshotUpdate(
+            deleted=pd.Index([1]),
+            updated=pd.DataFrame({'average_rating': [9.5]}, index=pd.Index([4], name='titleId')),
+            inserted={'movies': pd.DataFrame({
+                'titleId': [5], 'startYear': [2003], 'country_code': ['PL'],
+                'average_rating': [5.0],
+            }).astype({'country_code': 'category'})},
+        )
+
+    result = load_snapshot(counting_builder(source_file, calls), {'movies': source_file},
+                           snapshot_dir=snapshot_dir, mode='incremental',
+                           updater=updater)['movies']
+
+    assert len(calls) == 1
+    assert result['titleId'].tolist() == [2, 4, 3, 5]
+    assert result['average_rating'].tolist() == [8.0, 9.5, 6.5, 5.0]
+    assert sorted(result['country_code'].cat.categories) == ['FR', 'PL', 'US']
+    assert not os.path.exists(os.path.join(snapshot_dir, partition_file('movies', '2000')))
+    assert os.stat(unchanged_path).st_mtime_ns == 0
+
+
+def test_load_snapshot_incremental_fallback(source_file, tmp_path):
+    """Test that the data is joined again if the updater cannot compute the changes."""
+    calls = []
+    snapshot_dir = str(tmp_path / 'snapshot')
+    load_snapshot(counting_builder(source_file, calls), {'movies': source_file},
+                  snapshot_dir=snapshot_dir)
+    with open(source_file, 'a', encoding='utf-8') as f:
+        f.write('5,2003,PL,5.0\n')
+
+    result = load_snapshot(counting_builder(source_file, calls), {'movies': source_file},
+                           snapshot_dir=snapshot_dir, mode='incremental',
+                           updater=lambda changed, sources: None)['movies']
+
+    assert len(calls) == 2
+    assert len(result) == 5
+
+
+def test_load_snapshot_touched_source(source_file, tmp_path):
+    """Test that the new modification time of an unchanged source file is saved on a hit."""
+    calls = []
+    snapshot_dir = str(tmp_path / 'snapshot')
+    load_snapshot(counting_builder(source_file, calls), {'movies': source_file},
+                  snapshot_dir=snapshot_dir)
+    os.utime(source_file, ns=(0, 0))
+
+    result = load_snapshot(counting_builder(source_file, calls), {'movies': source_file},
+                           snapshot_dir=snapshot_dir)['movies']
+
+    assert len(calls) == 1
+    assert len(result) == 4
+    with open(os.path.join(snapshot_dir, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        assert json.load(f)['sources'][source_file]['mtime_ns'] == 0
+
+
+def test_load_snapshot_other_format(source_file, tmp_path):
+    """Test that the snapshot of another format is rebuilt."""
+    calls = []
+    snapshot_dir = str(tmp_path / 'snapshot')
+    load_snapshot(counting_builder(source_file, calls), {'movies': source_file},
+                  snapshot_dir=snapshot_dir)
+    manifest_path = os.path.join(snapshot_dir, MANIFEST_FILE)
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    del manifest['format']
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    result = load_snapshot(counting_builder(source_file, calls), {'movies': source_file},
+                           snapshot_dir=snapshot_dir)['movies']
+
+    assert len(calls) == 2
+    assert len(result) == 4
+
+
+def test_load_snapshot_other_files(source_file, tmp_path):
+    """Test that the snapshot built from other files is rebuilt."""
+    calls = []
+    snapshot_dir = str(tmp_path / 'snapshot')
+    other_file = str(tmp_path / 'other.csv')
+    with open(other_file, 'w', encoding='utf-8') as f:
+        f.write('titleId,startYear,country_code,average_rating\n9,1999,PL,7.0\n')
+
+    load_snapshot(counting_builder(source_file, calls), {'movies': source_file},
+                  snapshot_dir=snapshot_dir)
+    result = load_snapshot(counting_builder(other_file, calls), {'movies': other_file},
+                           snapshot_dir=snapshot_dir)['movies']
+
+    assert len(calls) == 2
+    assert result['titleId'].tolist() == [9]
+    assert not os.path.exists(os.path.join(snapshot_dir, partition_file('movies', '2000')))
+
+
+def test_load_snapshot_invalid_mode(source_file, tmp_path):
+    """Test loading with an invalid snapshot mode."""
+    with pytest.raises(ValueError, match="Invalid snapshot mode"):
+        load_snapshot(pd.DataFrame, {'movies': source_file},
+                      snapshot_dir=str(tmp_path), mode='bypass')
+
+
+def test_load_snapshot_tables(source_file, tmp_path):
+    """Test updating the tables: the deleted titles are removed from all of them
+    and the updated columns are set only in the tables with these columns."""
+    calls = []
+    snapshot_dir = str(tmp_path / 'snapshot')
+
+    def builder():
+        calls.append(source_file)
+        movies_df = pd.read_csv(source_file)
+        return {'movies': movies_df,
+                'directors': movies_df[['titleId', 'startYear']].assign(director_id=10)}
+
+    load_snapshot(builder, {'movies': source_file}, snapshot_dir=snapshot_dir)
+    with open(source_file, 'a', encoding='utf-8') as f:
+        f.write('5,2003,PL,5.0\n')
+
+    def updater(changed, sources):
+        assert changed == ['movies']
+        assert source_file in sources
+        return SnapshotUpdate(
+            deleted=pd.Index([1]),
+            updated=pd.DataFrame({'average_rating': [9.5]}, index=pd.Index([4], name='titleId')),
+            inserted={'directors': pd.DataFrame({'titleId': [5], 'startYear': [2003],
+                                                 'director_id': [11]})},
+        )
+
+    result = load_snapshot(builder, {'movies': source_file}, 2001, 2003,
+                           snapshot_dir=snapshot_dir, mode='incremental', updater=updater)
+
+    assert len(calls) == 1
+    assert result['movies']['titleId'].tolist() == [2, 4, 3]
+    assert result['movies']['average_rating'].tolist() == [8.0, 9.5, 6.5]
+    assert result['directors'].to_dict('list') == {
+        'titleId': [2, 4, 3, 5], 'startYear': [2001, 2001, 2002, 2003],
+        'director_id': [10, 10, 10, 11]}
+    assert not os.path.exists(os.path.join(snapshot_dir, partition_file('directors', '2000')))
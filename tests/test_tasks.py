@@ -0,0 +1,58 @@
+"""Tests for the app.tasks file."""
+import pandas as pd
+import pytest
+
+from app.tasks import TASK_EXECUTORS, run_tasks
+
+
+def print_rows(merged_df):
+    """Print the number of the rows of the merged data."""
+    for _ in range(3):
+        print(f'rows: {len(merged_df)}')
+
+
+def print_columns(merged_df):
+    """Print the columns of the merged data."""
+    for column in merged_df.columns:
+        print(f'column: {column}')
+
+
+def print_directors(merged_df, directors_df):
+    """Print the directors of the movies of the merged data."""
+    print(f'directors: {directors_df["director_id"].tolist()} of {len(merged_df)} rows')
+
+
+def fail(merged_df):
+    """Fail on a missing column of the merged data."""
+    print(merged_df['missing'])
+
+
+@pytest.mark.parametrize('executor', TASK_EXECUTORS)
+def test_run_tasks_output_order(executor, capsys):
+    """Test that the printed text of the tasks comes in the order of the tasks."""
+    merged_df = pd.DataFrame({'a': [1, 2], 'b': [3, 4]})
+
+    run_tasks([('rows', print_rows, {}), ('failing', fail, {}), ('columns', print_columns, {})],
+              merged_df, executor)
+
+    assert capsys.readouterr().out.splitlines() == [
+        'rows: 2', 'rows: 2', 'rows: 2', 'column: a', 'column: b']
+
+
+@pytest.mark.parametrize('executor', TASK_EXECUTORS)
+def test_run_tasks_data(executor, capsys):
+    """Test passing the other data of the tasks by the names of the arguments."""
+    merged_df = pd.DataFrame({'a': [1, 2], 'b': [3, 4]})
+    directors_df = pd.DataFrame({'title_id': [1, 2], 'director_id': [10, 11]})
+
+    run_tasks([('rows', print_rows, {}),
+               ('directors', print_directors, {'directors_df': directors_df})],
+              merged_df, executor)
+
+    assert capsys.readouterr().out.splitlines()[-1] == 'directors: [10, 11] of 2 rows'
+
+
+def test_run_tasks_invalid_executor():
+    """Test running the tasks with an invalid executor."""
+    with pytest.raises(ValueError, match="Invalid task executor"):
+        run_tasks([('rows', print_rows, {})], pd.DataFrame(), 'cluster')